@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,12 +43,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tasks.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'tasks.middleware.RateLimitMiddleware',
+    'tasks.middleware.UploadHandlerMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'tasks.middleware.ReplicaPinMiddleware',
+    'tasks.middleware.ShardRoutingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -74,13 +81,74 @@ WSGI_APPLICATION = 'my_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Профиль SQLite под конкурентную нагрузку: PRAGMA выполняются при
+# открытии каждого соединения. WAL позволяет читать во время записи,
+# busy_timeout ждет блокировку вместо "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            # транзакции сразу берут блокировку на запись (BEGIN IMMEDIATE),
+            # чтобы не получать SQLITE_BUSY при переходе от чтения к записи
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+            ),
+        },
+    },
+    # реплика только для чтения; локально это тот же файл, открытый в mode=ro
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get(
+            'DATABASE_REPLICA_NAME', f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro"
+        ),
+        'OPTIONS': {
+            'uri': True,
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}'
+                for name, value in SQLITE_PRAGMAS.items()
+                if name != 'journal_mode'
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Шарды канбанов (см. tasks/shards.py): шард 0 - default, остальные -
+# отдельные файлы. shard1 описан всегда, чтобы тесты могли его включить.
+KANBAN_SHARD_COUNT = int(os.environ.get('KANBAN_SHARD_COUNT', 1))
+KANBAN_SHARD_ID_BITS = 40
+for index in range(1, max(KANBAN_SHARD_COUNT, 2)):
+    DATABASES[f'shard{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_shard{index}.sqlite3',
+        'OPTIONS': DATABASES['default']['OPTIONS'],
+    }
+KANBAN_SHARDS = ['default'] + [
+    f'shard{index}' for index in range(1, KANBAN_SHARD_COUNT)
+]
+
+DATABASE_ROUTERS = [
+    'tasks.routers.KanbanShardRouter',
+    'tasks.routers.ReadReplicaRouter',
+]
+DATABASE_REPLICA_ALIAS = 'replica'
+# сколько секунд после POST читать с основной базы (read-your-writes)
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'db_pin'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -117,6 +185,22 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# вне DEBUG статика отдается с хешем в имени и сжатыми копиями,
+# так что прокси может кешировать ее навсегда
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage'
+            if DEBUG
+            else 'tasks.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -126,5 +210,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# кто отдает байты изображений после проверки прав:
+# 'python' - сам Django (Range и условные запросы),
+# 'x-accel' - nginx (internal location MEDIA_ACCEL_PREFIX -> MEDIA_ROOT),
+# 'x-sendfile' - apache/lighttpd с mod_xsendfile
+MEDIA_SERVE_BACKEND = os.environ.get('MEDIA_SERVE_BACKEND', 'python')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_SECONDS = 3600
+
 IMAGE_MAX_SIZE_MB = 144
 IMAGE_MAX_SIDE_PX = 1080
+# проверки при загрузке, до записи файла целиком на диск
+IMAGE_ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP', 'BMP')
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_HEADER_SNIFF_BYTES = 64 * 1024
+
+# Метрики Prometheus: каждый воркер пишет свой файл в METRICS_DIR,
+# /metrics суммирует их
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', Path(tempfile.gettempdir()) / 'django_kanban_metrics'
+)
+METRICS_FLUSH_INTERVAL = 5
+METRICS_PREFIX = 'kanban_'
+
+# общий для всех воркеров кеш; без REDIS_URL - локальный кеш процесса
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# сколько живет закешированный набор прав на канбаны; локальный кеш
+# процесса не видит инвалидаций из других воркеров, поэтому без общего
+# кеша отозванный доступ должен истекать быстро
+KANBAN_ACCESS_CACHE_SECONDS = 300 if os.environ.get('REDIS_URL') else 5
+
+# лимиты запросов по имени URL: rate запросов за period секунд
+# с одного пользователя ('user'), IP ('ip') или токена из URL ('token')
+RATE_LIMITS = {
+    'tasks:login': {'rate': 10, 'period': 60, 'key': 'ip', 'methods': ['POST']},
+    'tasks:signup': {'rate': 5, 'period': 300, 'key': 'ip', 'methods': ['POST']},
+    'tasks:task_add': {'rate': 30, 'period': 60, 'key': 'user', 'methods': ['POST']},
+    'tasks:task_update': {
+        'rate': 30,
+        'period': 60,
+        'key': 'user',
+        'methods': ['POST'],
+    },
+    'tasks:ical_feed': {
+        'rate': 60,
+        'period': 60,
+        'key': 'token',
+        'methods': ['GET'],
+    },
+}
+# заголовок с IP клиента от фронтового прокси, например 'HTTP_X_FORWARDED_FOR',
+# и сколько доверенных прокси дописывают в него адрес: IP клиента берется
+# на столько записей от правого края
+RATE_LIMIT_IP_HEADER = os.environ.get('RATE_LIMIT_IP_HEADER', '')
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 1))
+
+# вебхуки: таймаут запроса и повторы с экспоненциальной задержкой
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 10
+WEBHOOK_RETRY_MAX_SECONDS = 3600
+# сколько воркер владеет забранными событиями, должно хватать на отправку
+WEBHOOK_LEASE_SECONDS = 300
+# адреса подписок во внутренней сети (localhost, 10.0.0.0/8 и т. п.)
+# запрещены, разрешать только для разработки
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = False
+
+# синхронизация канбанов: сколько изменений отдавать за раз и сколько
+# помнить удаленные задачи (более старый курсор сбрасывается)
+SYNC_PAGE_SIZE = 500
+SYNC_TOMBSTONE_DAYS = 30
+
+# фиды .ics: сколько хранить сгенерированное тело, ключ кеша меняется
+# вместе с версией канбана, поэтому срок нужен только для уборки
+ICAL_FEED_CACHE_SECONDS = 24 * 60 * 60
+
+# холодный старт: django.setup() должен укладываться в бюджет, а тяжелые
+# модули из STARTUP_LAZY_MODULES не должны импортироваться при старте
+# (проверяет manage.py startup_profile)
+STARTUP_TIME_BUDGET_SECONDS = float(
+    os.environ.get('STARTUP_TIME_BUDGET_SECONDS', 1.5)
+)
+STARTUP_LAZY_MODULES = ('PIL',)
@@ -17,14 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from tasks.views import TaskImageView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # изображения задач отдаются только после проверки прав
+    path(
+        f"{settings.MEDIA_URL.strip('/')}/tasks/img/<str:name>",
+        TaskImageView.as_view(),
+        name='task_image',
+    ),
     path('', include('tasks.urls')),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
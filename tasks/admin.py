@@ -1,5 +1,217 @@
 from django.contrib import admin
-from .models import Task, Kanban
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-admin.site.register(Task)
-admin.site.register(Kanban)
\ No newline at end of file
+from .models import (
+    Kanban,
+    KanbanMembership,
+    Task,
+    TaskComment,
+    TaskDependency,
+    TaskTombstone,
+    WebhookDelivery,
+    WebhookSubscription,
+)
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Точный COUNT(*) только до exact_limit строк или до страницы после
+    page_number, если она дальше. Больше - оценка: на PostgreSQL из
+    статистики планировщика, иначе по максимальному pk (без фильтров) или
+    нижняя граница (с фильтрами), после которой есть еще одна страница.
+    """
+
+    exact_limit = 10000
+
+    def __init__(self, *args, page_number=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_number = page_number
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        # подзапрос с LIMIT: сканируется не больше limit строк; на строку
+        # больше, чтобы знать, что дальше есть еще
+        limit = max(self.exact_limit, (self.page_number + 1) * self.per_page) + 1
+        count = queryset.order_by().values("pk")[:limit].count()
+        if count < limit:
+            return count
+        if queryset.query.where:
+            return count
+        return max(self.estimate(queryset.model, queryset.db), count)
+
+    def estimate(self, model, using) -> int:
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        # MAX(pk) берется из индекса первичного ключа без сканирования
+        last = model._base_manager.using(using).order_by("-pk").values("pk").first()
+        return last["pk"] if last else 0
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Общие настройки для таблиц, в которых миллионы строк."""
+
+    paginator = ApproximateCountPaginator
+    # иначе рядом с числом найденных выполняется COUNT(*) без фильтров
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ("-pk",)
+
+    def get_paginator(
+        self, request, queryset, per_page, orphans=0, allow_empty_first_page=True
+    ):
+        try:
+            page_number = int(request.GET.get(PAGE_VAR, 1))
+        except ValueError:
+            page_number = 1
+        return self.paginator(
+            queryset,
+            per_page,
+            orphans,
+            allow_empty_first_page,
+            page_number=page_number,
+        )
+
+
+class ModelDeleteMixin:
+    """
+    Удаление из админки, в том числе действие delete_selected, идет через
+    delete_model для каждого объекта, а не через QuerySet.delete: Task.delete
+    убирает пути зависимостей и файл изображения, пишет tombstone и событие
+    task.deleted. Каскад админка не показывает и прав на него не проверяет,
+    связанные строки удаляет сама модель.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        model_count = {self.model._meta.verbose_name_plural: len(objs)}
+        return [str(obj) for obj in objs], model_count, set(), []
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+@admin.register(Kanban)
+class KanbanAdmin(ModelDeleteMixin, ScalableModelAdmin):
+    list_display = ("id", "title", "owner", "is_template", "datetime_deleted")
+    list_select_related = ("owner",)
+    raw_id_fields = ("owner",)
+    # оба поля проиндексированы или почти не дают выбора
+    list_filter = ("is_template", ("datetime_deleted", admin.EmptyFieldListFilter))
+    search_fields = ("=id",)
+
+    def get_queryset(self, request):
+        # в админке видны и мягко удаленные канбаны
+        return Kanban.all_objects.all()
+
+    def delete_model(self, request, obj):
+        # задачи и участников удалит purge_kanbans
+        if obj.datetime_deleted is None:
+            obj.soft_delete()
+
+
+@admin.register(Task)
+class TaskAdmin(ModelDeleteMixin, ScalableModelAdmin):
+    list_display = (
+        "id",
+        "title",
+        "kanban",
+        "state",
+        "owner",
+        "executor",
+        "datetime_deadline",
+        "datetime_created",
+    )
+    list_select_related = ("kanban", "owner", "executor")
+    raw_id_fields = ("kanban", "owner", "executor")
+    # task_state_created_idx и task_created_idx
+    list_filter = ("state",)
+    date_hierarchy = "datetime_created"
+    search_fields = ("=id",)
+
+    def get_queryset(self, request):
+        # без JOIN с канбаном, который добавляет ActiveTaskManager
+        return Task.all_objects.all()
+
+
+@admin.register(KanbanMembership)
+class KanbanMembershipAdmin(ScalableModelAdmin):
+    list_display = ("id", "kanban", "user", "role", "datetime_joined")
+    list_select_related = ("kanban", "user")
+    raw_id_fields = ("kanban", "user")
+    list_filter = ("role",)
+
+
+@admin.register(TaskDependency)
+class TaskDependencyAdmin(ScalableModelAdmin):
+    # пути в TaskBlockerPath обновляет только Task.add_blocker/remove_blocker,
+    # поэтому ребра здесь только просматриваются
+    list_display = ("id", "blocker", "task", "datetime_created")
+    list_select_related = ("blocker", "task")
+    raw_id_fields = ("blocker", "task")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TaskComment)
+class TaskCommentAdmin(ScalableModelAdmin):
+    # при удалении здесь Task.comment_count не уменьшится
+    list_display = ("id", "task", "author", "datetime_created")
+    list_select_related = ("task", "author")
+    raw_id_fields = ("task", "author")
+    readonly_fields = ("task", "author")
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TaskTombstone)
+class TaskTombstoneAdmin(ScalableModelAdmin):
+    list_display = ("id", "task_id", "kanban", "datetime_deleted")
+    list_select_related = ("kanban",)
+    raw_id_fields = ("kanban",)
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(ScalableModelAdmin):
+    list_display = ("id", "url", "kanban", "is_active", "datetime_created")
+    list_select_related = ("kanban",)
+    raw_id_fields = ("kanban",)
+    list_filter = ("is_active",)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(ScalableModelAdmin):
+    list_display = (
+        "id",
+        "event",
+        "subscription",
+        "state",
+        "attempts",
+        "datetime_next_attempt",
+        "datetime_delivered",
+    )
+    list_select_related = ("subscription",)
+    raw_id_fields = ("subscription",)
+    # webhook_due_idx начинается со state
+    list_filter = ("state",)
+    readonly_fields = ("payload", "last_error")
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(seed_shard_sequences, sender=self)
+
+
+def seed_shard_sequences(sender, using, **kwargs):
+    from . import shards
+
+    if using in shards.aliases():
+        models = [model for model in sender.get_models() if shards.is_sharded(model)]
+        shards.seed_sequences(using, models)
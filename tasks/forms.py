@@ -1,9 +1,22 @@
 from django import forms
-from .models import Task, Kanban
+from django.contrib.auth.models import User
+from django.urls import reverse_lazy
+from .models import Task, Kanban, TaskComment, WebhookSubscription
+from . import webhooks
 from django.conf import settings
 
 
 class TaskAddForm(forms.ModelForm):
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, error in self.upload_errors.items():
+            self.add_error(field, error)
+        return cleaned_data
+
     class Meta:
         model = Task
         fields = ["title", "description", "image"]
@@ -21,22 +34,88 @@ class KanbanAddForm(forms.ModelForm):
         labels = {"title": "Название"}
 
 
+class UserAutocompleteWidget(forms.TextInput):
+    """
+    Поле ввода логина с подсказками из tasks:user_autocomplete.
+    В отличие от Select не выводит всех пользователей в <option>.
+    """
+
+    class Media:
+        js = ["tasks/js/user_autocomplete.js"]
+
+    def __init__(self, attrs=None):
+        super().__init__(
+            {
+                "autocomplete": "off",
+                "data-autocomplete-url": reverse_lazy("tasks:user_autocomplete"),
+                **(attrs or {}),
+            }
+        )
+
+
+class WebhookAddForm(forms.ModelForm):
+    class Meta:
+        model = WebhookSubscription
+        fields = ["url", "secret"]
+        labels = {"url": "Адрес", "secret": "Секрет для подписи"}
+
+    def clean_url(self):
+        url = self.cleaned_data["url"]
+        webhooks.validate_url(url)
+        return url
+
+
 class TaskAssignForm(forms.ModelForm):
+    # исполнитель ищется по логину, один запрос по уникальному индексу
+    executor = forms.ModelChoiceField(
+        queryset=User.objects.all(),
+        to_field_name="username",
+        required=False,
+        label="Исполнитель",
+        widget=UserAutocompleteWidget(attrs={"required": "True"}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.executor_id:
+            self.initial["executor"] = self.instance.executor.username
+        self.fields["executor"].widget.attrs["data-kanban"] = self.instance.kanban_id
+
     class Meta:
         model = Task
         fields = ["executor", "datetime_deadline"]
         labels = {
-            "executor": "Исполнитель",
             "datetime_deadline": "Срок выполнения",
         }
         widgets = {
-            "executor": forms.Select(attrs={"required": "True"}),
             "datetime_deadline": forms.DateTimeInput(
                 attrs={"type": "datetime-local", "required": "True"}
             ),
         }
 
 
+class TaskBlockerForm(forms.Form):
+    blocker = forms.ModelChoiceField(
+        queryset=Task.objects.none(), label="Блокирующая задача"
+    )
+
+    def __init__(self, *args, task, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["blocker"].queryset = (
+            Task.objects.filter(kanban_id=task.kanban_id)
+            .exclude(pk=task.pk)
+            .order_by("state", "rank", "pk")
+        )
+
+
+class TaskCommentForm(forms.ModelForm):
+    class Meta:
+        model = TaskComment
+        fields = ["text"]
+        labels = {"text": "Комментарий"}
+        widgets = {"text": forms.Textarea(attrs={"rows": 3})}
+
+
 class TaskReviewForm(forms.ModelForm):
     class Meta:
         model = Task
@@ -59,3 +138,35 @@ class TaskOverdueForm(forms.ModelForm):
         fields = []
         labels = {}
         widgets = {}
+
+
+class MyTasksFilterForm(forms.Form):
+    state = forms.ChoiceField(
+        choices=[("", "Все")] + Task.state_list, required=False, label="Статус"
+    )
+    deadline_from = forms.DateTimeField(
+        required=False,
+        label="Срок с",
+        widget=forms.DateTimeInput(attrs={"type": "datetime-local"}),
+    )
+    deadline_to = forms.DateTimeField(
+        required=False,
+        label="Срок по",
+        widget=forms.DateTimeInput(attrs={"type": "datetime-local"}),
+    )
+
+
+class TaskListApiForm(forms.Form):
+    """Разрешенные параметры /api/tasks/, неизвестные отклоняются во вьюхе."""
+
+    kanban = forms.IntegerField(required=False, min_value=1)
+    state = forms.ChoiceField(choices=[("", "")] + Task.state_list, required=False)
+    executor = forms.IntegerField(required=False, min_value=1)
+    deadline_from = forms.DateTimeField(required=False)
+    deadline_to = forms.DateTimeField(required=False)
+    created_from = forms.DateTimeField(required=False)
+    created_to = forms.DateTimeField(required=False)
+    sort = forms.CharField(required=False)
+    fields = forms.CharField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=200)
+    cursor = forms.CharField(required=False)
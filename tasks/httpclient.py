@@ -0,0 +1,117 @@
+"""
+Минимальный асинхронный клиент HTTP/1.1 на asyncio.
+
+Один клиент на отправку вебхуков и нагрузочный прогон: соединение
+с keep-alive, тело ответа читается по Content-Length, чанками или до
+закрытия соединения. Перенаправления не выполняются.
+"""
+
+import asyncio
+from http.cookies import SimpleCookie
+
+
+class Response:
+    def __init__(self, status: int, headers: dict, body: bytes, cookies: dict):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.cookies = cookies
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", "replace")
+
+
+class Connection:
+    """
+    Соединение с host:port. address - IP, с которым соединяться вместо
+    разрешения host (host все равно уходит в Host и в SNI для https).
+    """
+
+    def __init__(self, host: str, port: int, https: bool = False, address=None):
+        self.host = host
+        self.port = port
+        self.https = https
+        self.address = address or host
+        self.reader = self.writer = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.writer is not None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers: dict, body: bytes) -> Response:
+        """ConnectionError, если сервер закрыл соединение или ответил не по HTTP."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.address,
+                self.port,
+                ssl=True if self.https else None,
+                server_hostname=self.host if self.https else None,
+            )
+        head = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Content-Length: {len(body)}",
+        ]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        try:
+            return await self.read_response(method)
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Соединение закрыто сервером")
+
+    async def read_response(self, method) -> Response:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Соединение закрыто сервером")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise ConnectionError(f"Неверный ответ: {status_line[:100]!r}")
+        headers = {}
+        cookies = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            value = value.strip()
+            if name == "set-cookie":
+                for key, morsel in SimpleCookie(value).items():
+                    cookies[key] = morsel.value
+            headers[name] = value
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self.read_chunked()
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        elif method == "HEAD" or status in (204, 304):
+            body = b""
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return Response(status, headers, body, cookies)
+
+    async def read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if not size:
+                # пустая строка после последнего чанка (трейлеры не ждем)
+                await self.reader.readline()
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
@@ -0,0 +1,139 @@
+"""
+Фиды сроков задач в формате iCalendar (RFC 5545).
+
+Календари опрашивают фид каждые несколько минут, поэтому ответ
+собирается из кеша: у каждого канбана есть версия - его название, номер
+последнего изменения задач (Task.change_seq) и id последнего удаления.
+Версии читаются одним запросом на шард по индексам, без чтения задач,
+и видны только после коммита, поэтому одинаковы во всех процессах.
+ETag фида - хеш версий его канбанов, тело кешируется под этим ETag.
+Пока канбаны не менялись, запрос отвечает 304 или телом из кеша.
+"""
+
+import hashlib
+from datetime import timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from . import shards
+from .models import Kanban, Task, TaskTombstone
+
+TOKEN_SALT = "tasks.ical"
+
+
+def board_versions(kanban_ids) -> dict:
+    """{id канбана: версия}, удаленных канбанов в ответе нет."""
+    # (kanban, change_seq) и (kanban, id) покрываются task_kanban_change_idx
+    # и tombstone_kanban_idx, каждый подзапрос читает одну запись индекса
+    last_change = (
+        Task.all_objects.filter(kanban_id=OuterRef("pk"))
+        .order_by("-change_seq")
+        .values("change_seq")[:1]
+    )
+    last_tombstone = (
+        TaskTombstone.objects.filter(kanban_id=OuterRef("pk"))
+        .order_by("-pk")
+        .values("pk")[:1]
+    )
+    versions = {}
+    for alias, ids in shards.group_by_shard(kanban_ids).items():
+        rows = (
+            Kanban.objects.using(alias)
+            .filter(pk__in=ids)
+            .annotate(
+                last_change=Subquery(last_change),
+                last_tombstone=Subquery(last_tombstone),
+            )
+            .values_list("pk", "title", "last_change", "last_tombstone")
+        )
+        for pk, *version in rows:
+            versions[pk] = tuple(version)
+    return versions
+
+
+def make_token(user_id, kanban_id=None) -> str:
+    """Токен для URL фида: календари не присылают cookie сессии."""
+    return signing.Signer(salt=TOKEN_SALT).sign_object(
+        {"user": user_id, "kanban": kanban_id}
+    )
+
+
+def read_token(token: str) -> tuple:
+    """(user_id, kanban_id или None), signing.BadSignature для чужого токена."""
+    data = signing.Signer(salt=TOKEN_SALT).unsign_object(token)
+    return data["user"], data["kanban"]
+
+
+def feed_etag(*parts) -> str:
+    data = repr(parts).encode()
+    return '"' + hashlib.md5(data, usedforsecurity=False).hexdigest() + '"'
+
+
+def cached_body(etag: str):
+    return cache.get(f"ical:feed:{etag}")
+
+
+def stream_and_cache(etag: str, chunks):
+    """Отдает части тела по мере генерации и кладет тело в кеш в конце."""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(f"ical:feed:{etag}", "".join(body), settings.ICAL_FEED_CACHE_SECONDS)
+
+
+def escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line: str) -> str:
+    """Строки длиннее 75 байт переносятся, продолжение начинается с пробела."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while encoded:
+        # не разрезаем многобайтный символ UTF-8
+        size = min(len(encoded), 75 if not parts else 74)
+        while size < len(encoded) and encoded[size] & 0xC0 == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode())
+        encoded = encoded[size:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_datetime(value) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_feed(name: str, tasks, task_url):
+    """Генератор строк фида, tasks читаются по мере отдачи."""
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield "PRODID:-//kanban//tasks//RU\r\n"
+    yield "CALSCALE:GREGORIAN\r\n"
+    yield fold(f"X-WR-CALNAME:{escape(name)}")
+    for task in tasks:
+        deadline = format_datetime(task.datetime_deadline)
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:task-{task.pk}@kanban",
+            f"DTSTAMP:{format_datetime(task.datetime_last_update)}",
+            f"DTSTART:{deadline}",
+            f"DTEND:{deadline}",
+            f"SUMMARY:{escape(task.title)}",
+            f"DESCRIPTION:{escape(task.state)}",
+            f"URL:{task_url(task)}",
+            "END:VEVENT",
+        ]
+        yield "".join(fold(line) for line in lines)
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,350 @@
+"""
+Нагрузочный прогон по реальным сценариям работы с канбанами.
+
+Виртуальные пользователи ходят в запущенное приложение (runserver, gunicorn,
+uvicorn) по HTTP, как браузер: с cookie сессии и CSRF-токеном. Каждый
+пользователь регистрируется, входит и в цикле выбирает сценарий по весу:
+владелец создает канбан, добавляет задачи с картинками и проводит их
+через назначение, проверку и завершение, наблюдатель опрашивает канбаны.
+
+Для каждого маршрута копятся время ответа и коды, по ним считаются RPS,
+перцентили и доля ошибок. Лимиты из RATE_LIMITS на время прогона нужно
+поднять или включить RATE_LIMIT_IP_HEADER = 'HTTP_X_FORWARDED_FOR':
+каждый виртуальный пользователь шлет свой X-Forwarded-For.
+"""
+
+import asyncio
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timedelta
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+
+from . import httpclient
+
+# сценарий -> вес по умолчанию
+WORKFLOWS = {"owner": 1, "poller": 3}
+
+KANBAN_LINK_RE = re.compile(r'href="/(\d+)/kanban_detail/">([^<]*)<')
+TASK_LINK_RE = re.compile(r'href="/(\d+)/task_detail/">([^<]*)<')
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.started = time.monotonic()
+        self.finished = None
+
+    def add(self, route: str, latency: float, status):
+        self.latencies.setdefault(route, []).append(latency)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def report(self) -> dict:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        routes = {}
+        for route in sorted(self.latencies):
+            latencies = sorted(self.latencies[route])
+            statuses = self.statuses[route]
+            count = len(latencies)
+            limited = statuses.get(429, 0)
+            errors = sum(
+                number
+                for status, number in statuses.items()
+                if status != 429 and (not isinstance(status, int) or status >= 400)
+            )
+            routes[route] = {
+                "count": count,
+                "rps": count / elapsed,
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1],
+                "errors": errors,
+                "limited": limited,
+                "error_rate": errors / count,
+                "statuses": {str(key): value for key, value in statuses.items()},
+            }
+        total = sum(route["count"] for route in routes.values())
+        return {
+            "seconds": elapsed,
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0,
+            "routes": routes,
+        }
+
+
+def percentile(values: list, percent: float) -> float:
+    """Перцентиль по ближайшему рангу, values отсортированы."""
+    index = max(int(len(values) * percent / 100 + 0.5) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Client:
+    """Виртуальный пользователь поверх httpclient: keep-alive, cookie, статистика."""
+
+    def __init__(self, base_url: str, stats: Stats, timeout: float, ip: str):
+        parts = urlsplit(base_url)
+        https = parts.scheme == "https"
+        self.connection = httpclient.Connection(
+            parts.hostname, parts.port or (443 if https else 80), https=https
+        )
+        self.stats = stats
+        self.timeout = timeout
+        self.ip = ip
+        self.cookies = {}
+
+    async def close(self):
+        await self.connection.close()
+
+    async def request(self, route, method, path, data=None, files=None):
+        body = b""
+        headers = {}
+        if files:
+            body, headers["Content-Type"] = encode_multipart(data or {}, files)
+        elif data is not None:
+            body = urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        route = f"{method} {route}"
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.send(method, path, headers, body), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as error:
+            await self.close()
+            self.stats.add(route, time.perf_counter() - start, type(error).__name__)
+            return None
+        self.stats.add(route, time.perf_counter() - start, response.status)
+        return response
+
+    async def send(self, method, path, headers, body) -> httpclient.Response:
+        reused = self.connection.is_open
+        try:
+            return await self.exchange(method, path, headers, body)
+        except ConnectionError:
+            await self.close()
+            # сервер мог закрыть простаивавшее соединение, повторяем один раз
+            if not reused:
+                raise
+        return await self.exchange(method, path, headers, body)
+
+    async def exchange(self, method, path, headers, body) -> httpclient.Response:
+        headers = {"X-Forwarded-For": self.ip, **headers}
+        if self.cookies:
+            cookies = "; ".join(f"{key}={value}" for key, value in self.cookies.items())
+            headers["Cookie"] = cookies
+        response = await self.connection.request(method, path, headers, body)
+        self.cookies.update(response.cookies)
+        return response
+
+    async def get(self, route, path):
+        return await self.request(route, "GET", path)
+
+    async def post(self, route, path, data=None, files=None):
+        data = dict(data or {})
+        data["csrfmiddlewaretoken"] = self.cookies.get("csrftoken", "")
+        return await self.request(route, "POST", path, data, files)
+
+
+def encode_multipart(data: dict, files: dict) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in data.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            (
+                f"--{boundary}\r\nContent-Disposition: form-data; "
+                f'name="{name}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode()
+            + content
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def make_image(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    # шум сжимается плохо, как фотография, а не как однотонная заливка
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class VirtualUser:
+    def __init__(self, number: int, run: "LoadRun"):
+        self.run = run
+        self.username = f"load_{run.run_id}_{number}"
+        self.rng = random.Random(f"{run.seed}:{number}")
+        self.client = Client(
+            run.base_url,
+            run.stats,
+            run.timeout,
+            f"10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}",
+        )
+        self.logged_in = False
+
+    async def think(self):
+        if self.run.think:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.run.think))
+
+    async def sign_up(self):
+        client = self.client
+        await client.get("tasks:signup", "/signin/")
+        await client.post(
+            "tasks:signup",
+            "/signin/",
+            {
+                "username": self.username,
+                "password1": self.run.password,
+                "password2": self.run.password,
+            },
+        )
+        self.run.usernames.append(self.username)
+
+    async def log_in(self):
+        client = self.client
+        await client.get("tasks:login", "/login/")
+        response = await client.post(
+            "tasks:login",
+            "/login/",
+            {"username": self.username, "password": self.run.password},
+        )
+        self.logged_in = response is not None and response.status == 302
+
+    async def owner(self):
+        client = self.client
+        title = f"board {uuid.uuid4().hex[:12]}"
+        await client.get("tasks:kanban_add", "/kanban_add/")
+        await client.post("tasks:kanban_add", "/kanban_add/", {"title": title})
+        response = await client.get("tasks:kanban_list", "/kanban_list/")
+        if response is None:
+            return
+        boards = dict((text, pk) for pk, text in KANBAN_LINK_RE.findall(response.text))
+        kanban_id = boards.get(title)
+        if kanban_id is None:
+            return
+        await self.think()
+
+        titles = []
+        for i in range(self.run.tasks_per_board):
+            task_title = f"task {i} {uuid.uuid4().hex[:8]}"
+            titles.append(task_title)
+            await client.get("tasks:task_add", f"/{kanban_id}/task_add/")
+            await client.post(
+                "tasks:task_add",
+                f"/{kanban_id}/task_add/",
+                {"title": task_title, "description": "load test"},
+                {"image": (f"{i}.png", self.rng.choice(self.run.images), "image/png")},
+            )
+            await self.think()
+
+        response = await client.get(
+            "tasks:kanban_detail", f"/{kanban_id}/kanban_detail/"
+        )
+        if response is None:
+            return
+        links = dict((text, pk) for pk, text in TASK_LINK_RE.findall(response.text))
+        task_ids = [links[title] for title in titles if title in links]
+        deadline = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M")
+        for task_id in task_ids:
+            await client.get("tasks:task_detail", f"/{task_id}/task_detail/")
+            executor = self.rng.choice(self.run.usernames or [self.username])
+            await client.get("tasks:task_assign", f"/{task_id}/task_assign/")
+            await client.post(
+                "tasks:task_assign",
+                f"/{task_id}/task_assign/",
+                {"executor": executor, "datetime_deadline": deadline},
+            )
+            await self.think()
+            await client.post("tasks:task_review", f"/{task_id}/task_review/")
+            await self.think()
+            await client.post("tasks:task_done", f"/{task_id}/task_done/")
+            await self.think()
+
+    async def poller(self):
+        client = self.client
+        response = await client.get("tasks:kanban_list", "/kanban_list/")
+        if response is None:
+            return
+        kanban_ids = [pk for pk, _ in KANBAN_LINK_RE.findall(response.text)]
+        for kanban_id in self.rng.sample(kanban_ids, min(len(kanban_ids), 3)):
+            await self.think()
+            await client.get("tasks:kanban_detail", f"/{kanban_id}/kanban_detail/")
+        await self.think()
+        await client.get("tasks:my_tasks", "/my_tasks/")
+
+    async def loop(self, deadline: float):
+        try:
+            await self.sign_up()
+            await self.log_in()
+            workflows = list(self.run.weights)
+            weights = list(self.run.weights.values())
+            while time.monotonic() < deadline:
+                if not self.logged_in:
+                    await self.log_in()
+                    if not self.logged_in:
+                        await asyncio.sleep(1)
+                        continue
+                workflow = self.rng.choices(workflows, weights)[0]
+                await getattr(self, workflow)()
+                await self.think()
+        finally:
+            await self.client.close()
+
+
+class LoadRun:
+    def __init__(
+        self,
+        base_url: str,
+        users: int,
+        seconds: float,
+        weights: dict = None,
+        tasks_per_board: int = 5,
+        think: float = 0,
+        timeout: float = 30,
+        ramp_up: float = 0,
+        seed: int = 0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.seconds = seconds
+        self.weights = weights or WORKFLOWS
+        self.tasks_per_board = tasks_per_board
+        self.think = think
+        self.timeout = timeout
+        self.ramp_up = ramp_up
+        self.seed = seed
+        self.run_id = uuid.uuid4().hex[:8]
+        self.password = uuid.uuid4().hex
+        self.images = [make_image(width, width * 3 // 4) for width in (320, 640, 1280)]
+        self.usernames = []
+        self.stats = Stats()
+
+    async def main(self) -> dict:
+        self.stats = Stats()
+        deadline = time.monotonic() + self.seconds
+
+        async def start(number):
+            if self.ramp_up:
+                await asyncio.sleep(self.ramp_up * number / self.users)
+            await VirtualUser(number, self).loop(deadline)
+
+        await asyncio.gather(*(start(number) for number in range(self.users)))
+        self.stats.finished = time.monotonic()
+        return self.stats.report()
+
+    def execute(self) -> dict:
+        return asyncio.run(self.main())
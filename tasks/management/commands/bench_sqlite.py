@@ -0,0 +1,132 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# стандартные настройки sqlite3 и Django до профиля, timeout по умолчанию
+# у sqlite3.connect - 5 секунд
+STOCK_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+STOCK_TIMEOUT = 5.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность SQLite со стандартными настройками "
+        "и с профилем SQLITE_PRAGMAS при конкурентных чтениях и записях"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--rows", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        profiles = [
+            ("stock", STOCK_PRAGMAS, STOCK_TIMEOUT, "DEFERRED"),
+            (
+                "profile",
+                settings.SQLITE_PRAGMAS,
+                settings.SQLITE_PRAGMAS["busy_timeout"] / 1000,
+                "IMMEDIATE",
+            ),
+        ]
+        results = {}
+        for name, pragmas, timeout, begin in profiles:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db_path = Path(tmp_dir) / "bench.sqlite3"
+                self.prepare(db_path, options["rows"])
+                results[name] = self.run_profile(
+                    db_path, pragmas, timeout, begin, options
+                )
+            self.stdout.write(self.format_result(name, results[name], options))
+
+        stock_writes = results["stock"]["writes"] or 1
+        self.stdout.write(
+            f"Прирост записей: x{results['profile']['writes'] / stock_writes:.2f}"
+        )
+
+    def prepare(self, db_path, rows):
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE task (id INTEGER PRIMARY KEY, state TEXT, counter INTEGER)"
+        )
+        conn.executemany(
+            "INSERT INTO task (state, counter) VALUES (?, 0)",
+            (("PLANNED",) for _ in range(rows)),
+        )
+        conn.commit()
+        conn.close()
+
+    def connect(self, db_path, pragmas, timeout):
+        conn = sqlite3.connect(
+            db_path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        for pragma, value in pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        return conn
+
+    def run_profile(self, db_path, pragmas, timeout, begin, options):
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+        rows = options["rows"]
+
+        def writer(seed):
+            conn = self.connect(db_path, pragmas, timeout)
+            pk = seed
+            while time.monotonic() < deadline:
+                pk = pk * 7919 % rows + 1
+                try:
+                    # как переход задачи: прочитать статус, затем записать
+                    conn.execute(f"BEGIN {begin}")
+                    conn.execute("SELECT state FROM task WHERE id = ?", (pk,))
+                    conn.execute(
+                        "UPDATE task SET counter = counter + 1 WHERE id = ?", (pk,)
+                    )
+                    conn.execute("COMMIT")
+                    key = "writes"
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    key = "errors"
+                with lock:
+                    counts[key] += 1
+            conn.close()
+
+        def reader():
+            conn = self.connect(db_path, pragmas, timeout)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(
+                        "SELECT state, COUNT(*) FROM task GROUP BY state"
+                    ).fetchall()
+                    key = "reads"
+                except sqlite3.OperationalError:
+                    key = "errors"
+                with lock:
+                    counts[key] += 1
+            conn.close()
+
+        threads = [
+            threading.Thread(target=writer, args=(i + 1,))
+            for i in range(options["writers"])
+        ]
+        threads += [threading.Thread(target=reader) for _ in range(options["readers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
+
+    def format_result(self, name, counts, options):
+        seconds = options["seconds"]
+        return (
+            f"{name}: записей {counts['writes'] / seconds:.0f}/с, "
+            f"чтений {counts['reads'] / seconds:.0f}/с, "
+            f"ошибок блокировки {counts['errors']}"
+        )
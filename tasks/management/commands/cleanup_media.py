@@ -0,0 +1,108 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import shards
+from tasks.models import Task
+
+IMAGE_DIR = "tasks/img"
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет или переносит в карантин файлы из MEDIA_ROOT/tasks/img/, "
+        "на которые не ссылается ни одна задача"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quarantine",
+            help="Каталог, куда переносить файлы-сироты вместо удаления",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, сколько места освободится",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Сколько файлов проверять одним запросом",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Не трогать файлы моложе стольких секунд (идущие загрузки)",
+        )
+
+    def handle(self, *args, **options):
+        image_dir = Path(settings.MEDIA_ROOT) / IMAGE_DIR
+        if not image_dir.is_dir():
+            self.stdout.write(f"Каталог {image_dir} не найден")
+            return
+
+        quarantine = options["quarantine"]
+        if quarantine:
+            Path(quarantine).mkdir(parents=True, exist_ok=True)
+
+        scanned = orphans = reclaimed = 0
+        for chunk in self.scan(image_dir, options["chunk_size"], options["min_age"]):
+            scanned += len(chunk)
+            referenced = self.referenced(chunk)
+            for entry in chunk:
+                if entry.name in referenced:
+                    continue
+                orphans += 1
+                reclaimed += entry.stat().st_size
+                if options["dry_run"]:
+                    continue
+                if quarantine:
+                    shutil.move(entry.path, os.path.join(quarantine, entry.name))
+                else:
+                    os.unlink(entry.path)
+
+        action = "Освободится" if options["dry_run"] else "Освобождено"
+        self.stdout.write(
+            f"Проверено файлов: {scanned}, сирот: {orphans}. "
+            f"{action} {reclaimed / 1024 / 1024:.1f}мб"
+        )
+
+    def scan(self, image_dir, chunk_size, min_age):
+        """Отдает файлы каталога порциями, не собирая весь список в память."""
+        threshold = time.time() - min_age
+        chunk = []
+        with os.scandir(image_dir) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.stat().st_mtime > threshold:
+                    continue
+                chunk.append(entry)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def referenced(self, chunk) -> set:
+        """Имена файлов порции, на которые ссылаются задачи."""
+        names = {}
+        for entry in chunk:
+            # старые записи хранили абсолютный путь
+            names[f"{IMAGE_DIR}/{entry.name}"] = entry.name
+            names[f"{settings.MEDIA_ROOT}/{IMAGE_DIR}/{entry.name}"] = entry.name
+        found = shards.fan_out(
+            lambda: set(
+                Task.objects.filter(image__in=list(names)).values_list(
+                    "image", flat=True
+                )
+            )
+        )
+        return {names[name] for images in found.values() for name in images}
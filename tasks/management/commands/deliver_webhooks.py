@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.webhooks import deliver_due
+
+
+class Command(BaseCommand):
+    help = "Отправляет события из outbox вебхуков"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Сколько событий одной подписки склеивать в один запрос",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=0,
+            help="Работать постоянно, проверяя outbox раз в N секунд",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = deliver_due(
+                options["limit"], options["concurrency"], options["batch_size"]
+            )
+            if delivered or failed:
+                self.stdout.write(f"Доставлено: {delivered}, ошибок: {failed}")
+            if not options["loop"]:
+                return
+            # пока есть очередь, не ждем
+            if not delivered and not failed:
+                time.sleep(options["loop"])
@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.loadtest import WORKFLOWS, LoadRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает запущенное приложение сценариями пользователей и выводит "
+        "RPS, перцентили времени ответа и долю ошибок по маршрутам"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--seconds", type=float, default=30)
+        parser.add_argument(
+            "--weight",
+            action="append",
+            default=[],
+            metavar="СЦЕНАРИЙ=ВЕС",
+            help=f"Вес сценария ({', '.join(WORKFLOWS)}), можно повторять",
+        )
+        parser.add_argument("--tasks-per-board", type=int, default=5)
+        parser.add_argument(
+            "--think",
+            type=float,
+            default=0,
+            help="Средняя пауза пользователя между шагами, секунды",
+        )
+        parser.add_argument("--ramp-up", type=float, default=0)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--json", help="Сохранить результат в файл для сравнения прогонов"
+        )
+
+    def handle(self, *args, **options):
+        weights = dict(WORKFLOWS)
+        for item in options["weight"]:
+            name, _, weight = item.partition("=")
+            if name not in WORKFLOWS:
+                raise CommandError(f"Неизвестный сценарий: {name}")
+            try:
+                weights[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Неверный вес: {item}")
+        if not any(weights.values()):
+            raise CommandError("Хотя бы один сценарий должен иметь вес больше 0")
+
+        run = LoadRun(
+            options["url"],
+            options["users"],
+            options["seconds"],
+            weights=weights,
+            tasks_per_board=options["tasks_per_board"],
+            think=options["think"],
+            timeout=options["timeout"],
+            ramp_up=options["ramp_up"],
+            seed=options["seed"],
+        )
+        report = run.execute()
+
+        self.stdout.write(
+            f"{'маршрут':<28} {'запросов':>8} {'RPS':>7} {'p50':>7} {'p90':>7} "
+            f"{'p99':>7} {'max':>7} {'ошибок':>7} {'429':>5}"
+        )
+        for route, data in report["routes"].items():
+            self.stdout.write(
+                f"{route:<28} {data['count']:>8} {data['rps']:>7.1f} "
+                f"{data['p50'] * 1000:>6.0f}м {data['p90'] * 1000:>6.0f}м "
+                f"{data['p99'] * 1000:>6.0f}м {data['max'] * 1000:>6.0f}м "
+                f"{data['error_rate']:>7.1%} {data['limited']:>5}"
+            )
+        self.stdout.write(
+            f"Всего: {report['requests']} запросов за {report['seconds']:.1f} с, "
+            f"{report['rps']:.1f} RPS"
+        )
+        if options["json"]:
+            with open(options["json"], "w") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
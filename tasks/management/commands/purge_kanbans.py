@@ -0,0 +1,98 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks import shards
+from tasks.models import Kanban, KanbanMembership, Task, TaskTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет задачи и изображения мягко удаленных канбанов небольшими "
+        "порциями, чтобы не держать блокировку на запись долго, и записи "
+        "об удаленных задачах старше SYNC_TOMBSTONE_DAYS"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Пауза между порциями, чтобы пропускать других писателей",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=0,
+            help="Работать постоянно, проверяя новые канбаны раз в N секунд",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = pruned = 0
+            for alias in shards.aliases():
+                with shards.use_shard(alias):
+                    purged += self.purge(options["batch_size"], options["pause"])
+                    pruned += self.prune_tombstones(
+                        options["batch_size"], options["pause"]
+                    )
+            if purged:
+                self.stdout.write(f"Удалено канбанов: {purged}")
+            if pruned:
+                self.stdout.write(f"Удалено записей об удалении задач: {pruned}")
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
+
+    def purge(self, batch_size, pause) -> int:
+        kanban_pks = list(
+            Kanban.all_objects.filter(datetime_deleted__isnull=False).values_list(
+                "pk", flat=True
+            )
+        )
+        purged = 0
+        for kanban_pk in kanban_pks:
+            while self.delete_batch(kanban_pk, batch_size):
+                time.sleep(pause)
+            Kanban.all_objects.filter(pk=kanban_pk).delete()
+            # участники лежат в default, каскад до них не доходит
+            KanbanMembership.objects.filter(kanban_id=kanban_pk).delete()
+            purged += 1
+        return purged
+
+    def delete_batch(self, kanban_pk, batch_size) -> int:
+        with shards.atomic():
+            batch = list(
+                Task.all_objects.filter(kanban_id=kanban_pk).values_list(
+                    "pk", "image"
+                )[:batch_size]
+            )
+            if not batch:
+                return 0
+            Task.all_objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+        # файлы удаляются после коммита, блокировка базы уже отпущена
+        for _, image in batch:
+            if image:
+                default_storage.delete(image)
+        return len(batch)
+
+    def prune_tombstones(self, batch_size, pause) -> int:
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        pruned = 0
+        while True:
+            pks = list(
+                TaskTombstone.objects.filter(datetime_deleted__lt=cutoff).values_list(
+                    "pk", flat=True
+                )[:batch_size]
+            )
+            if not pks:
+                return pruned
+            TaskTombstone.objects.filter(pk__in=pks).delete()
+            pruned += len(pks)
+            time.sleep(pause)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+
+from tasks import shards
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = "Укорачивает ранги карточек в колонках, где они стали слишком длинными"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-length",
+            type=int,
+            default=32,
+            help="Перестраивать колонки, где есть ранг длиннее",
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Перестроить все колонки"
+        )
+
+    def handle(self, *args, **options):
+        tasks = Task.all_objects.all()
+        if not options["all"]:
+            tasks = tasks.annotate(rank_length=Length("rank")).filter(
+                rank_length__gt=options["max_length"]
+            )
+        columns = []
+        for shard_columns in shards.fan_out(
+            lambda: list(tasks.values_list("kanban_id", "state").distinct())
+        ).values():
+            columns += shard_columns
+        updated = 0
+        for kanban_id, state in columns:
+            updated += Task.rebalance_ranks(kanban_id, state)
+        self.stdout.write(f"Колонок: {len(columns)}, карточек: {updated}")
@@ -0,0 +1,212 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from tasks import permissions, shards
+from tasks.models import (
+    ChangeCounter,
+    Kanban,
+    KanbanMembership,
+    KanbanRedirect,
+    Task,
+    TaskBlockerPath,
+    TaskComment,
+    TaskDependency,
+    WebhookDelivery,
+    WebhookSubscription,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит канбаны из самого загруженного шарда в наименее "
+        "загруженный. Канбан и его задачи получают новые id из диапазона "
+        "нового шарда, старые ссылки на них перенаправляются на новые"
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=100, help="Сколько канбанов перенести"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, какие канбаны будут перенесены",
+        )
+
+    def handle(self, *args, **options):
+        loads = {alias: self.load(alias) for alias in shards.aliases()}
+        moved = 0
+        while moved < options["limit"]:
+            plan = self.plan(loads)
+            if plan is None:
+                break
+            source, target, kanban_pk = plan
+            size = loads[source].pop(kanban_pk)
+            if options["dry_run"]:
+                new_pk = kanban_pk
+            else:
+                new_pk = self.move(kanban_pk, source, target)
+            loads[target][new_pk] = size
+            moved += 1
+            self.stdout.write(f"Канбан {kanban_pk}: {source} -> {target} ({new_pk})")
+        totals = ", ".join(
+            f"{alias}: {sum(load.values())}" for alias, load in loads.items()
+        )
+        self.stdout.write(f"Перенесено канбанов: {moved}. Нагрузка: {totals}")
+
+    def load(self, alias) -> dict:
+        """{id канбана: число задач + 1} для неудаленных канбанов шарда."""
+        kanbans = Kanban.objects.using(alias).values_list("pk", flat=True)
+        load = {pk: 1 for pk in kanbans}
+        counts = (
+            Task.all_objects.using(alias)
+            .filter(kanban_id__in=list(load))
+            .values_list("kanban_id")
+            .annotate(count=Count("pk"))
+            .order_by()
+        )
+        for kanban_id, count in counts:
+            load[kanban_id] += count
+        return load
+
+    def plan(self, loads):
+        totals = {alias: sum(load.values()) for alias, load in loads.items()}
+        source = max(totals, key=totals.get)
+        target = min(totals, key=totals.get)
+        gap = totals[source] - totals[target]
+        # перенос канбана размера size меняет разницу на |gap - 2 * size|,
+        # это выигрыш, только если size < gap
+        candidates = [pk for pk, size in loads[source].items() if size < gap]
+        if not candidates:
+            return None
+        kanban_pk = min(
+            candidates, key=lambda pk: abs(gap - 2 * loads[source][pk])
+        )
+        return source, target, kanban_pk
+
+    def move(self, kanban_pk, source, target) -> int:
+        """
+        Копирует канбан в target, переключает на копию участников, пишет
+        старые id в KanbanRedirect и удаляет оригинал. Все это время
+        оригинал заморожен: строки канбана прочитаны с блокировкой в
+        транзакции source (в SQLite BEGIN IMMEDIATE блокирует запись во
+        всю базу), параллельные записи ждут ее конца и потом не находят
+        канбан. Файлы изображений не копируются: копии задач ссылаются на
+        те же имена. Если перенос прервется после коммита копии, ее нужно
+        удалить вручную.
+        """
+        with transaction.atomic(using=source):
+            kanban = (
+                Kanban.all_objects.using(source).select_for_update().get(pk=kanban_pk)
+            )
+            tasks = list(
+                Task.all_objects.using(source)
+                .select_for_update()
+                .filter(kanban_id=kanban_pk)
+            )
+            comments = list(
+                TaskComment.objects.using(source).filter(task__kanban_id=kanban_pk)
+            )
+            # зависимости бывают только внутри канбана
+            dependencies = list(
+                TaskDependency.objects.using(source).filter(task__kanban_id=kanban_pk)
+            )
+            paths = list(
+                TaskBlockerPath.objects.using(source).filter(
+                    descendant__kanban_id=kanban_pk
+                )
+            )
+            subscriptions = list(
+                WebhookSubscription.objects.using(source)
+                .select_for_update()
+                .filter(kanban_id=kanban_pk)
+            )
+            # отправка, которую воркер завершит после чтения, ушла бы дважды
+            deliveries = list(
+                WebhookDelivery.objects.using(source)
+                .select_for_update()
+                .filter(
+                    subscription__kanban_id=kanban_pk,
+                    state__in=["PENDING", "SENDING"],
+                )
+            )
+
+            old_task_pks = [task.pk for task in tasks]
+            with transaction.atomic(using=target):
+                # bulk_create не вызывает Kanban.save и не создает участника
+                new_kanban = self.copy([kanban], target)[0]
+                # номера изменений у каждого шарда свои
+                with shards.use_shard(target):
+                    change_seq = ChangeCounter.next()
+                for task in tasks:
+                    task.kanban_id = new_kanban.pk
+                    task.change_seq = change_seq
+                self.copy(tasks, target)
+                new_task_pks = dict(zip(old_task_pks, (task.pk for task in tasks)))
+                for dependency in dependencies:
+                    dependency.blocker_id = new_task_pks[dependency.blocker_id]
+                    dependency.task_id = new_task_pks[dependency.task_id]
+                self.copy(dependencies, target)
+                for path in paths:
+                    path.ancestor_id = new_task_pks[path.ancestor_id]
+                    path.descendant_id = new_task_pks[path.descendant_id]
+                self.copy(paths, target)
+                for comment in comments:
+                    comment.task_id = new_task_pks[comment.task_id]
+                self.copy(comments, target)
+                old_subscription_pks = [item.pk for item in subscriptions]
+                for subscription in subscriptions:
+                    subscription.kanban_id = new_kanban.pk
+                self.copy(subscriptions, target)
+                new_subscription_pks = dict(
+                    zip(old_subscription_pks, (item.pk for item in subscriptions))
+                )
+                for delivery in deliveries:
+                    delivery.subscription_id = new_subscription_pks[
+                        delivery.subscription_id
+                    ]
+                self.copy(deliveries, target)
+
+            user_ids = list(
+                KanbanMembership.objects.filter(kanban_id=kanban_pk).values_list(
+                    "user_id", flat=True
+                )
+            )
+            KanbanMembership.objects.filter(kanban_id=kanban_pk).update(
+                kanban_id=new_kanban.pk
+            )
+            KanbanRedirect.objects.bulk_create(
+                [
+                    KanbanRedirect(
+                        kind=KanbanRedirect.KANBAN,
+                        old_id=kanban_pk,
+                        new_id=new_kanban.pk,
+                    )
+                ]
+                + [
+                    KanbanRedirect(kind=KanbanRedirect.TASK, old_id=old, new_id=new)
+                    for old, new in new_task_pks.items()
+                ],
+                batch_size=500,
+            )
+
+            # удаление через QuerySet не трогает файлы, они нужны копиям;
+            # канбан заморожен, поэтому его задачи - ровно скопированные
+            Task.all_objects.using(source).filter(kanban_id=kanban_pk).delete()
+            Kanban.all_objects.using(source).filter(pk=kanban_pk).delete()
+        for user_id in user_ids:
+            permissions.invalidate(user_id)
+        return new_kanban.pk
+
+    def copy(self, objects: list, alias) -> list:
+        if not objects:
+            return objects
+        for obj in objects:
+            obj.pk = None
+            obj._state.adding = True
+            obj._state.db = None
+        return type(objects[0])._base_manager.using(alias).bulk_create(
+            objects, batch_size=500
+        )
@@ -0,0 +1,147 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Запускается в отдельном процессе: в текущем все модули уже импортированы.
+# -X importtime не видит модули, загруженные через importlib.import_module
+# (а так Django грузит приложения и их models), поэтому время выполнения
+# каждого модуля меряется через обертку загрузчика в sys.meta_path.
+SETUP_SCRIPT = """
+import json
+import sys
+import time
+
+timings = {}
+stack = []
+
+
+class TimedLoader:
+    def __init__(self, loader, name):
+        self.loader = loader
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        stack.append(0.0)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            nested = stack.pop()
+            total = time.perf_counter() - start
+            timings[self.name] = (total - nested, total)
+            if stack:
+                stack[-1] += total
+
+
+class TimingFinder:
+    @classmethod
+    def find_spec(cls, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is cls or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, name)
+                return spec
+        return None
+
+
+start = time.perf_counter()
+sys.meta_path.insert(0, TimingFinder)
+import django
+
+django.setup()
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": timings}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время холодного django.setup() и время импорта модулей, "
+        "проверяет бюджет STARTUP_TIME_BUDGET_SECONDS и ленивые модули"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=20)
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=None,
+            help="Бюджет в секундах вместо STARTUP_TIME_BUDGET_SECONDS",
+        )
+
+    def handle(self, *args, **options):
+        budget = options["budget"] or settings.STARTUP_TIME_BUDGET_SECONDS
+        timings = []
+        imports = {}
+        for _ in range(max(options["runs"], 1)):
+            seconds, modules = self.profile_setup()
+            timings.append(seconds)
+            for name, (own, cumulative) in modules.items():
+                imports.setdefault(name, []).append((own, cumulative))
+
+        # медиана по прогонам сглаживает дисковый кеш и шум планировщика
+        modules = {
+            name: (
+                statistics.median(own for own, _ in values),
+                statistics.median(cumulative for _, cumulative in values),
+            )
+            for name, values in imports.items()
+        }
+        top = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)
+        self.stdout.write(f"{'модуль':<50} {'свое, мс':>9} {'всего, мс':>10}")
+        for name, (own, cumulative) in top[: options["top"]]:
+            self.stdout.write(
+                f"{name:<50} {own * 1000:>9.1f} {cumulative * 1000:>10.1f}"
+            )
+
+        seconds = statistics.median(timings)
+        self.stdout.write(
+            f"django.setup(): {seconds:.3f} с (медиана {len(timings)} запусков), "
+            f"модулей: {len(modules)}, бюджет: {budget:.3f} с"
+        )
+
+        errors = []
+        eager = sorted(
+            name
+            for name in modules
+            for lazy in settings.STARTUP_LAZY_MODULES
+            if name == lazy or name.startswith(lazy + ".")
+        )
+        if eager:
+            errors.append(
+                "При старте импортированы ленивые модули: " + ", ".join(eager[:10])
+            )
+        if seconds > budget:
+            errors.append(f"Старт {seconds:.3f} с превышает бюджет {budget:.3f} с")
+        if errors:
+            raise CommandError("\n".join(errors))
+
+    def profile_setup(self) -> tuple[float, dict]:
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "my_project.settings")
+        result = subprocess.run(
+            [sys.executable, "-c", SETUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        return data["seconds"], data["modules"]
@@ -0,0 +1,125 @@
+"""
+Отдача защищенных медиафайлов.
+
+Права проверяет Django, а сами байты по возможности отдает фронтовой
+сервер: nginx через X-Accel-Redirect или apache/lighttpd через X-Sendfile.
+Без фронтового сервера файл стримится из Python с поддержкой Range и
+условных запросов.
+"""
+
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def serve_media(request, name: str) -> HttpResponse:
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    backend = settings.MEDIA_SERVE_BACKEND
+
+    if backend == "x-accel":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+    elif backend == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(Path(settings.MEDIA_ROOT) / name)
+    else:
+        path = Path(settings.MEDIA_ROOT) / name
+        response = _stream_file(request, path, content_type)
+    response["Cache-Control"] = f"private, max-age={settings.MEDIA_CACHE_SECONDS}"
+    return response
+
+
+def _stream_file(request, path: Path, content_type: str) -> HttpResponse:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise Http404("Файл не найден")
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = _parse_range(request, size, etag, last_modified)
+    if byte_range == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(path.open("rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _parse_range(request, size: int, etag: str, last_modified: int):
+    header = request.headers.get("Range")
+    if not header:
+        return None
+
+    # If-Range: диапазон отдается, только если файл не поменялся
+    if_range = request.headers.get("If-Range")
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    # несколько диапазонов не поддерживаем, отдаем файл целиком
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _read_range(path: Path, start: int, length: int):
+    with path.open("rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
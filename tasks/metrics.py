@@ -0,0 +1,259 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Каждый процесс (воркер gunicorn) копит значения в памяти и периодически
+сбрасывает их в свой файл в METRICS_DIR. Вьюха /metrics суммирует файлы
+всех процессов, поэтому внешний сервис для агрегации не нужен.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "http_requests_total": ("counter", "Количество HTTP-запросов", None),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Время обработки запроса по имени URL",
+        DEFAULT_BUCKETS,
+    ),
+    "task_transitions_total": ("counter", "Переходы задач между статусами", None),
+    "image_processing_seconds": (
+        "histogram",
+        "Время обработки изображения задачи",
+        DEFAULT_BUCKETS,
+    ),
+    "image_bytes_total": ("counter", "Байты изображений до и после обработки", None),
+    "overdue_sweeps_total": ("counter", "Запуски пометки просроченных задач", None),
+    "overdue_tasks_total": ("counter", "Задачи, помеченные просроченными", None),
+    "overdue_sweep_duration_seconds": (
+        "histogram",
+        "Время пометки просроченных задач",
+        DEFAULT_BUCKETS,
+    ),
+}
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.pid = None
+        self.last_flush = 0.0
+
+    def _check_pid(self):
+        # после fork воркер не должен унаследовать значения мастера
+        pid = os.getpid()
+        if self.pid != pid:
+            self.pid = pid
+            self.counters = {}
+            self.histograms = {}
+            self.last_flush = time.monotonic()
+            self._load_own_file()
+
+    def _load_own_file(self):
+        # pid мог достаться от умершего процесса, продолжаем его счетчики
+        path = _process_file(self.pid)
+        if not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        for name, labels, value in data.get("counters", []):
+            self.counters[(name, tuple(map(tuple, labels)))] = value
+        for name, labels, buckets, total, count in data.get("histograms", []):
+            self.histograms[(name, tuple(map(tuple, labels)))] = [
+                buckets,
+                total,
+                count,
+            ]
+
+    def inc(self, name, value, labels):
+        with self.lock:
+            self._check_pid()
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, value, labels):
+        bounds = METRICS[name][2]
+        with self.lock:
+            self._check_pid()
+            key = (name, labels)
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * len(bounds), 0.0, 0]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        with self.lock:
+            due = time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        # файл пишется под блокировкой: иначе два потока пишут один .tmp
+        # и os.replace может выложить файл со смесью их данных
+        with self.lock:
+            self._check_pid()
+            data = {
+                "counters": [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, labels, hist[0], hist[1], hist[2]]
+                    for (name, labels), hist in self.histograms.items()
+                ],
+            }
+            self.last_flush = time.monotonic()
+            path = _process_file(self.pid)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data))
+            os.replace(tmp_path, path)
+
+
+_registry = _Registry()
+
+
+def _process_file(pid) -> Path:
+    return Path(settings.METRICS_DIR) / f"metrics_{pid}.json"
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if settings.METRICS_ENABLED:
+        _registry.inc(name, value, _labels(labels))
+
+
+def observe(name: str, value: float, **labels):
+    if settings.METRICS_ENABLED:
+        _registry.observe(name, value, _labels(labels))
+
+
+@contextmanager
+def timer(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def track_transition(method):
+    """Считает вызовы метода перехода задачи, успешные и с ошибкой."""
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            inc("task_transitions_total", transition=method.__name__, result="error")
+            raise
+        inc("task_transitions_total", transition=method.__name__, result="ok")
+        return result
+
+    return wrapper
+
+
+def flush():
+    if settings.METRICS_ENABLED and _registry.pid is not None:
+        _registry.flush()
+
+
+def collect() -> tuple[dict, dict]:
+    """Суммирует значения из файлов всех процессов."""
+    counters = {}
+    histograms = {}
+    metrics_dir = Path(settings.METRICS_DIR)
+    if not metrics_dir.is_dir():
+        return counters, histograms
+    for path in metrics_dir.glob("metrics_*.json"):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in data.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            hist = histograms.get(key)
+            if hist is None:
+                hist = histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bucket in enumerate(buckets):
+                hist[0][i] += bucket
+            hist[1] += total
+            hist[2] += count
+    return counters, histograms
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    counters, histograms = collect()
+    prefix = settings.METRICS_PREFIX
+    lines = []
+    for name, (metric_type, help_text, bounds) in METRICS.items():
+        full_name = f"{prefix}{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        if metric_type == "counter":
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(
+                        f"{full_name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+            continue
+        for (key_name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            for bound, bucket in zip(bounds, buckets):
+                bucket_labels = labels + (("le", _format_value(bound)),)
+                lines.append(
+                    f"{full_name}_bucket{_format_labels(bucket_labels)} {bucket}"
+                )
+            inf_labels = labels + (("le", "+Inf"),)
+            lines.append(f"{full_name}_bucket{_format_labels(inf_labels)} {count}")
+            lines.append(
+                f"{full_name}_sum{_format_labels(labels)} {_format_value(total)}"
+            )
+            lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+atexit.register(flush)
@@ -0,0 +1,164 @@
+import time
+
+from django.conf import settings
+from django.http import HttpResponseRedirect
+from django.shortcuts import render
+from django.urls import reverse
+
+from . import metrics, shards
+from .models import KanbanRedirect
+from .ratelimit import client_key, take_token
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        metrics.observe(
+            "http_request_duration_seconds", duration, view=view, method=request.method
+        )
+        metrics.inc(
+            "http_requests_total",
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """После записи клиент какое-то время читает с основной базы."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ShardRoutingMiddleware:
+    """
+    Запросы к канбану или задаче идут в шард, зашитый в id из URL
+    (pk или kanban_pk), см. tasks/shards.py.
+
+    GET по id канбана или задачи, перенесенных в другой шард, получает
+    редирект на новый id. Справочник переносов читается только для
+    ответов 403 и 404: по старому id объекта уже нет, а прав на него нет.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_shard_token", None)
+            if token is not None:
+                shards._current_shard.reset(token)
+        if response.status_code in (403, 404) and request.method in ("GET", "HEAD"):
+            return self.redirect_moved(request) or response
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.namespace != "tasks":
+            return None
+        pk = view_kwargs.get("kanban_pk") or view_kwargs.get("pk")
+        if pk is not None:
+            request._shard_token = shards._current_shard.set(shards.shard_for_id(pk))
+        return None
+
+    def redirect_moved(self, request):
+        match = request.resolver_match
+        if match is None or match.namespace != "tasks":
+            return None
+        kwargs = dict(match.kwargs)
+        if "kanban_pk" in kwargs:
+            name, kind = "kanban_pk", KanbanRedirect.KANBAN
+        elif "pk" in kwargs and match.url_name.startswith("kanban_"):
+            name, kind = "pk", KanbanRedirect.KANBAN
+        elif "pk" in kwargs:
+            name, kind = "pk", KanbanRedirect.TASK
+        else:
+            return None
+        new_id = KanbanRedirect.resolve(kind, kwargs[name])
+        if new_id is None:
+            return None
+        kwargs[name] = new_id
+        url = reverse(match.view_name, kwargs=kwargs)
+        # курсор синхронизации и фильтры идут дальше вместе с запросом
+        if request.META.get("QUERY_STRING"):
+            url += "?" + request.META["QUERY_STRING"]
+        return HttpResponseRedirect(url)
+
+
+class UploadHandlerMiddleware:
+    """
+    Ставит обработчики загрузки из view.upload_handler_classes.
+
+    Должен стоять до CsrfViewMiddleware: после чтения request.POST
+    обработчики поменять уже нельзя.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        handler_classes = getattr(view_class, "upload_handler_classes", ())
+        for handler_class in reversed(handler_classes):
+            request.upload_handlers.insert(0, handler_class(request))
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    Ограничивает частоту запросов к URL из RATE_LIMITS.
+
+    Работает в process_view, до CsrfViewMiddleware, чтобы тело запроса
+    с файлом не разбиралось, если клиент уже превысил лимит.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        limit = settings.RATE_LIMITS.get(view_name)
+        if limit is None or request.method not in limit["methods"]:
+            return None
+
+        client = client_key(request, limit["key"], view_kwargs)
+        retry_after = take_token(view_name, client, limit["rate"], limit["period"])
+        if not retry_after:
+            return None
+        response = render(
+            request,
+            "tasks/error.html",
+            {"error_message": "Слишком много запросов, попробуйте позже"},
+            status=429,
+        )
+        response["Retry-After"] = str(retry_after)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_task_image_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kanban',
+            name='datetime_deleted',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_memberships(apps, schema_editor):
+    Kanban = apps.get_model('tasks', 'Kanban')
+    Task = apps.get_model('tasks', 'Task')
+    KanbanMembership = apps.get_model('tasks', 'KanbanMembership')
+
+    memberships = {
+        (kanban_id, owner_id): 'OWNER'
+        for kanban_id, owner_id in Kanban.objects.values_list('pk', 'owner_id')
+    }
+    executors = (
+        Task.objects.filter(executor__isnull=False)
+        .values_list('kanban_id', 'executor_id')
+        .distinct()
+    )
+    for key in executors:
+        memberships.setdefault(key, 'EXECUTOR')
+    KanbanMembership.objects.bulk_create(
+        [
+            KanbanMembership(kanban_id=kanban_id, user_id=user_id, role=role)
+            for (kanban_id, user_id), role in memberships.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0018_kanban_datetime_deleted'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KanbanMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('OWNER', 'OWNER'), ('EXECUTOR', 'EXECUTOR')], default='EXECUTOR', max_length=20)),
+                ('datetime_joined', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('kanban', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='tasks.kanban')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kanban_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Участник канбана',
+                'verbose_name_plural': 'Участники канбанов',
+                'constraints': [models.UniqueConstraint(fields=('user', 'kanban'), name='unique_kanban_member')],
+            },
+        ),
+        migrations.RunPython(create_memberships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from tasks.ranking import spread_ranks
+
+
+def fill_ranks(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    columns = Task.objects.values_list('kanban_id', 'state').distinct()
+    for kanban_id, state in columns:
+        pks = list(
+            Task.objects.filter(kanban_id=kanban_id, state=state)
+            .order_by('datetime_created', 'pk')
+            .values_list('pk', flat=True)
+        )
+        Task.objects.bulk_update(
+            [Task(pk=pk, rank=rank) for pk, rank in zip(pks, spread_ranks(len(pks)))],
+            ['rank'],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0019_kanbanmembership'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['kanban', 'state', 'rank'], name='task_column_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0020_task_rank'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['executor', 'state', 'datetime_deadline'], name='task_executor_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0021_task_executor_deadline_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('secret', models.CharField(blank=True, max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('datetime_created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('kanban', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to='tasks.kanban')),
+            ],
+            options={
+                'verbose_name': 'Вебхук',
+                'verbose_name_plural': 'Вебхуки',
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=50)),
+                ('payload', models.JSONField()),
+                ('state', models.CharField(choices=[('PENDING', 'PENDING'), ('DELIVERED', 'DELIVERED'), ('FAILED', 'FAILED')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('datetime_created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('datetime_next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('datetime_delivered', models.DateTimeField(blank=True, null=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='tasks.webhooksubscription')),
+            ],
+            options={
+                'verbose_name': 'Отправка вебхука',
+                'verbose_name_plural': 'Отправки вебхуков',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='webhooksubscription',
+            index=models.Index(fields=['kanban', 'is_active'], name='webhook_kanban_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webhookdelivery',
+            index=models.Index(fields=['state', 'datetime_next_attempt'], name='webhook_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0022_webhooks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kanban',
+            name='is_template',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0027_shard_cross_db_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskBlockerPath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paths', models.PositiveIntegerField(default=1)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dependent_paths', to='tasks.task')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocker_paths', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Путь зависимости',
+                'verbose_name_plural': 'Пути зависимостей',
+                'indexes': [models.Index(fields=['descendant', 'ancestor'], name='blocker_path_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_blocker_path')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('blocker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='tasks.task')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocked_by', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Зависимость задачи',
+                'verbose_name_plural': 'Зависимости задач',
+                'indexes': [models.Index(fields=['task'], name='dependency_task_idx')],
+                'constraints': [models.UniqueConstraint(fields=('blocker', 'task'), name='unique_task_dependency')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0031_task_change_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KanbanRedirect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('KANBAN', 'KANBAN'), ('TASK', 'TASK')], max_length=20)),
+                ('old_id', models.BigIntegerField()),
+                ('new_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Перенесенный объект',
+                'verbose_name_plural': 'Перенесенные объекты',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'old_id'), name='unique_kanban_redirect')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0032_kanban_redirect'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tasktombstone',
+            name='task_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -1,17 +1,40 @@
-from os import rename
+import shutil
+from os import link, rename
 from uuid import uuid4
 
-from PIL import Image
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.db import models
+from django.db.models import Exists, F, Max, OuterRef
 from django.utils import timezone
 
+from . import metrics, shards
+from .ranking import rank_between, spread_ranks
+
+
+class ActiveKanbanManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(datetime_deleted__isnull=True)
+
+
+class ActiveTaskManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(kanban__datetime_deleted__isnull=True)
+
 
 class Kanban(models.Model):
     title = models.CharField(max_length=100)
-    owner = models.ForeignKey(User, related_name="kanbans", on_delete=models.CASCADE)
+    # пользователи живут в default, канбан может быть в другом шарде
+    owner = models.ForeignKey(
+        User, related_name="kanbans", on_delete=models.CASCADE, db_constraint=False
+    )
+    # удаленный канбан скрыт сразу, задачи удаляет команда purge_kanbans
+    datetime_deleted = models.DateTimeField(null=True, blank=True, db_index=True)
+    is_template = models.BooleanField(default=False)
+
+    objects = ActiveKanbanManager()
+    all_objects = models.Manager()
 
     def __str__(self) -> str:
         return self.title
@@ -20,11 +43,220 @@ class Kanban(models.Model):
         verbose_name = "Канбан"
         verbose_name_plural = "Канбаны"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # по нему save замечает смену владельца
+        if "owner_id" in field_names:
+            instance._loaded_owner_id = instance.owner_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if shards.shard_for_id(self.pk) != self._state.db:
+            raise ImproperlyConfigured(
+                f"id {self.pk} вне диапазона шарда {self._state.db}, "
+                f"выполните migrate --database {self._state.db}"
+            )
+        if adding:
+            KanbanMembership.objects.create(
+                kanban=self, user_id=self.owner_id, role=KanbanMembership.OWNER
+            )
+        elif getattr(self, "_loaded_owner_id", None) != self.owner_id:
+            KanbanMembership.set_owner(self.pk, self.owner_id)
+        self._loaded_owner_id = self.owner_id
+
+    def soft_delete(self):
+        self.datetime_deleted = timezone.now()
+        self.save(update_fields=["datetime_deleted"])
+
+    def clone(self, owner, as_template=False) -> "Kanban":
+        """
+        Копия канбана с задачами в статусе PLANNED. Задачи вставляются
+        одним bulk_create, изображения не перекодируются, а получают
+        жесткую ссылку на тот же файл. Копия попадает в случайный шард.
+        """
+        tasks = list(
+            self.tasks.values("title", "description", "image", "state", "rank")
+        )
+        # ссылки создаются до транзакции, чтобы не держать блокировку;
+        # если транзакция не пройдет, файлы уберет cleanup_media
+        for task in tasks:
+            if task["image"]:
+                task["image"] = self.link_image(task["image"])
+
+        with shards.use_shard(shards.choose_shard()), shards.atomic():
+            kanban = Kanban.objects.create(
+                title=self.title, owner=owner, is_template=as_template
+            )
+            # ранги из разных колонок могут совпасть, в PLANNED их нужно
+            # перестроить, сохранив порядок колонок
+            ranks = spread_ranks(len(tasks))
+            change_seq = ChangeCounter.next()
+            Task.objects.bulk_create(
+                [
+                    Task(
+                        title=task["title"],
+                        description=task["description"],
+                        image=task["image"] or None,
+                        owner=owner,
+                        kanban=kanban,
+                        state="PLANNED",
+                        rank=rank,
+                        change_seq=change_seq,
+                    )
+                    for task, rank in zip(self.sorted_for_clone(tasks), ranks)
+                ],
+                batch_size=500,
+            )
+        return kanban
+
+    @staticmethod
+    def sorted_for_clone(tasks: list) -> list:
+        states = [state for state, _ in Task.state_list]
+        return sorted(
+            tasks, key=lambda task: (states.index(task["state"]), task["rank"])
+        )
+
+    @staticmethod
+    def link_image(name: str) -> str:
+        # старые записи хранили абсолютный путь
+        source = name if name.startswith("/") else f"{settings.MEDIA_ROOT}/{name}"
+        new_name = f"tasks/img/{uuid4()}.{name.split('.')[-1]}"
+        target = f"{settings.MEDIA_ROOT}/{new_name}"
+        try:
+            link(source, target)
+        except FileNotFoundError:
+            return ""
+        except OSError:
+            # другая файловая система или ФС без жестких ссылок
+            shutil.copyfile(source, target)
+        return new_name
+
+
+class KanbanMembership(models.Model):
+    OWNER = "OWNER"
+    EXECUTOR = "EXECUTOR"
+    role_list = [
+        (OWNER, "OWNER"),
+        (EXECUTOR, "EXECUTOR"),
+    ]
+
+    # справочник участников лежит в default, а канбан - в своем шарде,
+    # поэтому участников удаляют явно (purge_kanbans, rebalance_shards)
+    kanban = models.ForeignKey(
+        Kanban,
+        related_name="memberships",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    user = models.ForeignKey(
+        User, related_name="kanban_memberships", on_delete=models.CASCADE
+    )
+    role = models.CharField(default=EXECUTOR, choices=role_list, max_length=20)
+    datetime_joined = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self) -> str:
+        return f"{self.user_id} - {self.kanban_id} ({self.role})"
+
+    class Meta:
+        verbose_name = "Участник канбана"
+        verbose_name_plural = "Участники канбанов"
+        # индекс (user, kanban) отвечает и на "мои канбаны", и на проверку прав
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kanban"], name="unique_kanban_member"
+            )
+        ]
+
+    @classmethod
+    def has_access(cls, user, kanban_id, roles=None) -> bool:
+        if not user.is_authenticated:
+            return False
+        memberships = cls.objects.filter(user_id=user.pk, kanban_id=kanban_id)
+        if roles:
+            memberships = memberships.filter(role__in=roles)
+        return memberships.exists()
+
+    @classmethod
+    def add_executor(cls, kanban_id, user_id):
+        cls.objects.get_or_create(
+            kanban_id=kanban_id, user_id=user_id, defaults={"role": cls.EXECUTOR}
+        )
+
+    @classmethod
+    def set_owner(cls, kanban_id, user_id):
+        """
+        Роль OWNER переходит к новому владельцу канбана, прежний остается
+        исполнителем. Участники сохраняются по одному, чтобы сигналы
+        сбросили их кеш прав.
+        """
+        previous = cls.objects.filter(kanban_id=kanban_id, role=cls.OWNER).exclude(
+            user_id=user_id
+        )
+        for membership in previous:
+            membership.role = cls.EXECUTOR
+            membership.save(update_fields=["role"])
+        membership, created = cls.objects.get_or_create(
+            kanban_id=kanban_id, user_id=user_id, defaults={"role": cls.OWNER}
+        )
+        if not created and membership.role != cls.OWNER:
+            membership.role = cls.OWNER
+            membership.save(update_fields=["role"])
+
+
+class KanbanRedirect(models.Model):
+    """
+    Старый id канбана или задачи, перенесенных rebalance_shards в другой
+    шард. Лежит в default: по старому id шард нового объекта не найти.
+    """
+
+    KANBAN = "KANBAN"
+    TASK = "TASK"
+    kind_list = [
+        (KANBAN, "KANBAN"),
+        (TASK, "TASK"),
+    ]
+
+    kind = models.CharField(choices=kind_list, max_length=20)
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.old_id} -> {self.new_id}"
+
+    class Meta:
+        verbose_name = "Перенесенный объект"
+        verbose_name_plural = "Перенесенные объекты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "old_id"], name="unique_kanban_redirect"
+            )
+        ]
+
+    @classmethod
+    def resolve(cls, kind, old_id):
+        """Текущий id объекта или None, если он не переносился."""
+        new_id = None
+        # канбан могли перенести несколько раз
+        while True:
+            found = (
+                cls.objects.filter(kind=kind, old_id=old_id)
+                .values_list("new_id", flat=True)
+                .first()
+            )
+            if found is None:
+                return new_id
+            new_id = old_id = found
+
 
 class Task(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
-    owner = models.ForeignKey(User, related_name="tasks", on_delete=models.CASCADE)
+    owner = models.ForeignKey(
+        User, related_name="tasks", on_delete=models.CASCADE, db_constraint=False
+    )
     image = models.ImageField(upload_to="tasks/img/", blank=True, null=True)
     kanban = models.ForeignKey(Kanban, related_name="tasks", on_delete=models.CASCADE)
     state_list = [
@@ -40,7 +272,10 @@ class Task(models.Model):
     datetime_deadline = models.DateTimeField(null=True, blank=True)
     datetime_review = models.DateTimeField(null=True, blank=True)
     datetime_done = models.DateTimeField(null=True, blank=True)
-    datetime_last_update = models.DateTimeField(default=timezone.now)
+    # меняются при каждом изменении задачи; синхронизация идет по номеру
+    # изменения из ChangeCounter, время может прийти не по порядку коммитов
+    datetime_last_update = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
     datetime_deadline = models.DateTimeField(null=True, blank=True)
     executor = models.ForeignKey(
         User,
@@ -48,7 +283,15 @@ class Task(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
+        db_constraint=False,
     )
+    # порядок карточки в колонке, см. tasks/ranking.py
+    rank = models.CharField(max_length=255, default="", editable=False)
+    # счетчик для карточек доски, меняют только add_comment/delete_comment
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ActiveTaskManager()
+    all_objects = models.Manager()
 
     def __str__(self) -> str:
         return self.title
@@ -56,24 +299,250 @@ class Task(models.Model):
     class Meta:
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
+        indexes = [
+            models.Index(fields=["image"], name="task_image_idx"),
+            models.Index(
+                fields=["kanban", "state", "rank"], name="task_column_rank_idx"
+            ),
+            models.Index(
+                fields=["executor", "state", "datetime_deadline"],
+                name="task_executor_deadline_idx",
+            ),
+            models.Index(
+                fields=["kanban", "datetime_created"], name="task_kanban_created_idx"
+            ),
+            models.Index(
+                fields=["kanban", "datetime_last_update"],
+                name="task_kanban_updated_idx",
+            ),
+            models.Index(
+                fields=["kanban", "change_seq"], name="task_kanban_change_idx"
+            ),
+            # фильтр и date_hierarchy в админке
+            models.Index(fields=["datetime_created"], name="task_created_idx"),
+            models.Index(
+                fields=["state", "datetime_created"], name="task_state_created_idx"
+            ),
+        ]
 
+    @shards.in_kanban_shard
     def delete(self, *args, **kwargs):  # FIXME: если файл удален то FileNotFoundError
         if self.image:
             self.image.delete(save=False)
-        super().delete(*args, **kwargs)
+        payload = self.webhook_payload()
+        pk = self.pk
+        with shards.atomic():
+            # каскад удалил бы ребра, но оставил бы пути через эту задачу
+            for dependency in TaskDependency.objects.filter(
+                models.Q(blocker_id=pk) | models.Q(task_id=pk)
+            ):
+                TaskDependency.unlink(dependency.blocker_id, dependency.task_id)
+            result = super().delete(*args, **kwargs)
+            TaskTombstone.objects.create(task_id=pk, kanban_id=self.kanban_id)
+            WebhookDelivery.enqueue([(self.kanban_id, "task.deleted", payload)])
+        return result
 
+    @shards.in_kanban_shard
     def save(self):
+        adding = self._state.adding
+        old_state = None
         if self.pk:
-            old_image = Task.objects.get(pk=self.pk).image
+            old_task = Task.objects.get(pk=self.pk)
+            old_state = old_task.state
+            # объект мог быть загружен до нового комментария; в базу
+            # comment_count не пишется (см. saved_fields)
+            self.comment_count = old_task.comment_count
+            old_image = old_task.image
             if old_image and old_image != self.image:
                 old_image.delete(save=False)
-        super().save()
+            # в новой колонке карточка встает в конец
+            if old_task.state != self.state:
+                self.rank = ""
+
+        # событие пишется в outbox в той же транзакции, что и изменение
+        with shards.atomic():
+            # последний ранг читается под блокировкой записи (BEGIN
+            # IMMEDIATE), иначе параллельные вставки получили бы один ранг
+            if not self.rank:
+                self.rank = self.next_rank(self.kanban_id, self.state)
+            self.change_seq = ChangeCounter.next()
+            super().save(update_fields=None if adding else self.saved_fields())
+            if adding:
+                event = ("task.created", self.webhook_payload())
+            elif old_state != self.state:
+                event = ("task.transitioned", self.webhook_payload(old_state))
+            else:
+                event = None
+            if event:
+                WebhookDelivery.enqueue([(self.kanban_id, *event)])
 
         if self.image:
-            self.resize_image()
-            self.convert_img_to_jpg()
-            self.rename_image()
-            super().save()
+            metrics.inc("image_bytes_total", self.image.size, stage="uploaded")
+            with metrics.timer("image_processing_seconds"):
+                self.resize_image()
+                self.convert_img_to_jpg()
+                self.rename_image()
+            metrics.inc("image_bytes_total", self.image.size, stage="stored")
+            with shards.atomic():
+                self.change_seq = ChangeCounter.next()
+                super().save(update_fields=self.saved_fields())
+
+    def saved_fields(self) -> list:
+        """
+        Поля для UPDATE в save: все, кроме comment_count. Его меняет только
+        UPDATE с F() в add_comment и delete_comment, иначе значение,
+        прочитанное до транзакции, затерло бы параллельный комментарий.
+        """
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key and field.name != "comment_count"
+        ]
+
+    @classmethod
+    def next_rank(cls, kanban_id, state) -> str:
+        with shards.use_shard(shards.shard_for_id(kanban_id)):
+            last_rank = (
+                cls.all_objects.filter(kanban_id=kanban_id, state=state)
+                .order_by("-rank")
+                .values_list("rank", flat=True)
+                .first()
+            )
+        return rank_between(last_rank or "", "")
+
+    @classmethod
+    def rebalance_ranks(cls, kanban_id, state):
+        """Переписывает ранги колонки короткими строками с равным шагом."""
+        now = timezone.now()
+        with shards.use_shard(shards.shard_for_id(kanban_id)), shards.atomic():
+            pks = list(
+                cls.all_objects.filter(kanban_id=kanban_id, state=state)
+                .order_by("rank", "pk")
+                .values_list("pk", flat=True)
+            )
+            change_seq = ChangeCounter.next()
+            tasks = [
+                cls(pk=pk, rank=rank, datetime_last_update=now, change_seq=change_seq)
+                for pk, rank in zip(pks, spread_ranks(len(pks)))
+            ]
+            cls.all_objects.bulk_update(
+                tasks, ["rank", "datetime_last_update", "change_seq"], batch_size=500
+            )
+        return len(tasks)
+
+    @shards.in_kanban_shard
+    def move_between(self, after_pk=None, before_pk=None):
+        """
+        Ставит карточку между соседями after и before (id карточек выше и
+        ниже) одним UPDATE. ValidationError, если соседа нет в колонке,
+        ValueError, если after стоит ниже before. Соседей с одинаковым
+        рангом сначала разводит перестройка колонки.
+        """
+        neighbors = {pk for pk in (after_pk, before_pk) if pk}
+        with shards.atomic():
+            ranks = self.column_ranks(neighbors)
+            if neighbors - set(ranks):
+                raise ValidationError("Соседние карточки не найдены в этой колонке")
+            if after_pk and before_pk and ranks[after_pk] == ranks[before_pk]:
+                Task.rebalance_ranks(self.kanban_id, self.state)
+                ranks = self.column_ranks(neighbors)
+            rank = rank_between(ranks.get(after_pk, ""), ranks.get(before_pk, ""))
+            Task.all_objects.filter(pk=self.pk).update(
+                rank=rank,
+                datetime_last_update=timezone.now(),
+                change_seq=ChangeCounter.next(),
+            )
+        self.rank = rank
+
+    def column_ranks(self, pks) -> dict:
+        return dict(
+            Task.objects.filter(
+                pk__in=pks, kanban_id=self.kanban_id, state=self.state
+            ).values_list("pk", "rank")
+        )
+
+    @shards.in_kanban_shard
+    def add_blocker(self, blocker: "Task"):
+        """Задачу нельзя взять в работу, пока blocker не выполнена."""
+        if blocker.kanban_id != self.kanban_id:
+            raise ValidationError("Блокировать может только задача того же канбана")
+        if blocker.pk == self.pk:
+            raise ValidationError("Задача не может блокировать саму себя")
+        with shards.atomic():
+            if TaskDependency.objects.filter(blocker=blocker, task=self).exists():
+                raise ValidationError("Эта задача уже блокирует текущую")
+            if TaskBlockerPath.objects.filter(
+                ancestor_id=self.pk, descendant_id=blocker.pk
+            ).exists():
+                raise ValidationError("Зависимость образует цикл")
+            TaskDependency.objects.create(blocker=blocker, task=self)
+            TaskDependency.link(blocker.pk, self.pk)
+
+    @shards.in_kanban_shard
+    def remove_blocker(self, blocker: "Task"):
+        with shards.atomic():
+            if TaskDependency.objects.filter(blocker=blocker, task=self).exists():
+                TaskDependency.unlink(blocker.pk, self.pk)
+
+    @shards.in_kanban_shard
+    def add_comment(self, author, text: str) -> "TaskComment":
+        with shards.atomic():
+            comment = TaskComment.objects.create(task=self, author=author, text=text)
+            self._change_comment_count(1)
+        return comment
+
+    @shards.in_kanban_shard
+    def delete_comment(self, comment: "TaskComment"):
+        with shards.atomic():
+            deleted, _ = TaskComment.objects.filter(pk=comment.pk, task=self).delete()
+            if deleted:
+                self._change_comment_count(-1)
+
+    def _change_comment_count(self, delta: int):
+        # UPDATE с F() не теряет комментарии, добавленные параллельно
+        Task.all_objects.filter(pk=self.pk).update(
+            comment_count=F("comment_count") + delta,
+            datetime_last_update=timezone.now(),
+            change_seq=ChangeCounter.next(),
+        )
+        self.comment_count += delta
+
+    def blockers(self) -> models.QuerySet:
+        """Все задачи, от которых зависит эта, включая косвенные."""
+        return Task.all_objects.filter(dependent_paths__descendant_id=self.pk)
+
+    def dependents(self) -> models.QuerySet:
+        """Все задачи, которые ждут эту, включая косвенные."""
+        return Task.all_objects.filter(blocker_paths__ancestor_id=self.pk)
+
+    def is_blocked(self) -> bool:
+        return self.blockers().exclude(state="DONE").exists()
+
+    @staticmethod
+    def with_blocked(tasks: models.QuerySet) -> models.QuerySet:
+        """Добавляет поле blocked подзапросом, без запроса на каждую карточку."""
+        return tasks.annotate(
+            blocked=Exists(
+                TaskBlockerPath.objects.filter(descendant_id=OuterRef("pk")).exclude(
+                    ancestor__state="DONE"
+                )
+            )
+        )
+
+    def webhook_payload(self, old_state=None) -> dict:
+        payload = {
+            "id": self.pk,
+            "kanban": self.kanban_id,
+            "title": self.title,
+            "state": self.state,
+            "executor": self.executor_id,
+            "datetime_deadline": (
+                self.datetime_deadline.isoformat() if self.datetime_deadline else None
+            ),
+        }
+        if old_state:
+            payload["old_state"] = old_state
+        return payload
 
     def clean(self):
         super().clean()
@@ -84,15 +553,19 @@ class Task(models.Model):
         if not self.image:
             return
 
-        img = Image.open(self.image)
-        width, height = img.size
-
         if self.image.size / 1024 / 1024 > settings.IMAGE_MAX_SIZE_MB:
             raise ValidationError(f"Изображение больше {settings.IMAGE_MAX_SIZE_MB}мб")
 
+        from PIL import Image
+
+        img = Image.open(self.image)
+        width, height = img.size
+
         return self.image
 
     def resize_image(self):
+        from PIL import Image
+
         img = Image.open(self.image.path)
         if max(img.width, img.height) <= settings.IMAGE_MAX_SIDE_PX:
             return
@@ -106,9 +579,11 @@ class Task(models.Model):
         new_image_name = str(uuid4()) + "." + img_ext
         new_image_path = f"{settings.MEDIA_ROOT}/tasks/img/{new_image_name}"
         rename(self.image.path, new_image_path)
-        self.image.name = new_image_path
+        self.image.name = f"tasks/img/{new_image_name}"
 
     def convert_img_to_jpg(self):
+        from PIL import Image
+
         img = Image.open(self.image.path)
         if img.format.upper() == "JPEG":
             return
@@ -116,8 +591,9 @@ class Task(models.Model):
         new_img = img.convert("RGB")
         new_img.save(new_img_path, format="JPEG", quality=90)
         self.image.delete(save=False)
-        self.image.name = new_img_path.split("/")[-1]
+        self.image.name = "tasks/img/" + new_img_path.split("/")[-1]
 
+    @metrics.track_transition
     def to_assigned(self):
         if not self.executor:
             raise ValueError("Назначьте исполнителя")
@@ -131,11 +607,15 @@ class Task(models.Model):
             raise ValidationError(
                 "Назначить можно только планируемую задачу или задачу на проверке"
             )
+        if self.is_blocked():
+            raise ValidationError("Задачу блокируют невыполненные задачи")
 
         self.state = "IN_PROGRESS"
         self.datetime_assigned = timezone.now()
         self.save()
+        KanbanMembership.add_executor(self.kanban_id, self.executor_id)
 
+    @metrics.track_transition
     def to_review(self):
         if self.state != "IN_PROGRESS":
             raise ValidationError("На проверку можно взять только назначенную задачу")
@@ -143,6 +623,7 @@ class Task(models.Model):
         self.datetime_review = timezone.now()
         self.save()
 
+    @metrics.track_transition
     def to_done(self):
         if self.state != "REVIEW":
             raise ValidationError("Выполнить можно только задачи на проверке")
@@ -150,6 +631,7 @@ class Task(models.Model):
         self.datetime_done = timezone.now()
         self.save()
 
+    @metrics.track_transition
     def to_planned(self):
         self.state = "PLANNED"
         self.executor = None
@@ -158,10 +640,300 @@ class Task(models.Model):
         self.save()
 
     @classmethod
+    @metrics.track_transition
     def to_overdue(cls):
+        with metrics.timer("overdue_sweep_duration_seconds"):
+            updated = sum(shards.fan_out(cls._to_overdue_in_shard).values())
+        metrics.inc("overdue_sweeps_total")
+        metrics.inc("overdue_tasks_total", updated)
+        return updated
+
+    @classmethod
+    def _to_overdue_in_shard(cls) -> int:
         now = timezone.now()
-        overdue_tasks = cls.objects.filter(
-            state="IN_PROGRESS",
-            datetime_deadline__lte=now,
+        with shards.atomic():
+            overdue_tasks = list(
+                cls.objects.filter(
+                    state="IN_PROGRESS",
+                    datetime_deadline__lte=now,
+                ).order_by("kanban_id", "rank", "pk")
+            )
+            # как и в save, в новой колонке карточки встают в конец, иначе
+            # ранги из разных колонок совпадали бы
+            last_ranks = dict(
+                cls.all_objects.filter(
+                    kanban_id__in={task.kanban_id for task in overdue_tasks},
+                    state="OVERDUE",
+                )
+                .values_list("kanban_id")
+                .annotate(Max("rank"))
+                .order_by()
+            )
+            change_seq = ChangeCounter.next() if overdue_tasks else 0
+            for task in overdue_tasks:
+                task.state = "OVERDUE"
+                task.rank = last_ranks[task.kanban_id] = rank_between(
+                    last_ranks.get(task.kanban_id, ""), ""
+                )
+                task.datetime_last_update = now
+                task.change_seq = change_seq
+            updated = cls.objects.bulk_update(
+                overdue_tasks,
+                ["state", "rank", "datetime_last_update", "change_seq"],
+                batch_size=500,
+            )
+            WebhookDelivery.enqueue(
+                [
+                    (
+                        task.kanban_id,
+                        "task.transitioned",
+                        task.webhook_payload("IN_PROGRESS"),
+                    )
+                    for task in overdue_tasks
+                ]
+            )
+        return updated
+
+
+class TaskDependency(models.Model):
+    """Ребро графа зависимостей: task ждет выполнения blocker."""
+
+    blocker = models.ForeignKey(Task, related_name="blocks", on_delete=models.CASCADE)
+    task = models.ForeignKey(Task, related_name="blocked_by", on_delete=models.CASCADE)
+    datetime_created = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self) -> str:
+        return f"{self.blocker_id} -> {self.task_id}"
+
+    class Meta:
+        verbose_name = "Зависимость задачи"
+        verbose_name_plural = "Зависимости задач"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["blocker", "task"], name="unique_task_dependency"
+            )
+        ]
+        indexes = [models.Index(fields=["task"], name="dependency_task_idx")]
+
+    @classmethod
+    def link(cls, blocker_id, task_id):
+        cls._update_paths(blocker_id, task_id, 1)
+
+    @classmethod
+    def unlink(cls, blocker_id, task_id):
+        cls.objects.filter(blocker_id=blocker_id, task_id=task_id).delete()
+        cls._update_paths(blocker_id, task_id, -1)
+
+    @staticmethod
+    def _update_paths(blocker_id, task_id, sign):
+        """
+        Ребро blocker -> task добавляет (или убирает) пути от каждого предка
+        blocker к каждому потомку task. Число путей хранится, чтобы при
+        удалении ребра не терять пары, связанные еще и другой цепочкой.
+        """
+        ancestors = {blocker_id: 1}
+        ancestors.update(
+            TaskBlockerPath.objects.filter(descendant_id=blocker_id).values_list(
+                "ancestor_id", "paths"
+            )
+        )
+        descendants = {task_id: 1}
+        descendants.update(
+            TaskBlockerPath.objects.filter(ancestor_id=task_id).values_list(
+                "descendant_id", "paths"
+            )
+        )
+        existing = {
+            (path.ancestor_id, path.descendant_id): path
+            for path in TaskBlockerPath.objects.filter(
+                ancestor_id__in=list(ancestors), descendant_id__in=list(descendants)
+            )
+        }
+        created, updated, deleted = [], [], []
+        for ancestor_id, ancestor_paths in ancestors.items():
+            for descendant_id, descendant_paths in descendants.items():
+                delta = sign * ancestor_paths * descendant_paths
+                path = existing.get((ancestor_id, descendant_id))
+                if path is None:
+                    created.append(
+                        TaskBlockerPath(
+                            ancestor_id=ancestor_id,
+                            descendant_id=descendant_id,
+                            paths=delta,
+                        )
+                    )
+                elif path.paths + delta > 0:
+                    path.paths += delta
+                    updated.append(path)
+                else:
+                    deleted.append(path.pk)
+        TaskBlockerPath.objects.bulk_create(created, batch_size=500)
+        TaskBlockerPath.objects.bulk_update(updated, ["paths"], batch_size=500)
+        TaskBlockerPath.objects.filter(pk__in=deleted).delete()
+
+
+class TaskBlockerPath(models.Model):
+    """
+    Транзитивное замыкание TaskDependency: ancestor блокирует descendant
+    напрямую или через цепочку. "Все блокирующие" и "все зависимые" -
+    один запрос по индексу, без рекурсии.
+    """
+
+    ancestor = models.ForeignKey(
+        Task, related_name="dependent_paths", on_delete=models.CASCADE
+    )
+    descendant = models.ForeignKey(
+        Task, related_name="blocker_paths", on_delete=models.CASCADE
+    )
+    # число разных цепочек от ancestor к descendant
+    paths = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Путь зависимости"
+        verbose_name_plural = "Пути зависимостей"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"], name="unique_blocker_path"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "ancestor"], name="blocker_path_idx")
+        ]
+
+
+class TaskComment(models.Model):
+    task = models.ForeignKey(Task, related_name="comments", on_delete=models.CASCADE)
+    author = models.ForeignKey(
+        User,
+        related_name="task_comments",
+        on_delete=models.CASCADE,
+        db_constraint=False,
+    )
+    text = models.TextField(max_length=5000)
+    datetime_created = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self) -> str:
+        return f"{self.author_id}: {self.text[:50]}"
+
+    class Meta:
+        verbose_name = "Комментарий"
+        verbose_name_plural = "Комментарии"
+        # лента задачи листается по (task, -id)
+        indexes = [models.Index(fields=["task", "id"], name="comment_task_idx")]
+
+
+class TaskTombstone(models.Model):
+    """Запись об удаленной задаче, чтобы синхронизация сообщила клиентам."""
+
+    # id задач в шарде i начинаются с i << KANBAN_SHARD_ID_BITS
+    task_id = models.PositiveBigIntegerField()
+    kanban = models.ForeignKey(
+        Kanban, related_name="tombstones", on_delete=models.CASCADE
+    )
+    datetime_deleted = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.task_id} ({self.kanban_id})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kanban", "id"], name="tombstone_kanban_idx"),
+        ]
+
+
+class ChangeCounter(models.Model):
+    """
+    Номер последнего изменения задач в шарде (одна строка). Номер берется
+    внутри транзакции записи, и строка счетчика остается заблокированной
+    до коммита, поэтому номера растут в порядке коммитов.
+    """
+
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next(cls) -> int:
+        """Вызывается внутри shards.atomic() вместе с изменением задач."""
+        if cls.objects.filter(pk=1).update(value=F("value") + 1):
+            return cls.objects.filter(pk=1).values_list("value", flat=True).get()
+        cls.objects.create(pk=1, value=1)
+        return 1
+
+
+class WebhookSubscription(models.Model):
+    kanban = models.ForeignKey(
+        Kanban, related_name="webhooks", on_delete=models.CASCADE
+    )
+    url = models.URLField(max_length=500)
+    # ключ для подписи тела запроса, заголовок X-Kanban-Signature
+    secret = models.CharField(max_length=100, blank=True)
+    is_active = models.BooleanField(default=True)
+    datetime_created = models.DateTimeField(default=timezone.now, editable=False)
+
+    def __str__(self) -> str:
+        return self.url
+
+    class Meta:
+        verbose_name = "Вебхук"
+        verbose_name_plural = "Вебхуки"
+        indexes = [
+            models.Index(fields=["kanban", "is_active"], name="webhook_kanban_idx")
+        ]
+
+
+class WebhookDelivery(models.Model):
+    """Outbox: событие для отправки, записанное вместе с изменением задачи."""
+
+    state_list = [
+        ("PENDING", "PENDING"),
+        ("SENDING", "SENDING"),
+        ("DELIVERED", "DELIVERED"),
+        ("FAILED", "FAILED"),
+    ]
+
+    subscription = models.ForeignKey(
+        WebhookSubscription, related_name="deliveries", on_delete=models.CASCADE
+    )
+    event = models.CharField(max_length=50)
+    payload = models.JSONField()
+    state = models.CharField(default="PENDING", choices=state_list, max_length=20)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    datetime_created = models.DateTimeField(default=timezone.now, editable=False)
+    datetime_next_attempt = models.DateTimeField(default=timezone.now)
+    # до этого момента событие в статусе SENDING принадлежит забравшему его
+    # воркеру, потом его может забрать другой (воркер упал)
+    datetime_lease_until = models.DateTimeField(null=True, blank=True)
+    datetime_delivered = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.event} -> {self.subscription_id}"
+
+    class Meta:
+        verbose_name = "Отправка вебхука"
+        verbose_name_plural = "Отправки вебхуков"
+        indexes = [
+            models.Index(
+                fields=["state", "datetime_next_attempt"], name="webhook_due_idx"
+            ),
+            models.Index(
+                fields=["state", "datetime_lease_until"], name="webhook_lease_idx"
+            ),
+        ]
+
+    @classmethod
+    def enqueue(cls, events):
+        """events - список (kanban_id, событие, payload)."""
+        if not events:
+            return
+        subscriptions = {}
+        for subscription_id, kanban_id in WebhookSubscription.objects.filter(
+            kanban_id__in={kanban_id for kanban_id, _, _ in events}, is_active=True
+        ).values_list("pk", "kanban_id"):
+            subscriptions.setdefault(kanban_id, []).append(subscription_id)
+        cls.objects.bulk_create(
+            [
+                cls(subscription_id=subscription_id, event=event, payload=payload)
+                for kanban_id, event, payload in events
+                for subscription_id in subscriptions.get(kanban_id, [])
+            ]
         )
-        overdue_tasks.update(state="OVERDUE")
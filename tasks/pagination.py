@@ -0,0 +1,112 @@
+"""
+Курсорная (keyset) пагинация.
+
+Вместо OFFSET страница начинается после последней строки предыдущей:
+курсор хранит значения полей сортировки этой строки. Сортировка должна
+заканчиваться уникальным полем (pk), а ее префикс - совпадать с индексом.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values: list) -> str:
+    data = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise ValueError("Неверный курсор")
+    if not isinstance(values, list):
+        raise ValueError("Неверный курсор")
+    return values
+
+
+def _after(fields: list, values: list) -> Q:
+    """Условие "строка идет после values" для сортировки fields."""
+    condition = Q()
+    for i, field in enumerate(fields):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip("-"): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, ordering: list, cursor: str, page_size: int):
+    """
+    Возвращает (объекты страницы, курсор следующей страницы или None).
+    Поля сортировки не должны быть NULL.
+    """
+    model = queryset.model
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        raw_values = decode_cursor(cursor)
+        if len(raw_values) != len(ordering):
+            raise ValueError("Неверный курсор")
+        values = []
+        for field, raw in zip(ordering, raw_values):
+            try:
+                values.append(_get_field(model, field).to_python(raw))
+            except (ValidationError, TypeError):
+                raise ValueError("Неверный курсор")
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset[: page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(
+            [
+                _cursor_value(getattr(last, _get_field(model, field).attname))
+                for field in ordering
+            ]
+        )
+    return items, next_cursor
+
+
+def merge_pages(pages: list, ordering: list, page_size: int):
+    """
+    Сливает страницы keyset_page из нескольких баз (шардов) с одним
+    курсором в одну. Все поля ordering сортируются в одну сторону.
+    """
+    items = [item for page_items, _ in pages for item in page_items]
+    if not items:
+        return [], None
+    model = type(items[0])
+    attnames = [_get_field(model, field).attname for field in ordering]
+    items.sort(
+        key=lambda item: [getattr(item, attname) for attname in attnames],
+        reverse=ordering[0].startswith("-"),
+    )
+    has_more = len(items) > page_size or any(cursor for _, cursor in pages)
+    items = items[:page_size]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(
+            [_cursor_value(getattr(items[-1], attname)) for attname in attnames]
+        )
+    return items, next_cursor
+
+
+def _get_field(model, field: str):
+    name = field.lstrip("-")
+    if name == "pk":
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def _cursor_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
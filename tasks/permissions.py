@@ -0,0 +1,70 @@
+"""
+Права пользователя на канбаны.
+
+Набор {kanban_id: роль} пользователя кешируется целиком. Ключ содержит
+версию, которая увеличивается при любом изменении участников канбана,
+поэтому на горячем пути проверка прав - это чтение из кеша без запросов
+к базе.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import KanbanMembership
+
+
+def _version_key(user_id) -> str:
+    return f"kanban_access:version:{user_id}"
+
+
+def _get_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_kanban_roles(user) -> dict:
+    if not user.is_authenticated:
+        return {}
+    # в пределах запроса кеш не перечитывается
+    roles = getattr(user, "_kanban_roles", None)
+    if roles is not None:
+        return roles
+
+    key = f"kanban_access:{user.pk}:{_get_version(user.pk)}"
+    roles = cache.get(key)
+    if roles is None:
+        roles = dict(
+            KanbanMembership.objects.filter(user_id=user.pk).values_list(
+                "kanban_id", "role"
+            )
+        )
+        cache.set(key, roles, settings.KANBAN_ACCESS_CACHE_SECONDS)
+    user._kanban_roles = roles
+    return roles
+
+
+def readable_kanban_ids(user) -> set:
+    return set(get_kanban_roles(user))
+
+
+def can_read(user, kanban_id) -> bool:
+    return int(kanban_id) in get_kanban_roles(user)
+
+
+def can_write(user, kanban_id) -> bool:
+    return get_kanban_roles(user).get(int(kanban_id)) == KanbanMembership.OWNER
+
+
+def invalidate(user_id):
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
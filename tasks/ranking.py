@@ -0,0 +1,98 @@
+"""
+Дробные ранги карточек в колонке.
+
+Ранг - строка из цифр и латинских букв, карточки сортируются по нему
+лексикографически. Между любыми двумя рангами всегда есть еще один,
+поэтому перенос карточки меняет только ее строку. Ранг никогда не
+пустой и не заканчивается на "0", иначе перед ним могло бы не найтись
+места.
+
+Середина между соседями удлиняет ранг на символ примерно за шесть
+вставок в одно место. Новые карточки всегда встают в конец колонки,
+поэтому край считается иначе: ранг, как число в системе BASE, растет на
+единицу, а когда символы кончаются, ранг удлиняется вдвое. Так на n
+вставок в конец (или в начало) ранг растет как log(n).
+"""
+
+import string
+
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+BASE = len(ALPHABET)
+
+
+def rank_between(lo: str = "", hi: str = "") -> str:
+    """Ранг строго между lo и hi; пустая строка означает край колонки."""
+    if lo and hi and lo >= hi:
+        raise ValueError(f"Ранг {lo!r} не меньше {hi!r}")
+    if lo and not hi:
+        return rank_after(lo)
+    if hi and not lo:
+        return rank_before(hi)
+    result = []
+    i = 0
+    while True:
+        low = ALPHABET.index(lo[i]) if i < len(lo) else 0
+        high = ALPHABET.index(hi[i]) if i < len(hi) else BASE
+        if low == high:
+            result.append(ALPHABET[low])
+            i += 1
+            continue
+        middle = (low + high) // 2
+        if middle > low:
+            result.append(ALPHABET[middle])
+            return "".join(result)
+        # соседние символы: берем нижний, дальше верхней границы нет
+        result.append(ALPHABET[low])
+        hi = ""
+        i += 1
+
+
+def rank_after(lo: str) -> str:
+    """Следующий ранг после lo: lo + 1 той же длины или lo, удлиненный вдвое."""
+    value = to_number(lo) + 1
+    # ранг не должен заканчиваться на "0"; отбросить нули нельзя, ранг
+    # стал бы короче и символы кончались бы быстрее
+    if value % BASE == 0:
+        value += 1
+    if value < BASE ** len(lo):
+        return to_rank(value, len(lo))
+    # lo из одних "z": после него lo + "00..01" и еще BASE**len(lo) рангов
+    return lo + "0" * (len(lo) - 1) + "1"
+
+
+def rank_before(hi: str) -> str:
+    """Ранг перед hi: hi - 1 той же длины или hi, удлиненный вдвое вниз."""
+    value = to_number(hi) - 1
+    if value % BASE == 0 and value:
+        value -= 1
+    if value:
+        return to_rank(value, len(hi))
+    # hi = "00..01": перед ним "00..0zz..z", и дальше есть куда уменьшать
+    return "0" * len(hi) + ALPHABET[-1] * len(hi)
+
+
+def to_number(rank: str) -> int:
+    value = 0
+    for char in rank:
+        value = value * BASE + ALPHABET.index(char)
+    return value
+
+
+def to_rank(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def spread_ranks(count: int) -> list:
+    """count возрастающих рангов одинаковой длины с равными промежутками."""
+    width = 1
+    while BASE**width <= count:
+        width += 1
+    step = BASE**width // (count + 1)
+    return [
+        to_rank(position * step, width).rstrip("0")
+        for position in range(1, count + 1)
+    ]
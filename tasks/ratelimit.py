@@ -0,0 +1,66 @@
+"""
+Ограничение частоты запросов на кеше Django.
+
+Ведро на rate токенов, которое пополняется по одному токену каждые
+period / rate секунд (алгоритм GCRA). В кеше хранится только момент в
+миллисекундах, когда ведро снова станет полным: каждый запрос сдвигает
+его на один интервал атомарным cache.incr, и запрос проходит, если
+момент не дальше period от текущего времени.
+
+Разрешенный запрос стоит одну операцию кеша. Вторая нужна в трех
+случаях: первый запрос клиента создает ключ (add); первый запрос после
+простоя, когда ведро уже полное, переставляет момент на текущее время
+(set), иначе простой копил бы токены сверх rate; отказ возвращает
+интервал (decr), чтобы клиент, повторяющий запрос раньше Retry-After,
+не продлевал себе блокировку. Срок ключа задается только при записи,
+2 * period: клиент, который держит ведро пустым дольше, получит его
+полным на одну пачку из rate запросов раньше.
+"""
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def client_key(request, key_type: str, view_kwargs=None) -> str:
+    if key_type == "user" and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if key_type == "token" and view_kwargs and view_kwargs.get("token"):
+        token = view_kwargs["token"].encode()
+        return "token:" + hashlib.md5(token, usedforsecurity=False).hexdigest()
+    header = settings.RATE_LIMIT_IP_HEADER
+    if header and header in request.META:
+        # прокси дописывают адреса справа, левые записи подделывает клиент
+        addresses = [address.strip() for address in request.META[header].split(",")]
+        hops = min(max(settings.RATE_LIMIT_TRUSTED_PROXIES, 1), len(addresses))
+        return "ip:" + addresses[-hops]
+    return "ip:" + request.META.get("REMOTE_ADDR", "")
+
+
+def take_token(scope: str, client: str, rate: int, period: int) -> int:
+    """Возвращает 0, если токен взят, иначе сколько секунд ждать."""
+    now = int(time.time() * 1000)
+    interval = max(period * 1000 // rate, 1)
+    key = f"ratelimit:{scope}:{client}"
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        full_at = now + interval
+        if not cache.add(key, full_at, 2 * period):
+            full_at = cache.incr(key, interval)
+    else:
+        if full_at - interval < now:
+            # ведро было полным: время простоя не превращается в токены
+            full_at = now + interval
+            cache.set(key, full_at, 2 * period)
+    if full_at - now <= period * 1000:
+        return 0
+    # отказ не тратит токен
+    try:
+        cache.decr(key, interval)
+    except ValueError:
+        pass
+    return max(math.ceil((full_at - period * 1000 - now) / 1000), 1)
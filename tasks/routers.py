@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import shards
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def is_pinned(request) -> bool:
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+class ReadReplicaRouter:
+    """
+    Чтения из вьюх с ReplicaReadMixin идут в реплику, все остальное,
+    включая чтения внутри транзакций, - в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return settings.DATABASE_REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class KanbanShardRouter:
+    """
+    Строки канбанов идут в шард канбана: из загруженного объекта, из
+    kanban_id нового объекта или из контекста shards.use_shard().
+    Для default решение оставляется следующему роутеру (реплике).
+    """
+
+    def _shard(self, model, hints):
+        if not shards.is_sharded(model):
+            return None
+        alias = None
+        instance = hints.get("instance")
+        if instance is not None and shards.is_sharded(instance):
+            kanban_id = getattr(instance, "kanban_id", None)
+            if not instance._state.adding:
+                alias = instance._state.db
+            # у нового объекта _state.db мог выставить присвоенный ему
+            # пользователь из default, поэтому шард берется по канбану
+            elif kanban_id is not None:
+                alias = shards.shard_for_id(kanban_id)
+        alias = alias or shards.current()
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in (DEFAULT_DB_ALIAS, settings.DATABASE_REPLICA_ALIAS):
+            return None
+        # в шардах только таблицы канбанов; RunPython-миграции данных
+        # относятся к default, новые шарды создаются пустыми
+        if app_label != "tasks" or model_name is None:
+            return False
+        return model_name not in shards.DEFAULT_ONLY_MODELS
@@ -0,0 +1,145 @@
+"""
+Горизонтальное шардирование канбанов.
+
+Канбан и все его строки (задачи, вебхуки, tombstones) живут в одной базе
+из KANBAN_SHARDS, пользователи, сессии и участники канбанов - в default.
+Номер шарда зашит в старшие биты id: шард i выдает id начиная с
+i << KANBAN_SHARD_ID_BITS. Поэтому по id канбана или задачи из URL шард
+находится без обращения к справочнику, а существующие id (< 2**40)
+остаются в default, то есть в шарде 0.
+
+Запросы к шарду идут через контекст use_shard(): его выставляет
+ShardRoutingMiddleware по id из URL, а фоновые команды - в цикле по
+aliases(). Запросы без контекста идут в default.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_current_shard = ContextVar("current_shard", default=None)
+
+# модели приложения tasks, которые не шардируются: справочник участников
+# нужен для проверки прав до того, как известен шард, а старые id
+# перенесенных канбанов не указывают на их новый шард
+DEFAULT_ONLY_MODELS = {"kanbanmembership", "kanbanredirect"}
+
+
+def aliases() -> list:
+    return list(settings.KANBAN_SHARDS)
+
+
+def is_sharded(model) -> bool:
+    return (
+        model._meta.app_label == "tasks"
+        and model._meta.model_name not in DEFAULT_ONLY_MODELS
+    )
+
+
+def shard_for_id(pk) -> str:
+    index = int(pk) >> settings.KANBAN_SHARD_ID_BITS
+    shards = aliases()
+    # чужой id вне диапазона ищется в default и дает 404
+    return shards[index] if index < len(shards) else DEFAULT_DB_ALIAS
+
+
+def id_base(alias: str) -> int:
+    return aliases().index(alias) << settings.KANBAN_SHARD_ID_BITS
+
+
+def choose_shard() -> str:
+    """Шард для нового канбана: нагрузка независимых канбанов равномерна."""
+    return random.choice(aliases())
+
+
+def current() -> str:
+    return _current_shard.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias: str):
+    token = _current_shard.set(alias)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def atomic():
+    """transaction.atomic() в базе текущего шарда."""
+    return transaction.atomic(using=current())
+
+
+def in_kanban_shard(method):
+    """Выполняет метод модели в шарде ее канбана (kanban_id или pk канбана)."""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        kanban_id = getattr(self, "kanban_id", None) or self.pk
+        if kanban_id is None:
+            return method(self, *args, **kwargs)
+        with use_shard(shard_for_id(kanban_id)):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def fan_out(function) -> dict:
+    """Вызывает function() в каждом шарде по очереди, {шард: результат}."""
+    results = {}
+    for alias in aliases():
+        with use_shard(alias):
+            results[alias] = function()
+    return results
+
+
+def group_by_shard(ids) -> dict:
+    groups = {}
+    for pk in ids:
+        groups.setdefault(shard_for_id(pk), []).append(pk)
+    return groups
+
+
+def with_users(queryset, *fields):
+    """
+    Подгружает пользователей из полей fields: в default - JOIN через
+    select_related, в другом шарде таблицы пользователей нет, поэтому
+    одним дополнительным запросом через prefetch_related.
+    """
+    if queryset.db != DEFAULT_DB_ALIAS and queryset.db in aliases():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def seed_sequences(alias: str, models):
+    """
+    Сдвигает автоинкремент шардируемых таблиц к началу диапазона шарда.
+    Вызывается после migrate, повторный вызов ничего не меняет.
+    """
+    base = id_base(alias)
+    if not base:
+        return
+    connection = connections[alias]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for model in models:
+            table = model._meta.db_table
+            if connection.vendor == "sqlite":
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s",
+                    [base, table],
+                )
+                if not cursor.rowcount:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                        [table, base],
+                    )
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f'GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM "{table}")))',
+                    [table, base],
+                )
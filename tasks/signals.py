@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import permissions, shards
+from .models import ChangeCounter, Kanban, KanbanMembership, Task, TaskComment
+
+
+@receiver(post_save, sender=KanbanMembership)
+@receiver(post_delete, sender=KanbanMembership)
+def invalidate_member_access(sender, instance, **kwargs):
+    permissions.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Kanban)
+def invalidate_kanban_access(sender, instance, created, **kwargs):
+    # новый канбан инвалидируется через создание участника-владельца
+    if created:
+        return
+    user_ids = KanbanMembership.objects.filter(kanban=instance).values_list(
+        "user_id", flat=True
+    )
+    for user_id in user_ids:
+        permissions.invalidate(user_id)
+
+
+@receiver(pre_delete, sender=User)
+def delete_user_rows_in_shards(sender, instance, using, **kwargs):
+    """
+    Каскад Django удаляет строки пользователя только в его базе, в других
+    шардах ссылки на пользователя без внешних ключей. Там его канбаны
+    удаляются мягко (задачи удалит purge_kanbans), его задачи и
+    комментарии - сразу, а задачи, где он исполнитель, остаются без
+    исполнителя, как при каскаде.
+    """
+    for alias in shards.aliases():
+        if alias == using:
+            continue
+        with shards.use_shard(alias):
+            for kanban in Kanban.objects.filter(owner_id=instance.pk):
+                kanban.soft_delete()
+            with shards.atomic():
+                Task.all_objects.filter(owner_id=instance.pk).delete()
+                TaskComment.objects.filter(author_id=instance.pk).delete()
+                Task.all_objects.filter(executor_id=instance.pk).update(
+                    executor=None, change_seq=ChangeCounter.next()
+                )
@@ -0,0 +1,30 @@
+// Подсказки логинов для полей с data-autocomplete-url
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("input[data-autocomplete-url]").forEach(function (input) {
+        var datalist = document.createElement("datalist");
+        datalist.id = input.id + "_options";
+        input.setAttribute("list", datalist.id);
+        input.after(datalist);
+
+        var timer = null;
+        input.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var params = new URLSearchParams({
+                    q: input.value,
+                    kanban: input.dataset.kanban || "",
+                });
+                fetch(input.dataset.autocompleteUrl + "?" + params)
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        datalist.replaceChildren();
+                        data.results.forEach(function (user) {
+                            var option = document.createElement("option");
+                            option.value = user.username;
+                            datalist.appendChild(option);
+                        });
+                    });
+            }, 200);
+        });
+    });
+});
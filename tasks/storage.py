@@ -0,0 +1,58 @@
+"""
+Хранилище статики с хешем в имени файла и заранее сжатыми копиями.
+
+collectstatic кладет рядом с каждым хешированным файлом .gz и .br
+варианты, чтобы фронтовой прокси отдавал их сам (gzip_static/brotli_static
+в nginx) с заголовком Cache-Control: max-age=31536000, immutable.
+"""
+
+import gzip
+import logging
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    compress_extensions = (".css", ".js", ".svg", ".ico", ".json", ".txt", ".xml")
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run=dry_run, **options
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning(
+                "Пакет brotli не установлен, .br копии статики не создаются"
+            )
+        for hashed_name in sorted(hashed_names):
+            self.compress(hashed_name)
+
+    def compress(self, name):
+        if not name.endswith(self.compress_extensions):
+            return
+        path = Path(self.path(name))
+        content = path.read_bytes()
+        if len(content) < self.compress_min_size:
+            return
+
+        variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                path.with_name(path.name + suffix).write_bytes(compressed)
@@ -1,9 +1,49 @@
-from django.test import TestCase
-from .models import Task
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command, load_command_class
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from .models import (
+    ChangeCounter,
+    TaskBlockerPath,
+    TaskComment,
+    TaskTombstone,
+    Task,
+    Kanban,
+    KanbanMembership,
+    KanbanRedirect,
+    WebhookDelivery,
+    WebhookSubscription,
+)
+from . import ical, metrics, permissions, shards
+from .pagination import encode_cursor
+from .ranking import rank_between
+from .ratelimit import client_key, take_token
+from .routers import use_replica
+from .admin import ApproximateCountPaginator
+from .forms import WebhookAddForm
+from .views import MyTasksView, TaskDetailView
+from .webhooks import deliver_due
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from datetime import timedelta
 from pathlib import Path
+import gzip
+import json
+import threading
+import os
+import time
+from io import BytesIO, StringIO
+import tempfile
 
 
 # Create your tests here.
@@ -125,3 +165,1737 @@ class TaskModelTest(TestCase):
         self.task.owner.delete()
         self.assertFalse(task.exists())
 
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(
+            METRICS_DIR=self.metrics_dir.name, METRICS_FLUSH_INTERVAL=0
+        )
+        self.settings_override.enable()
+        # счетчики процесса начинаются заново для каждого теста
+        metrics._registry.pid = None
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.metrics_dir.cleanup()
+
+    def test_request_latency_histogram(self):
+        self.client.get(reverse("tasks:index"))
+        response = self.client.get(reverse("tasks:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response,
+            "kanban_http_request_duration_seconds_count"
+            '{method="GET",view="tasks:index"} 1',
+        )
+        self.assertContains(
+            response, "# TYPE kanban_http_request_duration_seconds histogram"
+        )
+
+    def test_transition_counters(self):
+        task = Task(
+            title="Test task",
+            description="Test desc",
+            owner=self.owner,
+            kanban=self.kanban,
+        )
+        task.save()
+        task.to_planned()
+        with self.assertRaises(ValidationError):
+            task.to_done()
+        body = self.client.get(reverse("tasks:metrics")).content.decode()
+        self.assertIn(
+            'kanban_task_transitions_total{result="ok",transition="to_planned"} 1', body
+        )
+        self.assertIn(
+            'kanban_task_transitions_total{result="error",transition="to_done"} 1', body
+        )
+
+    def test_overdue_sweep(self):
+        task = Task(
+            title="Test task",
+            description="Test desc",
+            owner=self.owner,
+            kanban=self.kanban,
+            state="IN_PROGRESS",
+            datetime_deadline=timezone.now() - timedelta(days=1),
+        )
+        task.save()
+        self.assertEqual(Task.to_overdue(), 1)
+        body = self.client.get(reverse("tasks:metrics")).content.decode()
+        self.assertIn("kanban_overdue_sweeps_total 1", body)
+        self.assertIn("kanban_overdue_tasks_total 1", body)
+
+
+class SqliteProfileTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+        self.assertEqual(busy_timeout, settings.SQLITE_PRAGMAS["busy_timeout"])
+        # 1 = NORMAL
+        self.assertEqual(synchronous, 1)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        self.client.login(username="Test usr", password="123")
+
+    def test_read_view_uses_replica(self):
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            response = self.client.get(
+                reverse("tasks:kanban_detail", args=[self.kanban.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_post_pins_client_to_primary(self):
+        response = self.client.post(reverse("tasks:kanban_add"), {"title": "New"})
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with CaptureQueriesContext(connections["replica"]) as replica_queries:
+            self.client.get(reverse("tasks:kanban_list"))
+        self.assertFalse(replica_queries.captured_queries)
+
+    def test_atomic_block_reads_primary(self):
+        with use_replica(), transaction.atomic():
+            self.assertEqual(router.db_for_read(Kanban), "default")
+        with use_replica():
+            self.assertEqual(router.db_for_read(Kanban), "replica")
+
+
+class StaticPipelineTest(TestCase):
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        with tempfile.TemporaryDirectory() as static_root:
+            storages = {
+                **settings.STORAGES,
+                "staticfiles": {
+                    "BACKEND": "tasks.storage.CompressedManifestStaticFilesStorage"
+                },
+            }
+            with self.settings(STATIC_ROOT=static_root, STORAGES=storages):
+                call_command("collectstatic", interactive=False, verbosity=0)
+                hashed_name = staticfiles_storage.stored_name(
+                    "tasks/css/kanban_detail.css"
+                )
+            self.assertNotEqual(hashed_name, "tasks/css/kanban_detail.css")
+            compressed = Path(static_root, hashed_name + ".gz")
+            self.assertTrue(compressed.exists())
+            self.assertEqual(
+                gzip.decompress(compressed.read_bytes()),
+                Path(static_root, hashed_name).read_bytes(),
+            )
+
+    def test_missing_brotli_is_logged(self):
+        with tempfile.TemporaryDirectory() as static_root:
+            storages = {
+                **settings.STORAGES,
+                "staticfiles": {
+                    "BACKEND": "tasks.storage.CompressedManifestStaticFilesStorage"
+                },
+            }
+            with self.settings(STATIC_ROOT=static_root, STORAGES=storages):
+                with mock.patch("tasks.storage.brotli", None), self.assertLogs(
+                    "tasks.storage", "WARNING"
+                ) as logs:
+                    call_command("collectstatic", interactive=False, verbosity=0)
+        self.assertEqual(len(logs.records), 1)
+
+    def test_board_has_no_inline_styles(self):
+        owner = User.objects.create_user(username="Test usr", password="123")
+        kanban = Kanban.objects.create(title="Test kanban", owner=owner)
+        self.client.login(username="Test usr", password="123")
+        response = self.client.get(reverse("tasks:kanban_detail", args=[kanban.pk]))
+        self.assertNotContains(response, "<style>")
+        self.assertContains(response, "tasks/css/kanban_detail.css")
+
+
+class TaskImageViewTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        User.objects.create_user(username="Other usr", password="123")
+        kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        task = Task(
+            title="Test task", description="Test desc", owner=self.owner, kanban=kanban
+        )
+        task.save()
+        Task.objects.filter(pk=task.pk).update(image="tasks/img/test.jpg")
+        self.content = bytes(range(256)) * 8
+        img_dir = Path(self.media_root.name, "tasks", "img")
+        img_dir.mkdir(parents=True)
+        (img_dir / "test.jpg").write_bytes(self.content)
+        self.url = "/media/tasks/img/test.jpg"
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_owner_gets_image(self):
+        self.client.login(username="Test usr", password="123")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_other_user_forbidden(self):
+        self.client.login(username="Other usr", password="123")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_range_request(self):
+        self.client.login(username="Test usr", password="123")
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+
+    def test_conditional_request(self):
+        self.client.login(username="Test usr", password="123")
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_accel_redirect(self):
+        self.client.login(username="Test usr", password="123")
+        with self.settings(MEDIA_SERVE_BACKEND="x-accel"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/tasks/img/test.jpg"
+        )
+        self.assertEqual(response.content, b"")
+
+
+def make_png(size=(10, 10)) -> bytes:
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_png_header(width, height) -> bytes:
+    """PNG из нескольких сотен байт, заголовок которого обещает width x height."""
+    import struct
+    import zlib
+
+    content = make_png((1, 1))
+    ihdr = b"IHDR" + struct.pack(">II", width, height) + content[24:29]
+    crc = struct.pack(">I", zlib.crc32(ihdr))
+    return content[:12] + ihdr + crc + content[33:]
+
+
+class ImageUploadHandlerTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root.name, IMAGE_MAX_SIZE_MB=1
+        )
+        self.settings_override.enable()
+        owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=owner)
+        self.client.login(username="Test usr", password="123")
+        self.url = reverse("tasks:task_add", args=[self.kanban.pk])
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def post_image(self, content, name="test.png"):
+        return self.client.post(
+            self.url,
+            {
+                "title": "Test task",
+                "description": "Test desc",
+                "image": SimpleUploadedFile(name, content, "image/png"),
+            },
+        )
+
+    def test_valid_image_uploaded(self):
+        response = self.post_image(make_png())
+        self.assertEqual(response.status_code, 302)
+        task = Task.objects.get(title="Test task")
+        self.assertTrue(Path(task.image.path).exists())
+
+    def test_not_image_rejected(self):
+        response = self.post_image(b"not an image" * 10, name="test.txt")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Файл не является изображением")
+        self.assertFalse(Task.objects.exists())
+
+    def test_oversized_image_rejected_while_streaming(self):
+        content = make_png() + b"\0" * (2 * 1024 * 1024)
+        response = self.post_image(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Изображение больше 1мб")
+        self.assertFalse(Task.objects.exists())
+
+    def test_too_many_pixels_rejected(self):
+        with self.settings(IMAGE_MAX_PIXELS=50):
+            response = self.post_image(make_png())
+        self.assertContains(response, "Слишком большое разрешение изображения")
+        self.assertFalse(Task.objects.exists())
+
+    def test_decompression_bomb_header_rejected(self):
+        # Pillow бросает DecompressionBombError уже на заголовке
+        response = self.post_image(make_png_header(20000, 20000))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Слишком большое разрешение изображения")
+        self.assertFalse(Task.objects.exists())
+
+
+class CleanupMediaCommandTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        owner = User.objects.create_user(username="Test usr", password="123")
+        kanban = Kanban.objects.create(title="Test kanban", owner=owner)
+        task = Task(
+            title="Test task", description="Test desc", owner=owner, kanban=kanban
+        )
+        task.save()
+        Task.objects.filter(pk=task.pk).update(image="tasks/img/used.jpg")
+
+        self.img_dir = Path(self.media_root.name, "tasks", "img")
+        self.img_dir.mkdir(parents=True)
+        old = time.time() - 7200
+        for name in ("used.jpg", "orphan.jpg"):
+            path = self.img_dir / name
+            path.write_bytes(b"x" * 1024)
+            os.utime(path, (old, old))
+        (self.img_dir / "fresh.jpg").write_bytes(b"x")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_orphans_deleted(self):
+        out = StringIO()
+        call_command("cleanup_media", "--chunk-size=1", stdout=out)
+        self.assertTrue((self.img_dir / "used.jpg").exists())
+        self.assertTrue((self.img_dir / "fresh.jpg").exists())
+        self.assertFalse((self.img_dir / "orphan.jpg").exists())
+        self.assertIn("сирот: 1", out.getvalue())
+
+    def test_orphans_quarantined(self):
+        quarantine = Path(self.media_root.name, "quarantine")
+        call_command("cleanup_media", f"--quarantine={quarantine}", stdout=StringIO())
+        self.assertFalse((self.img_dir / "orphan.jpg").exists())
+        self.assertTrue((quarantine / "orphan.jpg").exists())
+
+    def test_dry_run_keeps_files(self):
+        call_command("cleanup_media", "--dry-run", stdout=StringIO())
+        self.assertTrue((self.img_dir / "orphan.jpg").exists())
+
+
+class KanbanSoftDeleteTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        for i in range(5):
+            task = Task(
+                title=f"Task {i}",
+                description="Test desc",
+                owner=self.owner,
+                kanban=self.kanban,
+            )
+            task.save()
+        img_dir = Path(self.media_root.name, "tasks", "img")
+        img_dir.mkdir(parents=True)
+        self.image_path = img_dir / "test.jpg"
+        self.image_path.write_bytes(b"x")
+        Task.objects.filter(title="Task 0").update(image="tasks/img/test.jpg")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_delete_hides_kanban_immediately(self):
+        self.client.login(username="Test usr", password="123")
+        response = self.client.post(
+            reverse("tasks:kanban_delete", args=[self.kanban.pk])
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Kanban.objects.filter(pk=self.kanban.pk).exists())
+        self.assertFalse(Task.objects.filter(kanban_id=self.kanban.pk).exists())
+        self.assertEqual(Task.all_objects.filter(kanban_id=self.kanban.pk).count(), 5)
+
+    def test_purge_removes_tasks_and_images(self):
+        self.kanban.soft_delete()
+        call_command(
+            "purge_kanbans", "--batch-size=2", "--pause=0", stdout=StringIO()
+        )
+        self.assertFalse(Kanban.all_objects.filter(pk=self.kanban.pk).exists())
+        self.assertFalse(Task.all_objects.exists())
+        self.assertFalse(self.image_path.exists())
+
+
+class KanbanMembershipTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.executor = User.objects.create_user(username="Executor", password="123")
+        User.objects.create_user(username="Other usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        self.task = Task(
+            title="Test task",
+            description="Test desc",
+            owner=self.owner,
+            kanban=self.kanban,
+            executor=self.executor,
+            datetime_deadline=timezone.now() + timedelta(days=1),
+        )
+        self.task.save()
+
+    def test_owner_is_member(self):
+        membership = KanbanMembership.objects.get(kanban=self.kanban)
+        self.assertEqual(membership.user, self.owner)
+        self.assertEqual(membership.role, KanbanMembership.OWNER)
+
+    def test_executor_sees_board_after_assign(self):
+        self.client.login(username="Executor", password="123")
+        detail_url = reverse("tasks:kanban_detail", args=[self.kanban.pk])
+        self.assertEqual(self.client.get(detail_url).status_code, 403)
+
+        self.task.to_assigned()
+        self.assertEqual(self.client.get(detail_url).status_code, 200)
+        response = self.client.get(reverse("tasks:kanban_list"))
+        self.assertContains(response, self.kanban.title)
+
+    def test_executor_cannot_delete_task(self):
+        self.task.to_assigned()
+        self.client.login(username="Executor", password="123")
+        response = self.client.post(
+            reverse("tasks:task_delete", args=[self.task.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_access_check_is_one_query(self):
+        self.client.login(username="Other usr", password="123")
+        user = User.objects.get(username="Other usr")
+        with self.assertNumQueries(1):
+            self.assertFalse(KanbanMembership.has_access(user, self.kanban.pk))
+
+    def test_only_writers_add_tasks(self):
+        self.task.to_assigned()
+        self.client.login(username="Executor", password="123")
+        url = reverse("tasks:task_add", args=[self.kanban.pk])
+        response = self.client.post(url, {"title": "New", "description": "Desc"})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Task.objects.filter(title="New").exists())
+
+    def test_owner_change_moves_owner_role(self):
+        self.kanban.refresh_from_db()
+        self.kanban.owner = self.executor
+        self.kanban.save()
+        roles = dict(
+            KanbanMembership.objects.filter(kanban=self.kanban).values_list(
+                "user_id", "role"
+            )
+        )
+        self.assertEqual(
+            roles,
+            {
+                self.owner.pk: KanbanMembership.EXECUTOR,
+                self.executor.pk: KanbanMembership.OWNER,
+            },
+        )
+        self.assertTrue(permissions.can_write(self.executor, self.kanban.pk))
+
+
+class KanbanAccessCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.other = User.objects.create_user(username="Other usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+
+    def test_cached_check_makes_no_queries(self):
+        permissions.can_read(User.objects.get(pk=self.owner.pk), self.kanban.pk)
+        user = User.objects.get(pk=self.owner.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.can_read(user, self.kanban.pk))
+            self.assertTrue(permissions.can_write(user, self.kanban.pk))
+
+    def test_membership_change_invalidates(self):
+        self.assertFalse(permissions.can_read(self.other, self.kanban.pk))
+        KanbanMembership.add_executor(self.kanban.pk, self.other.pk)
+        user = User.objects.get(pk=self.other.pk)
+        self.assertTrue(permissions.can_read(user, self.kanban.pk))
+        self.assertFalse(permissions.can_write(user, self.kanban.pk))
+
+
+class TaskRankTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        self.tasks = []
+        for i in range(3):
+            task = Task(
+                title=f"Task {i}",
+                description="Test desc",
+                owner=self.owner,
+                kanban=self.kanban,
+            )
+            task.save()
+            self.tasks.append(task)
+
+    def column(self):
+        return list(
+            Task.objects.filter(kanban=self.kanban, state="PLANNED")
+            .order_by("rank")
+            .values_list("title", flat=True)
+        )
+
+    def test_new_tasks_appended(self):
+        self.assertEqual(self.column(), ["Task 0", "Task 1", "Task 2"])
+
+    def test_move_updates_single_row(self):
+        self.client.login(username="Test usr", password="123")
+        ranks_before = dict(Task.objects.values_list("pk", "rank"))
+        response = self.client.post(
+            reverse("tasks:task_move", args=[self.tasks[2].pk]),
+            {"before": self.tasks[0].pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.column(), ["Task 2", "Task 0", "Task 1"])
+        ranks_after = dict(Task.objects.values_list("pk", "rank"))
+        changed = [pk for pk in ranks_before if ranks_before[pk] != ranks_after[pk]]
+        self.assertEqual(changed, [self.tasks[2].pk])
+
+    def test_move_rejects_neighbor_from_other_column(self):
+        self.client.login(username="Test usr", password="123")
+        Task.objects.filter(pk=self.tasks[0].pk).update(state="DONE")
+        response = self.client.post(
+            reverse("tasks:task_move", args=[self.tasks[2].pk]),
+            {"before": self.tasks[0].pk},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_move_between_equal_neighbors(self):
+        Task.objects.filter(pk__in=[self.tasks[0].pk, self.tasks[1].pk]).update(
+            rank="V"
+        )
+        self.tasks[2].move_between(self.tasks[0].pk, self.tasks[1].pk)
+        self.assertEqual(self.column(), ["Task 0", "Task 2", "Task 1"])
+
+    def test_overdue_tasks_get_ranks_in_new_column(self):
+        deadline = timezone.now() + timedelta(days=1)
+        for task in self.tasks:
+            task.executor = self.owner
+            task.datetime_deadline = deadline
+            task.to_assigned()
+        Task.objects.update(datetime_deadline=timezone.now() - timedelta(days=1))
+        Task.to_overdue()
+        ranks = list(
+            Task.objects.filter(state="OVERDUE")
+            .order_by("rank")
+            .values_list("title", "rank")
+        )
+        self.assertEqual([title for title, _ in ranks], ["Task 0", "Task 1", "Task 2"])
+        self.assertEqual(len({rank for _, rank in ranks}), 3)
+
+    def test_rebalance_keeps_order(self):
+        # вставки в одно и то же место удлиняют ранги
+        for _ in range(40):
+            first, second, last = Task.objects.order_by("rank")
+            last.move_between(after_pk=first.pk, before_pk=second.pk)
+        order = self.column()
+        call_command("rebalance_ranks", "--max-length=4", stdout=StringIO())
+        self.assertEqual(self.column(), order)
+        ranks = Task.objects.values_list("rank", flat=True)
+        self.assertTrue(all(len(rank) <= 4 for rank in ranks))
+
+    def test_rank_between(self):
+        self.assertLess("a", rank_between("a", "b"))
+        self.assertLess(rank_between("a", "b"), "b")
+        self.assertLess(rank_between("", "1"), "1")
+        self.assertLess(rank_between("a1", "a2"), "a2")
+
+    def test_edge_ranks_grow_logarithmically(self):
+        # 5000 карточек в конец и в начало колонки без перестройки
+        appended = [rank_between()]
+        prepended = [appended[0]]
+        for _ in range(5000):
+            appended.append(rank_between(appended[-1], ""))
+            prepended.append(rank_between("", prepended[-1]))
+        prepended.reverse()
+        for ranks in (appended, prepended):
+            self.assertEqual(ranks, sorted(set(ranks)))
+            self.assertFalse([rank for rank in ranks if rank.endswith("0")])
+            self.assertLessEqual(max(len(rank) for rank in ranks), 8)
+
+
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username="Test usr", password="123")
+
+    def test_login_throttled(self):
+        limits = {
+            "tasks:login": {"rate": 2, "period": 60, "key": "ip", "methods": ["POST"]}
+        }
+        with self.settings(RATE_LIMITS=limits):
+            for _ in range(2):
+                response = self.client.post(
+                    reverse("tasks:login"), {"username": "Test usr", "password": "x"}
+                )
+                self.assertEqual(response.status_code, 200)
+            response = self.client.post(
+                reverse("tasks:login"), {"username": "Test usr", "password": "x"}
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 61)
+
+    def test_get_not_throttled(self):
+        limits = {
+            "tasks:login": {"rate": 1, "period": 60, "key": "ip", "methods": ["POST"]}
+        }
+        with self.settings(RATE_LIMITS=limits):
+            for _ in range(3):
+                response = self.client.get(reverse("tasks:login"))
+                self.assertEqual(response.status_code, 200)
+
+    def test_bucket_refills_gradually(self):
+        with mock.patch("tasks.ratelimit.time.time", return_value=1000.0) as now:
+            results = [take_token("scope", "client", 2, 60) for _ in range(3)]
+            self.assertEqual(results[:2], [0, 0])
+            self.assertEqual(results[2], 30)
+            # через границу минуты второго полного ведра нет
+            now.return_value = 1030.5
+            self.assertEqual(take_token("scope", "client", 2, 60), 0)
+            self.assertNotEqual(take_token("scope", "client", 2, 60), 0)
+
+    def test_allowed_request_is_one_cache_operation(self):
+        with mock.patch("tasks.ratelimit.cache", wraps=cache) as wrapped:
+            take_token("scope", "client", 10, 60)
+            wrapped.reset_mock()
+            self.assertEqual(take_token("scope", "client", 10, 60), 0)
+        self.assertEqual([call[0] for call in wrapped.method_calls], ["incr"])
+
+    def test_idle_time_does_not_overfill_bucket(self):
+        with mock.patch("tasks.ratelimit.time.time", return_value=1000.0) as now:
+            take_token("scope", "client", 2, 60)
+            now.return_value = 1100.0
+            results = [take_token("scope", "client", 2, 60) for _ in range(3)]
+        self.assertEqual(results[:2], [0, 0])
+        self.assertNotEqual(results[2], 0)
+
+    def test_forwarded_for_uses_proxy_entry(self):
+        request = mock.Mock(user=mock.Mock(is_authenticated=False))
+        request.META = {"HTTP_X_FORWARDED_FOR": "1.1.1.1, 2.2.2.2, 3.3.3.3"}
+        with self.settings(RATE_LIMIT_IP_HEADER="HTTP_X_FORWARDED_FOR"):
+            self.assertEqual(client_key(request, "ip"), "ip:3.3.3.3")
+            with self.settings(RATE_LIMIT_TRUSTED_PROXIES=2):
+                self.assertEqual(client_key(request, "ip"), "ip:2.2.2.2")
+
+    def test_token_key(self):
+        request = mock.Mock(user=mock.Mock(is_authenticated=False), META={})
+        first = client_key(request, "token", {"token": "a"})
+        self.assertNotEqual(first, client_key(request, "token", {"token": "b"}))
+        self.assertTrue(first.startswith("token:"))
+
+
+class MyTasksViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(username="Test usr", password="123")
+        self.executor = User.objects.create_user(username="Executor", password="123")
+        deadline = timezone.now() + timedelta(days=1)
+        for kanban_number in range(2):
+            kanban = Kanban.objects.create(
+                title=f"Kanban {kanban_number}", owner=owner
+            )
+            for i in range(3):
+                task = Task(
+                    title=f"Task {kanban_number}-{i}",
+                    description="Test desc",
+                    owner=owner,
+                    kanban=kanban,
+                    executor=self.executor,
+                    datetime_deadline=deadline
+                    + timedelta(hours=kanban_number * 3 + i),
+                )
+                task.save()
+        Task.objects.filter(title="Task 1-2").update(state="DONE")
+        self.client.login(username="Executor", password="123")
+
+    def test_pages_follow_deadline_order(self):
+        titles = []
+        url = reverse("tasks:my_tasks")
+        query = ""
+        with mock.patch.object(MyTasksView, "page_size", 2):
+            while True:
+                response = self.client.get(f"{url}?{query}")
+                titles += [task.title for task in response.context["tasks"]]
+                query = response.context.get("next_query")
+                if not query:
+                    break
+        self.assertEqual(
+            titles,
+            ["Task 0-0", "Task 0-1", "Task 0-2", "Task 1-0", "Task 1-1", "Task 1-2"],
+        )
+
+    def test_state_filter(self):
+        response = self.client.get(reverse("tasks:my_tasks"), {"state": "DONE"})
+        titles = [task.title for task in response.context["tasks"]]
+        self.assertEqual(titles, ["Task 1-2"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("tasks:my_tasks"), {"cursor": "???"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["tasks"]), [])
+
+
+class ExecutorAutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        User.objects.bulk_create([User(username=f"user{i:03}") for i in range(100)])
+        KanbanMembership.add_executor(
+            self.kanban.pk, User.objects.get(username="user099").pk
+        )
+        self.task = Task(
+            title="Test task",
+            description="Test desc",
+            owner=self.owner,
+            kanban=self.kanban,
+        )
+        self.task.save()
+        self.client.login(username="Test usr", password="123")
+
+    def test_assign_page_does_not_list_users(self):
+        response = self.client.get(reverse("tasks:task_assign", args=[self.task.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "user050")
+        self.assertContains(response, "data-autocomplete-url")
+
+    def test_members_come_first(self):
+        response = self.client.get(
+            reverse("tasks:user_autocomplete"),
+            {"q": "user0", "kanban": self.kanban.pk},
+        )
+        usernames = [user["username"] for user in response.json()["results"]]
+        self.assertEqual(len(usernames), 20)
+        self.assertEqual(usernames[:3], ["user099", "user000", "user001"])
+
+    def test_assign_by_username(self):
+        deadline = timezone.now() + timedelta(days=1)
+        response = self.client.post(
+            reverse("tasks:task_assign", args=[self.task.pk]),
+            {
+                "executor": "user042",
+                "datetime_deadline": deadline.strftime("%Y-%m-%dT%H:%M"),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.executor.username, "user042")
+        self.assertEqual(self.task.state, "IN_PROGRESS")
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    received = []
+    status = 200
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        WebhookReceiver.received.append((dict(self.headers), json.loads(body)))
+        self.send_response(WebhookReceiver.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookTest(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), WebhookReceiver)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        WebhookReceiver.received = []
+        WebhookReceiver.status = 200
+        self.settings_override = self.settings(WEBHOOK_ALLOW_PRIVATE_ADDRESSES=True)
+        self.settings_override.enable()
+
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Test kanban", owner=self.owner)
+        WebhookSubscription.objects.create(
+            kanban=self.kanban,
+            url=f"http://127.0.0.1:{self.server.server_port}/hook",
+            secret="secret",
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_task(self, title="Test task"):
+        task = Task(
+            title=title, description="Test desc", owner=self.owner, kanban=self.kanban
+        )
+        task.save()
+        return task
+
+    def test_events_written_to_outbox(self):
+        task = self.create_task()
+        task.to_planned()
+        task.delete()
+        events = list(
+            WebhookDelivery.objects.order_by("pk").values_list("event", flat=True)
+        )
+        self.assertEqual(events, ["task.created", "task.deleted"])
+
+    def test_burst_coalesced_into_one_request(self):
+        for i in range(3):
+            self.create_task(f"Task {i}")
+        self.assertEqual(deliver_due(100, 5, 50), (3, 0))
+        self.assertEqual(len(WebhookReceiver.received), 1)
+        headers, body = WebhookReceiver.received[0]
+        self.assertEqual(len(body["deliveries"]), 3)
+        self.assertTrue(headers["X-Kanban-Signature"].startswith("sha256="))
+        self.assertFalse(WebhookDelivery.objects.filter(state="PENDING").exists())
+
+    def test_failed_delivery_retried_later(self):
+        WebhookReceiver.status = 500
+        self.create_task()
+        self.assertEqual(deliver_due(100, 5, 50), (0, 1))
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual(delivery.state, "PENDING")
+        self.assertEqual(delivery.attempts, 1)
+        self.assertGreater(delivery.datetime_next_attempt, timezone.now())
+        self.assertEqual(deliver_due(100, 5, 50), (0, 0))
+
+    def test_claimed_delivery_not_sent_twice(self):
+        self.create_task()
+        WebhookDelivery.objects.update(
+            state="SENDING",
+            datetime_lease_until=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(deliver_due(100, 5, 50), (0, 0))
+        # воркер с арендой упал, после ее истечения событие уходит
+        WebhookDelivery.objects.update(datetime_lease_until=timezone.now())
+        self.assertEqual(deliver_due(100, 5, 50), (1, 0))
+        self.assertEqual(WebhookDelivery.objects.get().state, "DELIVERED")
+
+    def test_private_addresses_rejected(self):
+        with self.settings(WEBHOOK_ALLOW_PRIVATE_ADDRESSES=False):
+            for url in (
+                f"http://127.0.0.1:{self.server.server_port}/hook",
+                "http://169.254.169.254/latest/meta-data/",
+                "http://[::ffff:10.0.0.1]/hook",
+                "ftp://127.0.0.1/hook",
+            ):
+                form = WebhookAddForm(data={"url": url, "secret": ""})
+                self.assertFalse(form.is_valid(), url)
+            self.create_task()
+            self.assertEqual(deliver_due(100, 5, 50), (0, 1))
+        self.assertIn("внутреннюю сеть", WebhookDelivery.objects.get().last_error)
+        self.assertEqual(WebhookReceiver.received, [])
+
+
+class KanbanCloneTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        for i in range(200):
+            task = Task(
+                title=f"Task {i:03}",
+                description="Test desc",
+                owner=self.owner,
+                kanban=self.kanban,
+                state="DONE" if i % 2 else "PLANNED",
+            )
+            task.save()
+        img_dir = Path(self.media_root.name, "tasks", "img")
+        img_dir.mkdir(parents=True)
+        (img_dir / "test.jpg").write_bytes(b"image")
+        Task.objects.filter(title="Task 000").update(image="tasks/img/test.jpg")
+        self.client.login(username="Test usr", password="123")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_clone_copies_tasks_as_planned(self):
+        # SQLite ограничивает INSERT 999 параметрами: 200 задач - 4 пакета,
+        # еще два запроса берут номер изменения ChangeCounter
+        with self.assertNumQueries(11):
+            clone = self.kanban.clone(self.owner)
+        tasks = Task.objects.filter(kanban=clone)
+        self.assertEqual(tasks.count(), 200)
+        self.assertFalse(tasks.exclude(state="PLANNED").exists())
+        titles = list(tasks.order_by("rank").values_list("title", flat=True))
+        self.assertEqual(titles[:2], ["Task 000", "Task 002"])
+
+        image = tasks.get(title="Task 000").image
+        self.assertNotEqual(image.name, "tasks/img/test.jpg")
+        self.assertEqual(Path(image.path).read_bytes(), b"image")
+
+    def test_save_as_template_and_clone(self):
+        response = self.client.post(
+            reverse("tasks:kanban_save_template", args=[self.kanban.pk])
+        )
+        self.assertEqual(response.status_code, 302)
+        template = Kanban.objects.get(is_template=True)
+        response = self.client.get(reverse("tasks:kanban_list"))
+        self.assertNotIn(template, response.context["kanbans"])
+        self.assertIn(template, response.context["templates"])
+
+        response = self.client.post(reverse("tasks:kanban_clone", args=[template.pk]))
+        clone = Kanban.objects.exclude(pk__in=[self.kanban.pk, template.pk]).get()
+        self.assertRedirects(response, reverse("tasks:kanban_detail", args=[clone.pk]))
+        self.assertEqual(clone.tasks.count(), 200)
+
+
+class LoadTestCommandTest(LiveServerTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(
+            MEDIA_ROOT=self.media_root.name,
+            RATE_LIMITS={},
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_workflows_run_without_errors(self):
+        report_path = Path(self.media_root.name, "report.json")
+        out = StringIO()
+        # тестовая SQLite в памяти - одно соединение на все потоки live
+        # server, параллельные запросы ломали бы транзакции друг друга
+        call_command(
+            "loadtest",
+            url=self.live_server_url,
+            users=1,
+            seconds=2,
+            weight=["owner=1", "poller=0"],
+            tasks_per_board=2,
+            json=str(report_path),
+            stdout=out,
+        )
+        report = json.loads(report_path.read_text())
+        routes = report["routes"]
+        for route in (
+            "POST tasks:signup",
+            "POST tasks:login",
+            "POST tasks:task_add",
+            "POST tasks:task_done",
+            "GET tasks:kanban_detail",
+        ):
+            self.assertIn(route, routes)
+        for route, data in routes.items():
+            self.assertEqual(data["errors"], 0, (route, data["statuses"]))
+        self.assertTrue(Task.objects.filter(state="DONE").exists())
+        self.assertIn("RPS", out.getvalue())
+
+
+class StartupProfileCommandTest(TestCase):
+    def test_setup_within_budget_without_lazy_modules(self):
+        out = StringIO()
+        call_command("startup_profile", runs=1, top=10000, budget=30, stdout=out)
+        self.assertIn("django.setup()", out.getvalue())
+        self.assertIn("tasks.models", out.getvalue())
+        self.assertNotIn("PIL", out.getvalue())
+
+    def test_eager_lazy_module_fails(self):
+        with self.settings(STARTUP_LAZY_MODULES=("tasks.models",)):
+            with self.assertRaisesMessage(CommandError, "tasks.models"):
+                call_command("startup_profile", runs=1, budget=30, stdout=StringIO())
+
+    def test_background_commands_skip_system_checks(self):
+        # проверка ImageField импортирует PIL
+        for name in (
+            "cleanup_media",
+            "deliver_webhooks",
+            "purge_kanbans",
+            "rebalance_ranks",
+            "rebalance_shards",
+        ):
+            command = load_command_class("tasks", name)
+            self.assertEqual(command.requires_system_checks, [], name)
+
+
+class TaskListApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.executor = User.objects.create_user(username="Executor", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        self.other_kanban = Kanban.objects.create(title="Other", owner=self.owner)
+        self.now = timezone.now()
+        for i in range(5):
+            task = Task(
+                title=f"Task {i}",
+                description="Long description",
+                owner=self.owner,
+                kanban=self.kanban,
+            )
+            task.save()
+            if i % 2:
+                task.executor = self.executor
+                task.datetime_deadline = self.now + timedelta(days=5 - i)
+                task.state = "IN_PROGRESS"
+                task.save()
+        task = Task(title="Other", description="", owner=self.owner)
+        task.kanban = self.other_kanban
+        task.save()
+        self.client.login(username="Test usr", password="123")
+
+    def get(self, **params):
+        return self.client.get(reverse("tasks:api_tasks"), params)
+
+    def test_filters_and_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(kanban=self.kanban.pk, state="PLANNED")
+        results = response.json()["results"]
+        self.assertEqual(
+            [task["title"] for task in results], ["Task 0", "Task 2", "Task 4"]
+        )
+        self.assertNotIn("description", results[0])
+        self.assertFalse(
+            any('"description"' in query["sql"] for query in queries.captured_queries)
+        )
+
+        response = self.get(executor=self.executor.pk, fields="id,description")
+        results = response.json()["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(set(results[0]), {"id", "description"})
+
+    def test_sort_and_cursor(self):
+        response = self.get(sort="deadline", limit=1, fields="title")
+        data = response.json()
+        self.assertEqual(data["results"], [{"title": "Task 3"}])
+        response = self.get(
+            sort="deadline", limit=1, fields="title", cursor=data["next_cursor"]
+        )
+        data = response.json()
+        self.assertEqual(data["results"], [{"title": "Task 1"}])
+        self.assertIsNone(data["next_cursor"])
+
+        titles = []
+        cursor = ""
+        while True:
+            data = self.get(sort="-created", limit=2, cursor=cursor).json()
+            titles += [task["title"] for task in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(len(titles), 6)
+        self.assertEqual(titles[0], "Other")
+
+    def test_rejects_unknown_params(self):
+        for params in (
+            {"sort": "description"},
+            {"fields": "password"},
+            {"title": "Task 0"},
+            {"cursor": "broken"},
+            {"limit": 1000},
+            {"sort": "rank", "kanban": self.kanban.pk},
+        ):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_rank_sort_within_column(self):
+        response = self.get(sort="rank", kanban=self.kanban.pk, state="PLANNED")
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_readable_kanbans(self):
+        stranger = User.objects.create_user(username="Stranger", password="123")
+        self.client.force_login(stranger)
+        self.assertEqual(self.get().json()["results"], [])
+        self.assertEqual(self.get(kanban=self.kanban.pk).json()["results"], [])
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 403)
+
+
+class KanbanSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        self.tasks = []
+        for i in range(3):
+            task = Task(title=f"Task {i}", description="desc", owner=self.owner)
+            task.kanban = self.kanban
+            task.save()
+            self.tasks.append(task)
+        self.client.login(username="Test usr", password="123")
+
+    def sync(self, cursor="", **params):
+        response = self.client.get(
+            reverse("tasks:kanban_sync", args=[self.kanban.pk]),
+            {"cursor": cursor, **params},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_changes_since_cursor(self):
+        data = self.sync()
+        self.assertTrue(data["reset"])
+        self.assertEqual(len(data["tasks"]), 3)
+        self.assertNotIn("description", data["tasks"][0])
+        data = self.sync(data["cursor"])
+        self.assertEqual((data["tasks"], data["deleted"]), ([], []))
+        self.assertFalse(data["reset"])
+        cursor = data["cursor"]
+
+        updated, moved, deleted = self.tasks
+        updated.title = "Renamed"
+        updated.save()
+        moved.move_between(before_pk=updated.pk)
+        deleted_pk = deleted.pk
+        deleted.delete()
+        data = self.sync(cursor, fields="id,title,rank")
+        self.assertEqual(
+            [task["id"] for task in data["tasks"]], [updated.pk, moved.pk]
+        )
+        self.assertEqual(data["tasks"][0]["title"], "Renamed")
+        self.assertEqual(data["deleted"], [deleted_pk])
+        data = self.sync(data["cursor"])
+        self.assertEqual((data["tasks"], data["deleted"]), ([], []))
+
+    def test_overdue_sweep_is_synced(self):
+        cursor = self.sync()["cursor"]
+        task = self.tasks[0]
+        task.executor = self.owner
+        task.datetime_deadline = timezone.now() + timedelta(days=1)
+        task.to_assigned()
+        cursor = self.sync(cursor)["cursor"]
+        Task.all_objects.filter(pk=task.pk).update(
+            datetime_deadline=timezone.now() - timedelta(days=1)
+        )
+        Task.to_overdue()
+        data = self.sync(cursor, fields="id,state")
+        self.assertEqual(data["tasks"], [{"id": task.pk, "state": "OVERDUE"}])
+
+    def test_pages_and_resets(self):
+        with self.settings(SYNC_PAGE_SIZE=2):
+            data = self.sync()
+            self.assertTrue(data["has_more"])
+            self.assertEqual(len(data["tasks"]), 2)
+            data = self.sync(data["cursor"])
+            self.assertFalse(data["has_more"])
+            self.assertEqual(len(data["tasks"]), 1)
+
+        old = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1)
+        data = self.sync(encode_cursor([self.kanban.pk, 0, 0, 0, old.isoformat()]))
+        self.assertTrue(data["reset"])
+        self.assertEqual(len(data["tasks"]), 3)
+        # курсор другого канбана: номера изменений из другого шарда
+        now = timezone.now().isoformat()
+        data = self.sync(encode_cursor([self.kanban.pk + 1, 10**6, 0, 0, now]))
+        self.assertTrue(data["reset"])
+        self.assertEqual(len(data["tasks"]), 3)
+        response = self.client.get(
+            reverse("tasks:kanban_sync", args=[self.kanban.pk]), {"cursor": "bad"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_idle_board_not_reset(self):
+        old = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1)
+        Task.objects.update(datetime_last_update=old)
+        data = self.sync(self.sync()["cursor"])
+        self.assertFalse(data["reset"])
+        self.assertEqual(data["tasks"], [])
+
+    def test_change_with_older_timestamp_not_missed(self):
+        cursor = self.sync()["cursor"]
+        # писатель, ждавший блокировку, коммитит время раньше курсора
+        old = timezone.now() - timedelta(minutes=1)
+        with transaction.atomic():
+            Task.objects.filter(pk=self.tasks[0].pk).update(
+                title="Late",
+                datetime_last_update=old,
+                change_seq=ChangeCounter.next(),
+            )
+        data = self.sync(cursor, fields="id,title")
+        self.assertEqual(data["tasks"], [{"id": self.tasks[0].pk, "title": "Late"}])
+
+    def test_forbidden_for_strangers(self):
+        stranger = User.objects.create_user(username="Stranger", password="123")
+        self.client.force_login(stranger)
+        response = self.client.get(reverse("tasks:kanban_sync", args=[self.kanban.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_purge_prunes_old_tombstones(self):
+        self.tasks[0].delete()
+        self.tasks[1].delete()
+        TaskTombstone.objects.filter(
+            pk=TaskTombstone.objects.order_by("pk").first().pk
+        ).update(datetime_deleted=timezone.now() - timedelta(days=365))
+        call_command("purge_kanbans", pause=0, stdout=StringIO())
+        self.assertEqual(TaskTombstone.objects.count(), 1)
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.admin)
+        self.client.force_login(self.admin)
+
+    def add_tasks(self, count):
+        for i in range(count):
+            user = User.objects.create_user(username=f"user {count} {i}")
+            task = Task(title=f"Task {i}", description="desc", owner=user)
+            task.kanban = Kanban.objects.create(title=f"Board {i}", owner=user)
+            task.executor = self.admin
+            task.save()
+
+    def changelist_queries(self, url_name) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_tasks(2)
+        task_queries = self.changelist_queries("admin:tasks_task_changelist")
+        membership_queries = self.changelist_queries(
+            "admin:tasks_kanbanmembership_changelist"
+        )
+        self.add_tasks(20)
+        self.assertEqual(
+            self.changelist_queries("admin:tasks_task_changelist"), task_queries
+        )
+        self.assertEqual(
+            self.changelist_queries("admin:tasks_kanbanmembership_changelist"),
+            membership_queries,
+        )
+
+    def test_bulk_delete_goes_through_models(self):
+        blocker, task = [
+            Task(title=title, description="desc", owner=self.admin, kanban=self.kanban)
+            for title in ("Blocker", "Task")
+        ]
+        blocker.save()
+        task.save()
+        task.add_blocker(blocker)
+        self.client.post(
+            reverse("admin:tasks_task_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [blocker.pk],
+                "post": "yes",
+            },
+        )
+        self.assertFalse(Task.all_objects.filter(pk=blocker.pk).exists())
+        self.assertFalse(TaskBlockerPath.objects.exists())
+        self.assertTrue(TaskTombstone.objects.filter(task_id=blocker.pk).exists())
+
+        self.client.post(
+            reverse("admin:tasks_kanban_changelist"),
+            {
+                "action": "delete_selected",
+                "_selected_action": [task.kanban_id],
+                "post": "yes",
+            },
+        )
+        kanban = Kanban.all_objects.get(pk=task.kanban_id)
+        self.assertIsNotNone(kanban.datetime_deleted)
+        self.assertTrue(Task.all_objects.filter(pk=task.pk).exists())
+
+    def test_change_page_uses_raw_id_widgets(self):
+        self.add_tasks(1)
+        task = Task.objects.get()
+        response = self.client.get(reverse("admin:tasks_task_change", args=[task.pk]))
+        self.assertContains(response, "vForeignKeyRawIdAdminField")
+        self.assertNotContains(response, "<option value=\"%s\"" % self.admin.pk)
+
+    def test_approximate_count(self):
+        self.add_tasks(9)
+        with mock.patch.object(ApproximateCountPaginator, "exact_limit", 3):
+            paginator = ApproximateCountPaginator(Task.all_objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, Task.all_objects.order_by("-pk")[0].pk)
+            filtered = Task.all_objects.filter(state="PLANNED").order_by("pk")
+            # нижняя граница: за первой страницей видна следующая
+            self.assertEqual(ApproximateCountPaginator(filtered, 2).count, 5)
+            # с последней страницы счет доходит до конца списка
+            paginator = ApproximateCountPaginator(filtered, 2, page_number=5)
+            self.assertEqual(paginator.count, 9)
+            self.assertEqual(len(paginator.page(5).object_list), 1)
+        paginator = ApproximateCountPaginator(Task.all_objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 9)
+
+
+class ShardingTest(TransactionTestCase):
+    databases = {"default", "replica", "shard1"}
+
+    def setUp(self):
+        cache.clear()
+        self.settings_override = self.settings(KANBAN_SHARDS=["default", "shard1"])
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        models = [model for model in apps.get_models() if shards.is_sharded(model)]
+        shards.seed_sequences("shard1", models)
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.client.login(username="Test usr", password="123")
+
+    def create_kanban(self, alias, title="Sprint"):
+        with shards.use_shard(alias):
+            return Kanban.objects.create(title=title, owner=self.owner)
+
+    def create_task(self, kanban, **fields):
+        task = Task(title="Task", description="desc", owner=self.owner, **fields)
+        task.kanban = kanban
+        task.save()
+        return task
+
+    def move_kanban(self, kanban_pk, source, target) -> int:
+        command = load_command_class("tasks", "rebalance_shards")
+        return command.move(kanban_pk, source, target)
+
+    def test_new_kanban_lands_in_chosen_shard(self):
+        with mock.patch.object(shards, "choose_shard", return_value="shard1"):
+            self.client.post(reverse("tasks:kanban_add"), {"title": "New"})
+        kanban = Kanban.objects.using("shard1").get()
+        self.assertEqual(shards.shard_for_id(kanban.pk), "shard1")
+        self.assertFalse(Kanban.objects.using("default").exists())
+        # участники остаются в default
+        self.assertTrue(KanbanMembership.objects.filter(kanban_id=kanban.pk).exists())
+
+        response = self.client.post(
+            reverse("tasks:task_add", args=[kanban.pk]),
+            {"title": "Task", "description": "desc"},
+        )
+        self.assertEqual(response.status_code, 302)
+        task = Task.objects.using("shard1").get()
+        self.assertEqual(task.pk >> settings.KANBAN_SHARD_ID_BITS, 1)
+        # в шарде нет таблицы пользователей, авторы подгружаются из default
+        self.client.post(
+            reverse("tasks:task_comment_add", args=[task.pk]), {"text": "Hello"}
+        )
+        response = self.client.get(reverse("tasks:task_detail", args=[task.pk]))
+        self.assertContains(response, "<b>Test usr</b>")
+        self.assertEqual(Task.objects.using("shard1").get().comment_count, 1)
+        self.client.post(reverse("tasks:task_delete", args=[task.pk]))
+        self.assertFalse(Task.objects.using("shard1").exists())
+        self.assertTrue(TaskTombstone.objects.using("shard1").exists())
+
+    def test_lists_fan_out_to_all_shards(self):
+        local = self.create_kanban("default", "Local board")
+        remote = self.create_kanban("shard1", "Remote board")
+        for kanban in (local, remote):
+            self.create_task(
+                kanban, executor=self.owner, datetime_deadline=timezone.now()
+            )
+
+        response = self.client.get(reverse("tasks:kanban_list"))
+        self.assertContains(response, "Local board")
+        self.assertContains(response, "Remote board")
+
+        response = self.client.get(reverse("tasks:api_tasks"), {"limit": 1})
+        data = response.json()
+        seen = [task["id"] for task in data["results"]]
+        response = self.client.get(
+            reverse("tasks:api_tasks"), {"limit": 1, "cursor": data["next_cursor"]}
+        )
+        seen += [task["id"] for task in response.json()["results"]]
+        pks = [Task.objects.using(alias).get().pk for alias in ("default", "shard1")]
+        self.assertEqual(sorted(seen), pks)
+
+        response = self.client.get(reverse("tasks:my_tasks"))
+        self.assertEqual(len(response.context["tasks"]), 2)
+
+    def test_to_overdue_covers_every_shard(self):
+        past = timezone.now() - timedelta(days=1)
+        for alias in ("default", "shard1"):
+            task = self.create_task(self.create_kanban(alias), state="IN_PROGRESS")
+            Task.all_objects.using(alias).filter(pk=task.pk).update(
+                datetime_deadline=past
+            )
+        self.assertEqual(Task.to_overdue(), 2)
+        for alias in ("default", "shard1"):
+            self.assertEqual(Task.objects.using(alias).get().state, "OVERDUE")
+
+    def test_rebalance_moves_kanban_with_tasks(self):
+        # нагрузка - задачи канбана плюс сам канбан: 1, 2 и 5
+        self.create_kanban("default", "Empty")
+        small = self.create_kanban("default", "Small")
+        big = self.create_kanban("default", "Big")
+        big_tasks = [self.create_task(big) for _ in range(4)]
+        big_tasks[1].add_blocker(big_tasks[0])
+        self.create_task(small)
+        WebhookSubscription.objects.using("default").create(
+            kanban=big, url="http://example.com/hook"
+        )
+
+        call_command("rebalance_shards", stdout=StringIO())
+
+        moved = Kanban.objects.using("shard1").get()
+        self.assertEqual(moved.title, "Big")
+        self.assertEqual(shards.shard_for_id(moved.pk), "shard1")
+        self.assertEqual(Task.objects.using("shard1").filter(kanban=moved).count(), 4)
+        self.assertTrue(WebhookSubscription.objects.using("shard1").exists())
+        path = TaskBlockerPath.objects.using("shard1").get()
+        self.assertEqual(path.descendant.kanban_id, moved.pk)
+        self.assertEqual(Kanban.objects.using("default").count(), 2)
+        self.assertEqual(Task.objects.using("default").count(), 1)
+        membership = KanbanMembership.objects.get(user=self.owner, kanban_id=moved.pk)
+        self.assertEqual(membership.role, KanbanMembership.OWNER)
+        response = self.client.get(reverse("tasks:kanban_detail", args=[moved.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_moved_kanban_old_links_redirect(self):
+        kanban = self.create_kanban("default")
+        task = self.create_task(kanban)
+        cursor = self.client.get(
+            reverse("tasks:kanban_sync", args=[kanban.pk])
+        ).json()["cursor"]
+        token = ical.make_token(self.owner.pk, kanban.pk)
+
+        new_pk = self.move_kanban(kanban.pk, "default", "shard1")
+        new_task = Task.objects.using("shard1").get()
+
+        response = self.client.get(reverse("tasks:kanban_detail", args=[kanban.pk]))
+        self.assertRedirects(response, reverse("tasks:kanban_detail", args=[new_pk]))
+        response = self.client.get(reverse("tasks:task_detail", args=[task.pk]))
+        self.assertRedirects(
+            response, reverse("tasks:task_detail", args=[new_task.pk])
+        )
+        # курсор старого канбана сбрасывается: номера изменений другого шарда
+        response = self.client.get(
+            reverse("tasks:kanban_sync", args=[kanban.pk]), {"cursor": cursor}
+        )
+        self.assertEqual(response.status_code, 302)
+        data = self.client.get(response.url).json()
+        self.assertTrue(data["reset"])
+        self.assertEqual([item["id"] for item in data["tasks"]], [new_task.pk])
+        self.client.logout()
+        response = self.client.get(reverse("tasks:ical_feed", args=[token]))
+        self.assertEqual(response.status_code, 200)
+
+        # второй перенос: старые id ведут на последнюю копию
+        newest_pk = self.move_kanban(new_pk, "shard1", "default")
+        self.assertEqual(
+            KanbanRedirect.resolve(KanbanRedirect.KANBAN, kanban.pk), newest_pk
+        )
+
+    def test_deleting_user_cleans_other_shards(self):
+        other = User.objects.create_user(username="Other", password="123")
+        remote = self.create_kanban("shard1")
+        with shards.use_shard("shard1"):
+            owned = Kanban.objects.create(title="Owned", owner=other)
+        kept = self.create_task(remote, executor=other)
+        self.create_task(remote).add_comment(other, "Hello")
+        Task(
+            title="By other", description="desc", owner=other, kanban=remote
+        ).save()
+
+        other_pk = other.pk
+        other.delete()
+
+        self.assertIsNotNone(
+            Kanban.all_objects.using("shard1").get(pk=owned.pk).datetime_deleted
+        )
+        remaining = Task.objects.using("shard1").filter(owner_id=other_pk)
+        self.assertFalse(remaining.exists())
+        self.assertFalse(TaskComment.objects.using("shard1").exists())
+        self.assertIsNone(Task.objects.using("shard1").get(pk=kept.pk).executor_id)
+
+
+class TaskDependencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        self.a, self.b, self.c, self.d = [self.create_task(name) for name in "abcd"]
+        self.client.login(username="Test usr", password="123")
+
+    def create_task(self, title, kanban=None):
+        task = Task(title=title, description="desc", owner=self.owner)
+        task.kanban = kanban or self.kanban
+        task.save()
+        return task
+
+    def titles(self, tasks) -> list:
+        return sorted(task.title for task in tasks)
+
+    def test_closure_covers_chains(self):
+        self.b.add_blocker(self.a)
+        self.c.add_blocker(self.b)
+        self.assertEqual(self.titles(self.c.blockers()), ["a", "b"])
+        self.assertEqual(self.titles(self.a.dependents()), ["b", "c"])
+        with self.assertNumQueries(1):
+            list(self.c.blockers())
+
+    def test_cycle_and_foreign_blockers_rejected(self):
+        self.b.add_blocker(self.a)
+        self.c.add_blocker(self.b)
+        with self.assertRaises(ValidationError):
+            self.a.add_blocker(self.c)
+        with self.assertRaises(ValidationError):
+            self.a.add_blocker(self.a)
+        other_kanban = Kanban.objects.create(title="X", owner=self.owner)
+        other = self.create_task("x", other_kanban)
+        with self.assertRaises(ValidationError):
+            self.a.add_blocker(other)
+        self.assertEqual(list(self.a.blockers()), [])
+
+    def test_removing_edge_keeps_other_chain(self):
+        # a -> b -> d и a -> c -> d: после удаления b -> d путь a -> d остается
+        self.b.add_blocker(self.a)
+        self.c.add_blocker(self.a)
+        self.d.add_blocker(self.b)
+        self.d.add_blocker(self.c)
+        self.assertEqual(
+            TaskBlockerPath.objects.get(ancestor=self.a, descendant=self.d).paths, 2
+        )
+        self.d.remove_blocker(self.b)
+        self.assertEqual(self.titles(self.d.blockers()), ["a", "c"])
+        self.d.remove_blocker(self.c)
+        self.assertEqual(list(self.d.blockers()), [])
+
+    def test_deleting_task_drops_paths_through_it(self):
+        self.b.add_blocker(self.a)
+        self.c.add_blocker(self.b)
+        self.b.delete()
+        self.assertEqual(list(self.c.blockers()), [])
+        self.assertFalse(TaskBlockerPath.objects.exists())
+
+    def test_to_assigned_refuses_while_blocked(self):
+        self.b.add_blocker(self.a)
+        self.b.executor = self.owner
+        self.b.datetime_deadline = timezone.now() + timedelta(days=1)
+        with self.assertRaises(ValidationError):
+            self.b.to_assigned()
+        Task.all_objects.filter(pk=self.a.pk).update(state="DONE")
+        self.b.to_assigned()
+        self.assertEqual(self.b.state, "IN_PROGRESS")
+
+    def test_board_badges_do_not_query_per_card(self):
+        self.b.add_blocker(self.a)
+        url = reverse("tasks:kanban_detail", args=[self.kanban.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'class="blocked"', count=1)
+        for title in "efgh":
+            self.d.add_blocker(self.create_task(title))
+        with self.assertNumQueries(len(queries.captured_queries)):
+            response = self.client.get(url)
+        self.assertContains(response, 'class="blocked"', count=2)
+
+    def test_views_add_and_remove_blocker(self):
+        response = self.client.post(
+            reverse("tasks:task_blocker_add", args=[self.b.pk]), {"blocker": self.a.pk}
+        )
+        self.assertRedirects(response, reverse("tasks:task_detail", args=[self.b.pk]))
+        response = self.client.get(reverse("tasks:task_detail", args=[self.a.pk]))
+        self.assertContains(response, "Ждут эту задачу")
+        response = self.client.post(
+            reverse("tasks:task_blocker_add", args=[self.a.pk]), {"blocker": self.b.pk}
+        )
+        self.assertContains(response, "цикл", status_code=400)
+        self.client.post(
+            reverse("tasks:task_blocker_remove", args=[self.b.pk, self.a.pk])
+        )
+        self.assertEqual(list(self.b.blockers()), [])
+
+
+class TaskCommentTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.reader = User.objects.create_user(username="Reader", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        KanbanMembership.add_executor(self.kanban.pk, self.reader.pk)
+        self.task = Task(title="Task", description="desc", owner=self.owner)
+        self.task.kanban = self.kanban
+        self.task.save()
+        self.client.login(username="Reader", password="123")
+
+    def comment(self, text="Hello"):
+        return self.client.post(
+            reverse("tasks:task_comment_add", args=[self.task.pk]), {"text": text}
+        )
+
+    def test_comment_updates_denormalized_count(self):
+        response = self.comment()
+        self.assertRedirects(
+            response, reverse("tasks:task_detail", args=[self.task.pk])
+        )
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.comment_count, 1)
+        # сохранение загруженной раньше задачи не затирает счетчик
+        stale = Task.objects.get(pk=self.task.pk)
+        self.comment("Second")
+        stale.title = "Renamed"
+        stale.save()
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.comment_count, 2)
+        comment = TaskComment.objects.get(text="Second")
+        self.client.post(
+            reverse("tasks:task_comment_remove", args=[self.task.pk, comment.pk])
+        )
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.comment_count, 1)
+
+    def test_comment_during_save_is_kept(self):
+        next_seq = ChangeCounter.next
+
+        def comment_then_next():
+            # комментарий, добавленный после того, как save прочитал задачу
+            Task.all_objects.filter(pk=self.task.pk).update(
+                comment_count=F("comment_count") + 1
+            )
+            return next_seq()
+
+        with mock.patch.object(ChangeCounter, "next", side_effect=comment_then_next):
+            self.task.save()
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.comment_count, 1)
+
+    def test_only_author_or_owner_removes(self):
+        comment = self.task.add_comment(self.owner, "Owner comment")
+        response = self.client.post(
+            reverse("tasks:task_comment_remove", args=[self.task.pk, comment.pk])
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(TaskComment.objects.filter(pk=comment.pk).exists())
+
+    def test_feed_is_keyset_paginated_without_n_plus_one(self):
+        for i in range(3):
+            self.task.add_comment(self.owner, f"Comment {i}")
+        url = reverse("tasks:task_detail", args=[self.task.pk])
+        with mock.patch.object(TaskDetailView, "comments_page_size", 2):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.task.add_comment(self.reader, "Comment 3")
+            with self.assertNumQueries(len(queries.captured_queries)):
+                self.client.get(url)
+        self.assertContains(response, "Comment 2")
+        self.assertNotContains(response, "Comment 0")
+        response = self.client.get(f"{url}?{response.context['next_query']}")
+        self.assertContains(response, "Comment 0")
+        self.assertNotContains(response, "Comment 2")
+
+    def test_board_shows_count_without_count_queries(self):
+        self.task.add_comment(self.owner, "Hello")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("tasks:kanban_detail", args=[self.kanban.pk])
+            )
+        self.assertContains(response, '<span class="comments">1</span>')
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if "tasks_taskcomment" in query])
+
+
+class IcalFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="Test usr", password="123")
+        self.executor = User.objects.create_user(username="Executor", password="123")
+        self.kanban = Kanban.objects.create(title="Sprint", owner=self.owner)
+        self.deadline = timezone.now() + timedelta(days=3)
+        self.task = self.create_task("Release", self.kanban, self.deadline)
+        self.create_task("No deadline", self.kanban, None)
+        other = Kanban.objects.create(title="Other", owner=self.owner)
+        self.create_task("Other task", other, self.deadline)
+        self.url = reverse(
+            "tasks:ical_feed", args=[ical.make_token(self.owner.pk, self.kanban.pk)]
+        )
+
+    def create_task(self, title, kanban, deadline):
+        task = Task(title=title, description="desc", owner=self.owner)
+        task.kanban = kanban
+        task.executor = self.executor
+        task.datetime_deadline = deadline
+        task.save()
+        return task
+
+    def test_board_feed_lists_deadlines(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body = b"".join(response.streaming_content).decode()
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn("SUMMARY:Release\r\n", body)
+        self.assertIn(f"DTSTART:{ical.format_datetime(self.deadline)}", body)
+        self.assertNotIn("No deadline", body)
+        self.assertNotIn("Other task", body)
+
+    def test_polling_uses_cache_until_board_changes(self):
+        response = self.client.get(self.url)
+        b"".join(response.streaming_content)
+        etag = response["ETag"]
+        # версия канбана читается одним запросом, задачи не читаются
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertContains(response, "SUMMARY:Release")
+        # версия берется из базы, а не из кеша процесса
+        cache.clear()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.task.title = "Release 2"
+        self.task.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Release 2", b"".join(response.streaming_content).decode())
+
+    def test_board_rename_and_task_delete_change_etag(self):
+        etags = [self.client.get(self.url)["ETag"]]
+        self.kanban.title = "Sprint 2"
+        self.kanban.save()
+        etags.append(self.client.get(self.url)["ETag"])
+        self.task.delete()
+        etags.append(self.client.get(self.url)["ETag"])
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_user_feed_has_assigned_tasks_from_every_board(self):
+        KanbanMembership.add_executor(self.kanban.pk, self.executor.pk)
+        token = ical.make_token(self.executor.pk)
+        response = self.client.get(reverse("tasks:ical_feed", args=[token]))
+        body = b"".join(response.streaming_content).decode()
+        self.assertIn("SUMMARY:Release", body)
+        self.assertNotIn("Other task", body)
+        self.assertIn("X-WR-CALNAME:Мои задачи", body)
+
+    def test_token_is_checked(self):
+        response = self.client.get(reverse("tasks:ical_feed", args=["forged:token"]))
+        self.assertEqual(response.status_code, 404)
+        token = ical.make_token(self.executor.pk, self.kanban.pk)
+        response = self.client.get(reverse("tasks:ical_feed", args=[token]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_long_lines_are_folded(self):
+        value = "SUMMARY:" + "Задача " * 20
+        line = ical.fold(value)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in line.split("\r\n")))
+        self.assertEqual(line.replace("\r\n ", ""), value + "\r\n")
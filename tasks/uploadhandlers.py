@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Проверяет изображение, пока оно еще загружается.
+
+    Стоит перед стандартными обработчиками и пропускает через себя каждый
+    кусок файла. Загрузка обрывается, как только файл превысил
+    IMAGE_MAX_SIZE_MB или по первым байтам стало ясно, что это не
+    изображение или у него слишком большое разрешение. Ошибка сохраняется
+    в request.upload_errors и показывается формой.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.max_bytes = settings.IMAGE_MAX_SIZE_MB * 1024 * 1024
+        self.received = 0
+        from PIL import ImageFile
+
+        self.parser = ImageFile.Parser()
+        self.checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject(f"Изображение больше {settings.IMAGE_MAX_SIZE_MB}мб")
+            raise StopUpload(connection_reset=True)
+
+        if not self.checked:
+            from PIL import Image
+
+            try:
+                self.parser.feed(raw_data)
+            except Image.DecompressionBombError:
+                # заголовок обещает больше 2 * MAX_IMAGE_PIXELS, Pillow
+                # отказывается его открывать
+                self.reject("Слишком большое разрешение изображения")
+                raise StopUpload(connection_reset=True)
+            if self.parser.image is not None:
+                error = self.check_image(self.parser.image)
+                if error:
+                    self.reject(error)
+                    raise StopUpload(connection_reset=True)
+                self.checked = True
+            elif self.received >= settings.IMAGE_HEADER_SNIFF_BYTES:
+                self.reject("Файл не является изображением")
+                raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # маленький файл закончился раньше, чем распознался заголовок
+        if not self.checked:
+            if self.parser.image is None:
+                self.reject("Файл не является изображением")
+            else:
+                error = self.check_image(self.parser.image)
+                if error:
+                    self.reject(error)
+        return None
+
+    def check_image(self, image):
+        if image.format not in settings.IMAGE_ALLOWED_FORMATS:
+            return f"Формат {image.format} не поддерживается"
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            return "Слишком большое разрешение изображения"
+        return ""
+
+    def reject(self, message):
+        if not hasattr(self.request, "upload_errors"):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
@@ -11,6 +11,26 @@ urlpatterns = [
         name="kanban_detail",
     ),
     path("kanban_add/", views.KanbanCreateView.as_view(), name="kanban_add"),
+    path(
+        "<int:pk>/kanban_clone/",
+        views.KanbanCloneView.as_view(),
+        name="kanban_clone",
+    ),
+    path(
+        "<int:pk>/kanban_save_template/",
+        views.KanbanCloneView.as_view(as_template=True),
+        name="kanban_save_template",
+    ),
+    path("my_tasks/", views.MyTasksView.as_view(), name="my_tasks"),
+    path("api/tasks/", views.TaskListApiView.as_view(), name="api_tasks"),
+    path(
+        "<int:pk>/kanban_sync/", views.KanbanSyncView.as_view(), name="kanban_sync"
+    ),
+    path(
+        "users/autocomplete/",
+        views.UserAutocompleteView.as_view(),
+        name="user_autocomplete",
+    ),
     path(
         "<int:pk>/kanban_delete/",
         views.KanbanDeleteView.as_view(),
@@ -18,6 +38,11 @@ urlpatterns = [
     ),
     path("", views.AppWelcomeScreen.as_view(), name="index"),
     path("<int:kanban_pk>/task_add/", views.TaskCreateView.as_view(), name="task_add"),
+    path(
+        "<int:kanban_pk>/kanban_webhooks/",
+        views.KanbanWebhookView.as_view(),
+        name="kanban_webhooks",
+    ),
     path("<int:pk>/task_delete/", views.TaskDeleteView.as_view(), name="task_delete"),
     path("<int:pk>/task_update/", views.TaskUpdateView.as_view(), name="task_update"),
     path("<int:pk>/task_detail/", views.TaskDetailView.as_view(), name="task_detail"),
@@ -29,8 +54,31 @@ urlpatterns = [
     path("<int:pk>/task_assign/", views.TaskAssignView.as_view(), name="task_assign"),
     path("<int:pk>/task_review/", views.TaskReviewView.as_view(), name="task_review"),
     path("<int:pk>/task_done/", views.TaskDoneView.as_view(), name="task_done"),
+    path("<int:pk>/task_move/", views.TaskMoveView.as_view(), name="task_move"),
+    path(
+        "<int:pk>/task_blockers/",
+        views.TaskBlockerView.as_view(),
+        name="task_blocker_add",
+    ),
+    path(
+        "<int:pk>/task_blockers/<int:blocker_pk>/remove/",
+        views.TaskBlockerView.as_view(remove=True),
+        name="task_blocker_remove",
+    ),
+    path(
+        "<int:pk>/task_comments/",
+        views.TaskCommentView.as_view(),
+        name="task_comment_add",
+    ),
+    path(
+        "<int:pk>/task_comments/<int:comment_pk>/remove/",
+        views.TaskCommentView.as_view(remove=True),
+        name="task_comment_remove",
+    ),
     path("login/", views.AppLoginView.as_view(), name="login"),
     path("logout/", views.AppLogoutView.as_view(), name="logout"),
     path("signin/", views.AppSignupView.as_view(), name="signup"),
+    path("metrics", views.metrics_view, name="metrics"),
+    path("calendar/<str:token>.ics", views.IcalFeedView.as_view(), name="ical_feed"),
 ]
 
@@ -1,5 +1,6 @@
 from django.db.models.query import QuerySet
 from django.http.response import HttpResponseRedirect
+from django.views.generic.detail import SingleObjectMixin
 from django.views.generic import (
     ListView,
     DetailView,
@@ -7,23 +8,56 @@ from django.views.generic import (
     DeleteView,
     UpdateView,
     TemplateView,
+    View,
+)
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
 )
-from django.http import HttpResponseForbidden
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import reverse_lazy
 from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.models import User
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.shortcuts import render, get_object_or_404
+from django.conf import settings
 from .forms import (
     TaskAddForm,
     KanbanAddForm,
     TaskAssignForm,
+    TaskBlockerForm,
+    TaskCommentForm,
     TaskReviewForm,
     TaskDoneForm,
+    MyTasksFilterForm,
+    TaskListApiForm,
+    WebhookAddForm,
+)
+from .models import (
+    Task,
+    Kanban,
+    KanbanRedirect,
+    TaskComment,
+    TaskTombstone,
+    WebhookSubscription,
 )
-from .models import Task, Kanban
+from . import ical, permissions, shards
+from . import metrics
+from .media import serve_media
+from .pagination import decode_cursor, encode_cursor, keyset_page, merge_pages
+from .uploadhandlers import ImageUploadHandler
+from .routers import is_pinned, use_replica
 from django.utils import timezone
+from django.core import signing
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.db.models import Q
+from datetime import timedelta
 
 tasks = [i for i in range(1, 11)]
 """
@@ -32,7 +66,28 @@ tasks = [i for i in range(1, 11)]
 """
 
 
-class KanbanListView(UserPassesTestMixin, ListView):
+class ReplicaReadMixin:
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or is_pinned(request):
+            return super().dispatch(request, *args, **kwargs)
+        with use_replica():
+            response = super().dispatch(request, *args, **kwargs)
+            # шаблон рендерится лениво, querysets должны выполниться здесь
+            if hasattr(response, "render"):
+                response.render()
+        return response
+
+
+class ImageUploadMixin:
+    upload_handler_classes = [ImageUploadHandler]
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["upload_errors"] = getattr(self.request, "upload_errors", {})
+        return kwargs
+
+
+class KanbanListView(ReplicaReadMixin, UserPassesTestMixin, ListView):
     model = Kanban
     template_name = "tasks/kanban_list.html"
     context_object_name = "kanbans"
@@ -51,16 +106,28 @@ class KanbanListView(UserPassesTestMixin, ListView):
             )
         )
 
-    def get_queryset(self) -> QuerySet:
+    def get_queryset(self) -> list:
         if self.request.user.is_authenticated:
-            return Kanban.objects.filter(owner=self.request.user)
-        return Kanban.objects.none()
+            return self.readable_kanbans(is_template=False)
+        return []
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["is_authenticated"] = self.request.user.is_authenticated
+        if self.request.user.is_authenticated:
+            context["templates"] = self.readable_kanbans(is_template=True)
+            context["ical_token"] = ical.make_token(self.request.user.pk)
         return context
 
+    def readable_kanbans(self, **filters) -> list:
+        # по одному запросу в каждый шард, где есть канбаны пользователя
+        kanban_ids = permissions.readable_kanban_ids(self.request.user)
+        kanbans = []
+        for alias, ids in shards.group_by_shard(kanban_ids).items():
+            with shards.use_shard(alias):
+                kanbans += Kanban.objects.filter(pk__in=ids, **filters)
+        return sorted(kanbans, key=lambda kanban: kanban.pk)
+
 
 class AppWelcomeScreen(TemplateView):
     template_name = "tasks/index.html"
@@ -73,9 +140,16 @@ class AppWelcomeScreen(TemplateView):
 
 
 class TaskPermissionMixin(UserPassesTestMixin):
+    # изменять задачу может только владелец канбана
+    write_access = False
+
     def test_func(self) -> bool:
         task = self.get_object()
-        return task.owner == self.request.user
+        if task.owner_id == self.request.user.pk:
+            return True
+        if self.write_access:
+            return permissions.can_write(self.request.user, task.kanban_id)
+        return permissions.can_read(self.request.user, task.kanban_id)
 
     def handle_no_permission(self) -> HttpResponseRedirect:
         return HttpResponseForbidden(
@@ -87,14 +161,13 @@ class TaskPermissionMixin(UserPassesTestMixin):
         )
 
 
-class KanbanDetailView(UserPassesTestMixin, DetailView):
+class KanbanDetailView(ReplicaReadMixin, UserPassesTestMixin, DetailView):
     model = Kanban
     template_name = "tasks/kanban_detail.html"
     context_object_name = "kanban"
 
     def test_func(self) -> bool:
-        kanban = self.get_object()
-        return kanban.owner == self.request.user
+        return permissions.can_read(self.request.user, self.kwargs["pk"])
 
     def handle_no_permission(self) -> HttpResponseRedirect:
         return HttpResponseForbidden(
@@ -107,18 +180,47 @@ class KanbanDetailView(UserPassesTestMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["tasks_planned"] = Task.objects.filter(state="PLANNED")
-        context["tasks_assigned"] = Task.objects.filter(state="IN_PROGRESS")
-        context["tasks_review"] = Task.objects.filter(state="REVIEW")
-        context["tasks_done"] = Task.objects.filter(state="DONE")
-        context["tasks_overdue"] = Task.objects.filter(state="OVERDUE")
+        # (kanban, state, rank) покрывается индексом task_column_rank_idx,
+        # признак blocked считается подзапросом в том же запросе колонки
+        tasks = Task.with_blocked(Task.objects.filter(kanban=self.object)).order_by(
+            "rank", "pk"
+        )
+        context["tasks_planned"] = tasks.filter(state="PLANNED")
+        context["tasks_assigned"] = tasks.filter(state="IN_PROGRESS")
+        context["tasks_review"] = tasks.filter(state="REVIEW")
+        context["tasks_done"] = tasks.filter(state="DONE")
+        context["tasks_overdue"] = tasks.filter(state="OVERDUE")
+        context["ical_token"] = ical.make_token(self.request.user.pk, self.object.pk)
         return context
 
 
-class TaskDetailView(TaskPermissionMixin, DetailView):
+class TaskDetailView(ReplicaReadMixin, TaskPermissionMixin, DetailView):
     model = Task
     template_name = "tasks/task_detail.html"
     context_object_name = "task"
+    comments_page_size = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # новые комментарии сверху, (task, id) покрывается comment_task_idx
+        comments = shards.with_users(self.object.comments.all(), "author")
+        try:
+            context["comments"], next_cursor = keyset_page(
+                comments,
+                ["-pk"],
+                self.request.GET.get("cursor", ""),
+                self.comments_page_size,
+            )
+        except ValueError:
+            context["comments"], next_cursor = [], None
+        if next_cursor:
+            context["next_query"] = f"cursor={next_cursor}"
+        context["comment_form"] = TaskCommentForm()
+        context["blocked_by"] = self.object.blocked_by.select_related("blocker")
+        context["pending_blockers"] = self.object.blockers().exclude(state="DONE")
+        context["dependents"] = self.object.dependents()
+        context["blocker_form"] = TaskBlockerForm(task=self.object)
+        return context
 
 
 class KanbanCreateView(UserPassesTestMixin, CreateView):
@@ -129,7 +231,8 @@ class KanbanCreateView(UserPassesTestMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        return super().form_valid(form)
+        with shards.use_shard(shards.choose_shard()):
+            return super().form_valid(form)
 
     def test_func(self) -> bool:
         return self.request.user.is_authenticated
@@ -150,8 +253,7 @@ class KanbanDeleteView(UserPassesTestMixin, DeleteView):
     success_url = reverse_lazy("tasks:kanban_list")
 
     def test_func(self) -> bool:
-        kanban = self.get_object()
-        return kanban.owner == self.request.user
+        return permissions.can_write(self.request.user, self.kwargs["pk"])
 
     def handle_no_permission(self) -> HttpResponseRedirect:
         return HttpResponseForbidden(
@@ -162,15 +264,83 @@ class KanbanDeleteView(UserPassesTestMixin, DeleteView):
             )
         )
 
+    def form_valid(self, form):
+        # задачи и изображения удалит purge_kanbans порциями
+        self.object.soft_delete()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class KanbanCloneView(UserPassesTestMixin, View):
+    """Копирует канбан (или шаблон) в новый канбан или шаблон пользователя."""
+
+    as_template = False
+    http_method_names = ["post"]
+
+    def test_func(self) -> bool:
+        return permissions.can_read(self.request.user, self.kwargs["pk"])
+
+    def handle_no_permission(self) -> HttpResponseRedirect:
+        return HttpResponseForbidden(
+            render(
+                self.request,
+                "tasks/error.html",
+                {"error_message": "Вам нельзя копировать этот канбан"},
+            )
+        )
+
+    def post(self, request, *args, **kwargs):
+        kanban = get_object_or_404(Kanban, pk=self.kwargs["pk"])
+        new_kanban = kanban.clone(request.user, as_template=self.as_template)
+        if self.as_template:
+            return HttpResponseRedirect(reverse_lazy("tasks:kanban_list"))
+        return HttpResponseRedirect(
+            reverse_lazy("tasks:kanban_detail", kwargs={"pk": new_kanban.pk})
+        )
+
+
+class KanbanWebhookView(UserPassesTestMixin, CreateView):
+    model = WebhookSubscription
+    form_class = WebhookAddForm
+    template_name = "tasks/kanban_webhooks.html"
+
+    def test_func(self) -> bool:
+        return permissions.can_write(self.request.user, self.kwargs["kanban_pk"])
+
+    def handle_no_permission(self) -> HttpResponseRedirect:
+        return HttpResponseForbidden(
+            render(
+                self.request,
+                "tasks/error.html",
+                {"error_message": "Вам нельзя настраивать вебхуки этого канбана"},
+            )
+        )
+
+    def form_valid(self, form):
+        form.instance.kanban_id = self.kwargs["kanban_pk"]
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse_lazy(
+            "tasks:kanban_webhooks", kwargs={"kanban_pk": self.kwargs["kanban_pk"]}
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["kanban_pk"] = self.kwargs["kanban_pk"]
+        context["webhooks"] = WebhookSubscription.objects.filter(
+            kanban_id=self.kwargs["kanban_pk"]
+        )
+        return context
 
-class TaskCreateView(UserPassesTestMixin, CreateView):
+
+class TaskCreateView(ImageUploadMixin, UserPassesTestMixin, CreateView):
     model = Task
     form_class = TaskAddForm
     template_name = "tasks/task_add.html"
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        form.instance.kanban = Kanban.objects.get(pk=self.kwargs["kanban_pk"])
+        form.instance.kanban = get_object_or_404(Kanban, pk=self.kwargs["kanban_pk"])
         form.instance.state = "PLANNED"
         return super().form_valid(form)
 
@@ -178,15 +348,15 @@ class TaskCreateView(UserPassesTestMixin, CreateView):
         return reverse_lazy("tasks:kanban_detail", kwargs={"pk": self.object.kanban.pk})
 
     def test_func(self) -> bool:
-        return self.request.user.is_authenticated
+        return permissions.can_write(self.request.user, self.kwargs["kanban_pk"])
 
     def handle_no_permission(self) -> HttpResponseRedirect:
+        if not self.request.user.is_authenticated:
+            error_message = "Перед созданием задачи авторизуйтесь"
+        else:
+            error_message = "Вам нельзя добавлять задачи на эту доску"
         return HttpResponseForbidden(
-            render(
-                self.request,
-                "tasks/error.html",
-                {"error_message": "Перед созданием задачи авторизуйтесь"},
-            )
+            render(self.request, "tasks/error.html", {"error_message": error_message})
         )
 
     def get_context_data(self, **kwargs):
@@ -197,14 +367,16 @@ class TaskCreateView(UserPassesTestMixin, CreateView):
 
 class TaskDeleteView(TaskPermissionMixin, DeleteView):
     model = Task
+    write_access = True
     template_name = "tasks/task_delete.html"
 
     def get_success_url(self):
         return reverse_lazy("tasks:kanban_detail", kwargs={"pk": self.object.kanban.pk})
 
 
-class TaskUpdateView(TaskPermissionMixin, UpdateView):
+class TaskUpdateView(ImageUploadMixin, TaskPermissionMixin, UpdateView):
     model = Task
+    write_access = True
     template_name = "tasks/task_update.html"
     form_class = TaskAddForm
 
@@ -225,7 +397,9 @@ class TaskChangeStateBaseView(UserPassesTestMixin, UpdateView):
 
     def test_func(self) -> bool:
         task = self.get_object()
-        return task.owner == self.request.user
+        if task.owner_id == self.request.user.pk:
+            return True
+        return permissions.can_write(self.request.user, task.kanban_id)
 
     def handle_no_permission(self) -> HttpResponseRedirect:
         return HttpResponseForbidden(
@@ -270,7 +444,11 @@ class TaskAssignView(TaskChangeStateBaseView):
             )
             return self.form_invalid(form)
 
-        form.instance.to_assigned()
+        try:
+            form.instance.to_assigned()
+        except ValidationError as error:
+            form.add_error(None, error)
+            return self.form_invalid(form)
         return super().form_valid(form)
 
     def get_error_message(self, task: Task):
@@ -397,3 +575,572 @@ class AppSignupView(UserPassesTestMixin, CreateView):
                 self.request, "tasks/forbidden.html", {"message": "Вы уже авторизованы"}
             )
         )
+
+
+class MyTasksView(ReplicaReadMixin, UserPassesTestMixin, ListView):
+    """Задачи, назначенные пользователю, во всех канбанах."""
+
+    template_name = "tasks/my_tasks.html"
+    context_object_name = "tasks"
+    # задачи отбираются по индексу task_executor_deadline_idx, порядок
+    # из него берется только с фильтром state, иначе задачи исполнителя
+    # сортируются после выборки
+    ordering = ["datetime_deadline", "pk"]
+    page_size = 50
+
+    def test_func(self) -> bool:
+        return self.request.user.is_authenticated
+
+    def handle_no_permission(self) -> HttpResponseRedirect:
+        return HttpResponseForbidden(
+            render(
+                self.request,
+                "tasks/error.html",
+                {"error_message": "Для просмотра задач войдите или зарегистрирутесь"},
+            )
+        )
+
+    def get_queryset(self):
+        self.filter_form = MyTasksFilterForm(self.request.GET)
+        # у назначенной задачи срок всегда указан, см. Task.to_assigned
+        tasks = Task.objects.filter(
+            executor=self.request.user, datetime_deadline__isnull=False
+        ).select_related("kanban")
+        if self.filter_form.is_valid():
+            data = self.filter_form.cleaned_data
+            if data["state"]:
+                tasks = tasks.filter(state=data["state"])
+            if data["deadline_from"]:
+                tasks = tasks.filter(datetime_deadline__gte=data["deadline_from"])
+            if data["deadline_to"]:
+                tasks = tasks.filter(datetime_deadline__lte=data["deadline_to"])
+        cursor = self.request.GET.get("cursor", "")
+        try:
+            # задачи исполнителя могут быть в любом шарде
+            pages = shards.fan_out(
+                lambda: keyset_page(tasks, self.ordering, cursor, self.page_size)
+            )
+        except ValueError:
+            self.next_cursor = None
+            return []
+        page, self.next_cursor = merge_pages(
+            list(pages.values()), self.ordering, self.page_size
+        )
+        return page
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["filter_form"] = self.filter_form
+        if self.next_cursor:
+            query = self.request.GET.copy()
+            query["cursor"] = self.next_cursor
+            context["next_query"] = query.urlencode()
+        return context
+
+
+class UserAutocompleteView(UserPassesTestMixin, View):
+    """
+    Пользователи, чей логин начинается с q. Сначала участники канбана
+    kanban (если он доступен пользователю), затем остальные.
+    """
+
+    limit = 20
+
+    def test_func(self) -> bool:
+        return self.request.user.is_authenticated
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get("q", "")
+        # диапазон вместо LIKE, чтобы SQLite использовал индекс username
+        users = User.objects.filter(
+            username__gte=prefix, username__lt=prefix + "\U0010ffff"
+        ).order_by("username")
+
+        results = []
+        kanban_id = request.GET.get("kanban", "")
+        if kanban_id.isdigit() and permissions.can_read(request.user, kanban_id):
+            results = list(
+                users.filter(kanban_memberships__kanban_id=kanban_id).values(
+                    "id", "username"
+                )[: self.limit]
+            )
+        if len(results) < self.limit:
+            found = {user["id"] for user in results}
+            results += [
+                user
+                for user in users.values("id", "username")[: self.limit]
+                if user["id"] not in found
+            ][: self.limit - len(results)]
+        return JsonResponse({"results": results})
+
+
+class TaskMoveView(TaskPermissionMixin, SingleObjectMixin, View):
+    """
+    Переносит карточку внутри колонки между соседями after и before
+    (id карточек выше и ниже). Меняется только строка самой карточки.
+    """
+
+    model = Task
+    write_access = True
+    http_method_names = ["post"]
+
+    def get_object(self, queryset=None) -> Task:
+        if not hasattr(self, "object"):
+            self.object = super().get_object(queryset)
+        return self.object
+
+    def post(self, request, *args, **kwargs):
+        task = self.get_object()
+        try:
+            neighbors = {
+                key: int(request.POST[key])
+                for key in ("after", "before")
+                if request.POST.get(key)
+            }
+        except ValueError:
+            return JsonResponse({"error": "Неверный id карточки"}, status=400)
+
+        try:
+            task.move_between(neighbors.get("after"), neighbors.get("before"))
+        except ValidationError as error:
+            return JsonResponse({"error": error.message}, status=400)
+        except ValueError:
+            return JsonResponse(
+                {"error": "Порядок карточек изменился, обновите доску"}, status=409
+            )
+        return JsonResponse({"id": task.pk, "rank": task.rank})
+
+
+class TaskBlockerView(TaskPermissionMixin, SingleObjectMixin, View):
+    """Добавляет задаче блокирующую задачу или (remove) убирает ее."""
+
+    model = Task
+    write_access = True
+    remove = False
+    http_method_names = ["post"]
+
+    def get_object(self, queryset=None) -> Task:
+        if not hasattr(self, "object"):
+            self.object = super().get_object(queryset)
+        return self.object
+
+    def post(self, request, *args, **kwargs):
+        task = self.get_object()
+        if self.remove:
+            blocker = get_object_or_404(
+                Task, pk=self.kwargs["blocker_pk"], kanban_id=task.kanban_id
+            )
+            task.remove_blocker(blocker)
+        else:
+            form = TaskBlockerForm(request.POST, task=task)
+            try:
+                if not form.is_valid():
+                    raise ValidationError(form.errors["blocker"])
+                task.add_blocker(form.cleaned_data["blocker"])
+            except ValidationError as error:
+                return render(
+                    request,
+                    "tasks/error.html",
+                    {"error_message": error.messages[0]},
+                    status=400,
+                )
+        return HttpResponseRedirect(
+            reverse_lazy("tasks:task_detail", kwargs={"pk": task.pk})
+        )
+
+
+class TaskCommentView(TaskPermissionMixin, SingleObjectMixin, View):
+    """
+    Добавляет комментарий к задаче (комментировать может любой, кто видит
+    задачу) или (remove) удаляет его: автор или владелец канбана (роль
+    OWNER, permissions.can_write).
+    """
+
+    model = Task
+    remove = False
+    http_method_names = ["post"]
+
+    def get_object(self, queryset=None) -> Task:
+        if not hasattr(self, "object"):
+            self.object = super().get_object(queryset)
+        return self.object
+
+    def post(self, request, *args, **kwargs):
+        task = self.get_object()
+        if self.remove:
+            comment = get_object_or_404(
+                TaskComment, pk=self.kwargs["comment_pk"], task_id=task.pk
+            )
+            # can_write - роль OWNER в канбане, то есть его владелец
+            if comment.author_id != request.user.pk and not permissions.can_write(
+                request.user, task.kanban_id
+            ):
+                raise PermissionDenied
+            task.delete_comment(comment)
+        else:
+            form = TaskCommentForm(request.POST)
+            if not form.is_valid():
+                return render(
+                    request,
+                    "tasks/error.html",
+                    {"error_message": form.errors["text"][0]},
+                    status=400,
+                )
+            task.add_comment(request.user, form.cleaned_data["text"])
+        return HttpResponseRedirect(
+            reverse_lazy("tasks:task_detail", kwargs={"pk": task.pk})
+        )
+
+
+class TaskFieldsMixin:
+    """Выбор полей задачи параметром fields и их сериализация в JSON."""
+
+    field_names = {
+        "id": "id",
+        "title": "title",
+        "description": "description",
+        "state": "state",
+        "kanban": "kanban_id",
+        "owner": "owner_id",
+        "executor": "executor_id",
+        "rank": "rank",
+        "image": "image",
+        "datetime_created": "datetime_created",
+        "datetime_assigned": "datetime_assigned",
+        "datetime_deadline": "datetime_deadline",
+        "datetime_review": "datetime_review",
+        "datetime_done": "datetime_done",
+        "datetime_last_update": "datetime_last_update",
+        "comment_count": "comment_count",
+    }
+    default_fields = [name for name in field_names if name != "description"]
+
+    def get_fields(self, value: str) -> list:
+        fields = value.split(",") if value else self.default_fields
+        unknown = set(fields) - set(self.field_names)
+        if unknown:
+            raise ValueError(f"fields: неизвестные поля {', '.join(sorted(unknown))}")
+        return fields
+
+    def serialize(self, task: Task, fields: list) -> dict:
+        result = {}
+        for name in fields:
+            value = getattr(task, self.field_names[name])
+            if name == "image":
+                value = value.url if value else None
+            elif hasattr(value, "isoformat"):
+                value = value.isoformat()
+            result[name] = value
+        return result
+
+    def error(self, message: str) -> JsonResponse:
+        return JsonResponse({"error": message}, status=400)
+
+
+class TaskListApiView(
+    ReplicaReadMixin, TaskFieldsMixin, UserPassesTestMixin, View
+):
+    """
+    Задачи доступных канбанов в JSON с фильтрами, сортировкой и курсором.
+
+    Сортировки и фильтры ограничены списками ниже, чтобы каждый запрос
+    шел по индексу. fields выбирает колонки; description по умолчанию
+    не читается из базы.
+    """
+
+    # ключ sort -> порядок для keyset_page (поля не бывают NULL). Порядок
+    # читается из индекса только при фильтрах из комментария, иначе
+    # отобранные задачи сортируются отдельно
+    sort_orderings = {
+        "id": ["pk"],
+        "-id": ["-pk"],
+        # task_column_rank_idx при kanban и state, без них ранги разных
+        # колонок не сравнимы, такая сортировка отклоняется
+        "rank": ["rank", "pk"],
+        # task_executor_deadline_idx при executor и state
+        "deadline": ["datetime_deadline", "pk"],
+        "-deadline": ["-datetime_deadline", "-pk"],
+        # task_kanban_created_idx при kanban
+        "created": ["datetime_created", "pk"],
+        "-created": ["-datetime_created", "-pk"],
+    }
+    page_size = 50
+
+    def test_func(self) -> bool:
+        return self.request.user.is_authenticated
+
+    def handle_no_permission(self) -> JsonResponse:
+        return JsonResponse({"error": "Требуется авторизация"}, status=403)
+
+    def get(self, request, *args, **kwargs):
+        form = TaskListApiForm(request.GET)
+        unknown = set(request.GET) - set(form.fields)
+        if unknown:
+            return self.error(f"Неизвестные параметры: {', '.join(sorted(unknown))}")
+        if not form.is_valid():
+            field, errors = next(iter(form.errors.items()))
+            return self.error(f"{field}: {errors[0]}")
+        data = form.cleaned_data
+
+        sort = data["sort"] or "id"
+        ordering = self.sort_orderings.get(sort)
+        if ordering is None:
+            return self.error(f"sort: допустимо {', '.join(self.sort_orderings)}")
+        if sort == "rank" and not (data["kanban"] and data["state"]):
+            return self.error("sort: rank только вместе с kanban и state")
+        try:
+            fields = self.get_fields(data["fields"])
+        except ValueError as error:
+            return self.error(str(error))
+
+        kanban_ids = permissions.readable_kanban_ids(request.user)
+        if data["kanban"]:
+            kanban_ids = [data["kanban"]] if data["kanban"] in kanban_ids else []
+        tasks = Task.objects.all()
+        if data["state"]:
+            tasks = tasks.filter(state=data["state"])
+        if data["executor"]:
+            tasks = tasks.filter(executor_id=data["executor"])
+        if data["deadline_from"]:
+            tasks = tasks.filter(datetime_deadline__gte=data["deadline_from"])
+        if data["deadline_to"]:
+            tasks = tasks.filter(datetime_deadline__lte=data["deadline_to"])
+        if data["created_from"]:
+            tasks = tasks.filter(datetime_created__gte=data["created_from"])
+        if data["created_to"]:
+            tasks = tasks.filter(datetime_created__lte=data["created_to"])
+        if sort.lstrip("-") == "deadline":
+            tasks = tasks.filter(datetime_deadline__isnull=False)
+
+        # поля сортировки нужны для курсора, их читаем всегда
+        columns = {self.field_names[name] for name in fields}
+        columns |= {field.lstrip("-") for field in ordering if field != "-pk"}
+        tasks = tasks.only(*(column for column in columns if column != "pk"))
+        page_size = data["limit"] or self.page_size
+        pages = []
+        try:
+            for alias, ids in shards.group_by_shard(kanban_ids).items():
+                with shards.use_shard(alias):
+                    pages.append(
+                        keyset_page(
+                            tasks.filter(kanban_id__in=ids),
+                            ordering,
+                            data["cursor"],
+                            page_size,
+                        )
+                    )
+        except ValueError:
+            return self.error("cursor: неверный курсор")
+        page, next_cursor = merge_pages(pages, ordering, page_size)
+        return JsonResponse(
+            {
+                "results": [self.serialize(task, fields) for task in page],
+                "next_cursor": next_cursor,
+            }
+        )
+
+
+class KanbanSyncView(ReplicaReadMixin, TaskFieldsMixin, UserPassesTestMixin, View):
+    """
+    Изменения задач канбана после курсора клиента.
+
+    Без курсора отдается весь канбан. Дальше клиент передает полученный
+    cursor и получает только созданные и измененные задачи (tasks) и id
+    удаленных (deleted). Если has_more, запрос нужно повторить сразу.
+    Курсор содержит id канбана, номер последнего изменения
+    (Task.change_seq), id последнего удаления и время выдачи. Курсор,
+    выданный раньше SYNC_TOMBSTONE_DAYS назад, сбрасывается (reset):
+    удаления за это время уже могли быть забыты. Курсор другого канбана
+    тоже сбрасывается: после переноса в другой шард у канбана новый id,
+    а номера изменений у каждого шарда свои.
+    """
+
+    def test_func(self) -> bool:
+        return permissions.can_read(self.request.user, self.kwargs["pk"])
+
+    def handle_no_permission(self) -> JsonResponse:
+        return JsonResponse({"error": "Нет доступа к канбану"}, status=403)
+
+    def get(self, request, *args, **kwargs):
+        kanban_id = self.kwargs["pk"]
+        try:
+            fields = self.get_fields(request.GET.get("fields", ""))
+        except ValueError as error:
+            return self.error(str(error))
+        page_size = settings.SYNC_PAGE_SIZE
+
+        now = timezone.now()
+        reset = False
+        cursor = request.GET.get("cursor", "")
+        if cursor:
+            try:
+                cursor_kanban_id, last_seq, last_pk, last_tombstone, synced = (
+                    self.parse_cursor(cursor)
+                )
+            except ValueError:
+                return self.error("cursor: неверный курсор")
+            retention = timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+            reset = synced < now - retention or cursor_kanban_id != kanban_id
+        if not cursor or reset:
+            last_seq, last_pk = None, 0
+            # удаления до полной выгрузки клиенту не нужны
+            last_tombstone = (
+                TaskTombstone.objects.filter(kanban_id=kanban_id)
+                .order_by("-pk")
+                .values_list("pk", flat=True)
+                .first()
+                or 0
+            )
+
+        # change_seq нужен для курсора, читаем его всегда
+        columns = {self.field_names[name] for name in fields}
+        columns.add("change_seq")
+        tasks = Task.objects.filter(kanban_id=kanban_id)
+        if last_seq is not None:
+            tasks = tasks.filter(
+                Q(change_seq__gt=last_seq) | Q(change_seq=last_seq, pk__gt=last_pk)
+            )
+        # (kanban, change_seq) покрывается task_kanban_change_idx
+        tasks = list(
+            tasks.only(*columns).order_by("change_seq", "pk")[: page_size + 1]
+        )
+        tombstones = list(
+            TaskTombstone.objects.filter(kanban_id=kanban_id, pk__gt=last_tombstone)
+            .order_by("pk")
+            .values_list("pk", "task_id")[: page_size + 1]
+        )
+        has_more = len(tasks) > page_size or len(tombstones) > page_size
+        tasks = tasks[:page_size]
+        tombstones = tombstones[:page_size]
+
+        if tasks:
+            last_seq, last_pk = tasks[-1].change_seq, tasks[-1].pk
+        return JsonResponse(
+            {
+                "reset": reset or not cursor,
+                "tasks": [self.serialize(task, fields) for task in tasks],
+                "deleted": [task_id for _, task_id in tombstones],
+                "cursor": encode_cursor(
+                    [
+                        kanban_id,
+                        # пустой канбан: подойдет любое будущее изменение
+                        -1 if last_seq is None else last_seq,
+                        last_pk,
+                        tombstones[-1][0] if tombstones else last_tombstone,
+                        now.isoformat(),
+                    ]
+                ),
+                "has_more": has_more,
+            }
+        )
+
+    def parse_cursor(self, cursor: str) -> tuple:
+        values = decode_cursor(cursor)
+        if len(values) != 5:
+            raise ValueError("Неверный курсор")
+        synced = parse_datetime(str(values[4]))
+        if synced is None or not all(isinstance(value, int) for value in values[:4]):
+            raise ValueError("Неверный курсор")
+        return (*values[:4], synced)
+
+
+class TaskImageView(TaskPermissionMixin, View):
+    def get_object(self) -> Task:
+        # права проверяются один раз, объект переиспользуется в get
+        if not hasattr(self, "object"):
+            name = f"tasks/img/{self.kwargs['name']}"
+            # в URL нет id, имя файла уникально, поэтому ищем во всех шардах
+            found = shards.fan_out(
+                lambda: Task.objects.only("pk", "owner_id", "kanban_id", "image")
+                # старые записи хранили абсолютный путь
+                .filter(image__in=[name, f"{settings.MEDIA_ROOT}/{name}"])
+                .first()
+            )
+            tasks = [task for task in found.values() if task is not None]
+            if not tasks:
+                raise Http404
+            self.object = tasks[0]
+        return self.object
+
+    def get(self, request, *args, **kwargs):
+        return serve_media(request, f"tasks/img/{self.kwargs['name']}")
+
+
+class IcalFeedView(View):
+    """
+    Сроки задач в формате .ics: все назначенные пользователю или все задачи
+    канбана. Календари не присылают cookie, пользователь берется из
+    подписанного токена в URL, права проверяются при каждом запросе.
+    """
+
+    http_method_names = ["get", "head"]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            user_id, kanban_id = ical.read_token(self.kwargs["token"])
+        except signing.BadSignature:
+            raise Http404
+        # права читаются из кеша, пользователь из базы не нужен
+        user = User(pk=user_id)
+        if kanban_id is not None and not permissions.can_read(user, kanban_id):
+            # токен мог быть выдан до переноса канбана в другой шард
+            kanban_id = KanbanRedirect.resolve(KanbanRedirect.KANBAN, kanban_id)
+            if kanban_id is None or not permissions.can_read(user, kanban_id):
+                raise Http404
+        if kanban_id is None:
+            kanban_ids = sorted(permissions.readable_kanban_ids(user))
+        else:
+            kanban_ids = [kanban_id]
+
+        versions = ical.board_versions(kanban_ids)
+        etag = ical.feed_etag(
+            user_id, kanban_id, request.get_host(), sorted(versions.items())
+        )
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            body = ical.cached_body(etag)
+            if body is None:
+                chunks = self.render(user_id, kanban_id, kanban_ids)
+                response = StreamingHttpResponse(ical.stream_and_cache(etag, chunks))
+            else:
+                response = HttpResponse(body)
+            response["Content-Type"] = "text/calendar; charset=utf-8"
+        response["ETag"] = etag
+        # календарь должен перепроверять фид при каждом опросе
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def render(self, user_id, kanban_id, kanban_ids):
+        if kanban_id is None:
+            name = "Мои задачи"
+            querysets = [
+                Task.objects.using(alias).filter(executor_id=user_id, kanban_id__in=ids)
+                for alias, ids in shards.group_by_shard(kanban_ids).items()
+            ]
+        else:
+            alias = shards.shard_for_id(kanban_id)
+            kanban = get_object_or_404(Kanban.objects.using(alias), pk=kanban_id)
+            name = kanban.title
+            querysets = [Task.objects.using(alias).filter(kanban_id=kanban_id)]
+        tasks = (
+            task
+            for queryset in querysets
+            for task in queryset.filter(datetime_deadline__isnull=False)
+            .only("title", "state", "datetime_deadline", "datetime_last_update")
+            .order_by("datetime_deadline", "pk")
+            .iterator(chunk_size=500)
+        )
+        return ical.render_feed(name, tasks, self.task_url)
+
+    def task_url(self, task) -> str:
+        return self.request.build_absolute_uri(
+            reverse_lazy("tasks:task_detail", kwargs={"pk": task.pk})
+        )
+
+
+def metrics_view(request):
+    metrics.flush()
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,229 @@
+"""
+Отправка вебхуков из outbox (WebhookDelivery).
+
+Воркер забирает созревшие события, склеивает события одной подписки
+в один запрос и отправляет запросы параллельно через asyncio. Неудачные
+отправки повторяются с экспоненциальной задержкой.
+
+Адрес подписки задает пользователь, поэтому запросы уходят только по
+http(s) и только на публичные IP: имя проверяется при сохранении
+подписки и заново разрешается перед каждой отправкой, соединение
+открывается с проверенным IP.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from . import httpclient, shards
+from .models import WebhookDelivery
+
+
+def is_public_address(address: str) -> bool:
+    if settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES:
+        return True
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if getattr(ip, "ipv4_mapped", None):
+        ip = ip.ipv4_mapped
+    # is_global ложно для частных, loopback, link-local и служебных сетей
+    return ip.is_global and not ip.is_multicast
+
+
+def split_url(url: str) -> tuple:
+    """(https, host, port, path) для адреса http(s), иначе ValueError."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Поддерживаются только адреса http и https")
+    https = parts.scheme == "https"
+    port = parts.port or (443 if https else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return https, parts.hostname, port, path
+
+
+def check_addresses(host: str, addresses: list):
+    if not addresses or not all(map(is_public_address, addresses)):
+        raise ValueError(f"Адрес {host} указывает во внутреннюю сеть")
+
+
+def validate_url(url: str):
+    """Для формы подписки: ValidationError, если на адрес слать нельзя."""
+    try:
+        _, host, port, _ = split_url(url)
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            raise ValueError(f"Не удалось найти сервер {host}")
+        check_addresses(host, [info[4][0] for info in infos])
+    except ValueError as error:
+        raise ValidationError(str(error))
+
+
+async def post_json(url: str, body: bytes, headers: dict, timeout: float) -> int:
+    """POST на адрес подписки, возвращает код ответа."""
+    try:
+        https, host, port, path = split_url(url)
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+        addresses = [info[4][0] for info in infos]
+        check_addresses(host, addresses)
+    except ValueError as error:
+        raise ConnectionRefusedError(str(error))
+
+    # соединение с уже проверенным IP, повторное разрешение имени могло бы
+    # вернуть другой адрес
+    connection = httpclient.Connection(host, port, https=https, address=addresses[0])
+    try:
+        response = await asyncio.wait_for(
+            connection.request(
+                "POST",
+                path,
+                {"Content-Type": "application/json", "Connection": "close", **headers},
+                body,
+            ),
+            timeout,
+        )
+    finally:
+        await connection.close()
+    return response.status
+
+
+def build_body(deliveries) -> bytes:
+    return json.dumps(
+        {
+            "deliveries": [
+                {
+                    "id": delivery.pk,
+                    "event": delivery.event,
+                    "created": delivery.datetime_created.isoformat(),
+                    "data": delivery.payload,
+                }
+                for delivery in deliveries
+            ]
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+async def send_batches(batches, concurrency: int) -> dict:
+    """batches: {подписка: [отправки]} -> {подписка: текст ошибки или ""}."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(subscription, deliveries):
+        body = build_body(deliveries)
+        headers = {"X-Kanban-Event-Count": str(len(deliveries))}
+        if subscription.secret:
+            signature = hmac.new(
+                subscription.secret.encode(), body, hashlib.sha256
+            ).hexdigest()
+            headers["X-Kanban-Signature"] = f"sha256={signature}"
+        async with semaphore:
+            try:
+                status = await post_json(
+                    subscription.url, body, headers, settings.WEBHOOK_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError) as error:
+                return subscription, f"{type(error).__name__}: {error}"
+        if 200 <= status < 300:
+            return subscription, ""
+        return subscription, f"HTTP {status}"
+
+    results = await asyncio.gather(
+        *(send(subscription, batch) for subscription, batch in batches.items())
+    )
+    return dict(results)
+
+
+def deliver_due(limit: int, concurrency: int, batch_size: int) -> tuple[int, int]:
+    """Отправляет созревшие события, возвращает (доставлено, с ошибкой)."""
+    # outbox лежит в шарде канбана, шарды обходятся по очереди
+    results = shards.fan_out(
+        lambda: _deliver_due_in_shard(limit, concurrency, batch_size)
+    )
+    delivered = sum(result[0] for result in results.values())
+    failed = sum(result[1] for result in results.values())
+    return delivered, failed
+
+
+def claim_due(now, limit) -> list:
+    """
+    Переводит созревшие события в SENDING с арендой и возвращает их.
+    Другой воркер их не заберет, пока аренда не истечет.
+    """
+    due = Q(state="PENDING", datetime_next_attempt__lte=now) | Q(
+        state="SENDING", datetime_lease_until__lte=now
+    )
+    lease_until = now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+    with shards.atomic():
+        pks = list(
+            WebhookDelivery.objects.select_for_update(skip_locked=True)
+            .filter(due)
+            .order_by("datetime_next_attempt", "pk")
+            .values_list("pk", flat=True)[:limit]
+        )
+        WebhookDelivery.objects.filter(due, pk__in=pks).update(
+            state="SENDING", datetime_lease_until=lease_until
+        )
+    return list(
+        WebhookDelivery.objects.filter(pk__in=pks)
+        .select_related("subscription")
+        .order_by("datetime_next_attempt", "pk")
+    )
+
+
+def _deliver_due_in_shard(limit, concurrency, batch_size) -> tuple[int, int]:
+    now = timezone.now()
+    batches = {}
+    extra = []
+    for delivery in claim_due(now, limit):
+        batch = batches.setdefault(delivery.subscription, [])
+        if len(batch) < batch_size:
+            batch.append(delivery)
+        else:
+            extra.append(delivery.pk)
+    # не поместившиеся в пакет события уйдут следующим проходом
+    WebhookDelivery.objects.filter(pk__in=extra).update(state="PENDING")
+    if not batches:
+        return 0, 0
+
+    results = asyncio.run(send_batches(batches, concurrency))
+
+    delivered = failed = 0
+    for subscription, error in results.items():
+        deliveries = batches[subscription]
+        pks = [delivery.pk for delivery in deliveries]
+        if not error:
+            WebhookDelivery.objects.filter(pk__in=pks, state="SENDING").update(
+                state="DELIVERED", datetime_delivered=timezone.now()
+            )
+            delivered += len(pks)
+            continue
+        failed += len(pks)
+        for delivery in deliveries:
+            delivery.attempts += 1
+            delivery.last_error = error
+            if delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                delivery.state = "FAILED"
+            else:
+                delivery.state = "PENDING"
+            delay = min(
+                settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (delivery.attempts - 1),
+                settings.WEBHOOK_RETRY_MAX_SECONDS,
+            )
+            delivery.datetime_next_attempt = now + timedelta(seconds=delay)
+        WebhookDelivery.objects.bulk_update(
+            deliveries, ["attempts", "last_error", "state", "datetime_next_attempt"]
+        )
+    return delivered, failed